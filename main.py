@@ -13,6 +13,7 @@ Micro Tracker - 显微视频目标分割和追踪工具
 
 import sys
 import os
+import multiprocessing
 
 # 确保当前目录在搜索路径中
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -22,4 +23,6 @@ if current_dir not in sys.path:
 from micro_tracker.app import main
 
 if __name__ == "__main__":
+    # 筛选阶段使用spawn方式的进程池，打包为可执行文件时需要此调用
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
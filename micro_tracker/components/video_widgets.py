@@ -1,6 +1,6 @@
 import numpy as np
 from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsItem, QSizePolicy, QMainWindow
-from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QFont
+from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QFont, QTransform
 from PyQt5.QtCore import Qt, pyqtSignal, QRectF
 
 # Placeholder for 'from utils.color import COLOR' - this will be addressed later if utils.color is moved
@@ -255,29 +255,55 @@ class MultiLayerVideoView(QGraphicsView):
         self.scale_factor = 1.0
         self.frame = None
         self.original_pixmap = None
+        self.source_size = None  # 原始帧尺寸(宽, 高)，场景坐标始终以原始像素为单位
+        self.frame_source = None  # 提供帧的视频线程
     
-    def set_frame(self, frame):
+    def set_frame(self, frame, source_width=None, source_height=None):
+        """
+        显示一帧，frame可以是缩小的代理帧，此时通过source_width/source_height给出原始帧尺寸
+        """
         self.frame = frame
         if self.frame is not None:
-            self._update_display()
+            h, w = frame.shape[:2]
+            self._update_display(source_width or w, source_height or h)
     
-    def _update_display(self):
+    def _update_display(self, source_width, source_height):
         if self.frame is None:
             return
-        h, w, c = self.frame.shape
-        bytes_per_line = c * w
-        q_img = QImage(self.frame.data, w, h, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
+        frame = np.ascontiguousarray(self.frame)
+        h, w = frame.shape[:2]
+        # BGR数据直接构造QImage，无需再交换通道复制一次
+        q_img = QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
         pixmap = QPixmap.fromImage(q_img)
         self.original_pixmap = pixmap
         self.frame_layer.setPixmap(pixmap)
-        self.overlay_layer.update_frame_size(w, h)
-        self.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
-        self.scale_factor = 1.0
+        # 代理帧缩放回原始尺寸显示，边界框等场景坐标与原始像素一一对应
+        self.frame_layer.setTransform(QTransform.fromScale(source_width / w, source_height / h))
+        
+        if self.source_size != (source_width, source_height):
+            self.source_size = (source_width, source_height)
+            self.scene.setSceneRect(0, 0, source_width, source_height)
+            self.overlay_layer.update_frame_size(source_width, source_height)
+            self.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
+            self.scale_factor = 1.0
+    
+    def display_size(self):
+        """视口的物理像素尺寸乘以缩放倍数，视频线程按此尺寸生成代理帧"""
+        ratio = self.devicePixelRatioF() * self.scale_factor
+        viewport = self.viewport()
+        return max(1, int(viewport.width() * ratio)), max(1, int(viewport.height() * ratio))
+    
+    def attach_frame_source(self, source):
+        """关联提供帧的视频线程，视口尺寸变化时通知其按新尺寸生成代理帧"""
+        self.frame_source = source
+        source.set_display_size(*self.display_size())
     
     def resizeEvent(self, event):
         super().resizeEvent(event)
         if self.frame is not None:
             self.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
+        if self.frame_source is not None:
+            self.frame_source.set_display_size(*self.display_size())
     
     def mousePressEvent(self, event):
         if self.frame is None:
@@ -360,7 +386,7 @@ class ResultVideoLabel(MultiLayerVideoView):
         super().__init__(parent)
         self.setStyleSheet("border: 1px solid #c0c0c0; background-color: #f0f0f0;")
     
-    def setVideoFrame(self, frame):
-        self.set_frame(frame)
+    def setVideoFrame(self, frame, source_width=None, source_height=None):
+        self.set_frame(frame, source_width, source_height)
         if hasattr(self, 'process_result_frame'): # This method is not defined, but kept for compatibility
             self.process_result_frame(frame) 
\ No newline at end of file
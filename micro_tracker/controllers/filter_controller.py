@@ -2,11 +2,12 @@ import os
 from PyQt5.QtWidgets import QMessageBox, QApplication
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import QDateTime
-import cv2
 import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from utils.image_writer import ImageWriterPool
+
 class FilterController:
     """筛选控制器，负责管理筛选过滤相关功能"""
     
@@ -35,6 +36,14 @@ class FilterController:
             self.main_window.log_message("错误: 帧率和像素比例必须为有效数字", "error")
             return
         
+        try:
+            num_workers = int(self.main_window.filter_workers_input.text())
+            if num_workers < 1:
+                raise ValueError
+        except ValueError:
+            self.main_window.log_message("错误: 并行进程数必须为正整数", "error")
+            return
+        
         # 解析排除ID列表
         exclude_ids = []
         if self.main_window.exclude_ids_input.text().strip():
@@ -118,6 +127,7 @@ class FilterController:
         self.filter_log_message(f"掩膜文件夹: {mask_dir}", "info")
         self.filter_log_message(f"帧率: {fps} FPS", "info")
         self.filter_log_message(f"像素比例: {um_per_pixel} μm/pixel", "info")
+        self.filter_log_message(f"并行进程数: {num_workers}", "info")
         
         # 记录启用的筛选条件
         active_filters = []
@@ -144,7 +154,7 @@ class FilterController:
             self.filter_log_message("未启用任何筛选条件，将保留所有对象", "warning")
         
         # 创建并启动筛选线程
-        self.main_window.filter_thread = self.main_window.FilterMaskThread(mask_dir, fps, um_per_pixel, filter_params)
+        self.main_window.filter_thread = self.main_window.FilterMaskThread(mask_dir, fps, um_per_pixel, filter_params, num_workers)
         self.main_window.filter_thread.progress_update.connect(self.update_filter_progress)
         self.main_window.filter_thread.progress_percent.connect(self.update_filter_progress_bar)
         self.main_window.filter_thread.filter_finished.connect(self.filter_processing_done)
@@ -328,6 +338,7 @@ class FilterController:
         self.main_window.filter_video_thread = self.main_window.FilterVideoThread(self.main_window.filter_thread.filtered_masks)
         self.main_window.filter_video_thread.frame_ready.connect(self.main_window.filter_video_label.setVideoFrame)
         self.main_window.filter_video_thread.frame_index_changed.connect(self.update_filter_slider)
+        self.main_window.filter_video_label.attach_frame_source(self.main_window.filter_video_thread)
         
         # 设置帧率
         try:
@@ -400,56 +411,40 @@ class FilterController:
             # 2. 保存筛选后的掩膜图片
             self.filter_log_message("正在保存筛选后的掩膜图片...", "progress")
             
-            # 获取原始掩膜尺寸
-            h, w = self.main_window.filter_thread.original_masks[0].shape if self.main_window.filter_thread.original_masks else (0, 0)
-            
             # 创建新的掩膜图像保存筛选后的对象
             total_frames = len(self.main_window.filter_thread.original_masks)
-            object_ids = list(self.main_window.filter_thread.object_trajectories.keys())
+            trajectories = self.main_window.filter_thread.object_trajectories
+            object_ids = trajectories.object_ids.tolist()
             self.filter_log_message(f"需要处理 {total_frames} 帧, 包含 {len(object_ids)} 个通过筛选的对象", "info")
             
-            # 对每一帧保存筛选后的掩膜
-            for frame_idx in range(total_frames):
-                # 更新进度条, 掩膜保存占总进度的60%
-                percent = int((frame_idx / total_frames) * 60)
-                self.update_filter_progress_bar(percent)
-                
-                # 创建空白掩膜
-                filtered_mask = np.zeros((h, w), dtype=np.uint8)
-                
-                # 查找当前帧中通过筛选的对象
-                objects_in_frame = 0
-                for obj_id in object_ids:
-                    # 检查该对象是否在当前帧有数据
-                    obj_in_frame = False
-                    obj_data = self.main_window.filter_thread.object_trajectories[obj_id]
+            # 预先建立帧到对象的索引，每帧通过查找表一次性写出筛选后的标签图
+            frame_object_ids = trajectories.frame_object_ids(total_frames)
+            original_masks = self.main_window.filter_thread.original_masks
+            label_dtype = original_masks.dtype if total_frames > 0 else np.uint8
+            max_label = np.iinfo(label_dtype).max
+            
+            # PNG编码和写盘交给后台线程，主线程只负责生成标签图
+            with ImageWriterPool() as image_writer:
+                for frame_idx in range(total_frames):
+                    # 更新进度条, 掩膜保存占总进度的60%
+                    percent = int((frame_idx / total_frames) * 60)
+                    self.update_filter_progress_bar(percent)
                     
-                    for data_point in obj_data:
-                        time_sec = data_point['time']
-                        frame_time = frame_idx / float(self.main_window.fps_input.text())
-                        
-                        # 允许一定的误差
-                        if abs(time_sec - frame_time) < 0.001:
-                            obj_in_frame = True
-                            objects_in_frame += 1
-                            break
+                    # 查找表: 通过筛选的对象映射为自身ID，其余像素映射为0
+                    ids_in_frame = frame_object_ids[frame_idx]
+                    objects_in_frame = len(ids_in_frame)
+                    lut = np.zeros(max_label + 1, dtype=label_dtype)
+                    lut[ids_in_frame] = ids_in_frame
+                    filtered_mask = lut[original_masks[frame_idx]]
                     
-                    if obj_in_frame:
-                        # 从原始掩膜提取此对象
-                        original_mask = self.main_window.filter_thread.original_masks[frame_idx]
-                        obj_pixels = (original_mask == obj_id)
-                        
-                        # 将对象添加到新掩膜
-                        filtered_mask[obj_pixels] = obj_id
-                
-                # 保存结果掩膜
-                output_path = os.path.join(filtered_masks_dir, f"frame_{frame_idx:04d}.png")
-                cv2.imwrite(output_path, filtered_mask)
-                
-                # 每保存5个掩膜更新一次进度
-                if frame_idx % 5 == 0 or frame_idx == total_frames - 1:
-                    percent_complete = int((frame_idx + 1) / total_frames * 100)
-                    self.filter_log_message(f"掩膜保存进度: {frame_idx+1}/{total_frames} ({percent_complete}%) - 当前帧包含 {objects_in_frame} 个对象", "progress")
+                    # 保存结果掩膜
+                    output_path = os.path.join(filtered_masks_dir, f"frame_{frame_idx:04d}.png")
+                    image_writer.submit(output_path, filtered_mask)
+                    
+                    # 每保存5个掩膜更新一次进度
+                    if frame_idx % 5 == 0 or frame_idx == total_frames - 1:
+                        percent_complete = int((frame_idx + 1) / total_frames * 100)
+                        self.filter_log_message(f"掩膜保存进度: {frame_idx+1}/{total_frames} ({percent_complete}%) - 当前帧包含 {objects_in_frame} 个对象", "progress")
             
             # 3. 保存轨迹数据到Excel
             self.filter_log_message("", "info")  # 添加空行
@@ -463,7 +458,7 @@ class FilterController:
                 excel_path = os.path.join(base_dir, f"Trajectories_Results_{video_name}.xlsx")
                 
                 # 统计数据点总数
-                total_data_points = sum(len(trajectory) for trajectory in self.main_window.filter_thread.object_trajectories.values())
+                total_data_points = len(trajectories)
                 self.filter_log_message(f"正在处理 {len(object_ids)} 个对象的轨迹, 共 {total_data_points} 个数据点", "info")
                 
                 # 创建ExcelWriter
@@ -534,17 +529,18 @@ class FilterController:
                     
                     # 然后保存对象轨迹sheets
                     obj_count = 0
-                    for obj_id, trajectory in self.main_window.filter_thread.object_trajectories.items():
+                    trajectory_time = trajectories.time
+                    for obj_id in object_ids:
                         obj_count += 1
                         # 更新进度条, Excel保存占总进度的20%
                         excel_percent = 65 + int((obj_count / len(object_ids)) * 20)
                         self.update_filter_progress_bar(excel_percent)
                         
-                        # 转换为DataFrame
-                        df = pd.DataFrame(trajectory)
-                        
-                        # 仅保留micro_tracker.py中指定的列
-                        df = df[['time', 'area', 'center_x', 'center_y', 'major_axis', 'minor_axis', 'angle']]
+                        # 由轨迹表的列切片直接构建DataFrame，仅保留micro_tracker.py中指定的列
+                        rows = trajectories.object_slice(obj_id)
+                        df = pd.DataFrame({'time': trajectory_time[rows]})
+                        for column in ('area', 'center_x', 'center_y', 'major_axis', 'minor_axis', 'angle'):
+                            df[column] = trajectories[column][rows]
                         
                         # 列名重命名与micro_tracker.py完全一致
                         df = df.rename(columns={
@@ -586,7 +582,8 @@ class FilterController:
                 obj_count = 0
                 csv_files = []
                 
-                for obj_id, trajectory in self.main_window.filter_thread.object_trajectories.items():
+                trajectory_time = trajectories.time
+                for obj_id in object_ids:
                     obj_count += 1
                     # 更新进度条, CSV保存占总进度的20%
                     csv_percent = 65 + int((obj_count / len(object_ids)) * 20)
@@ -601,8 +598,12 @@ class FilterController:
                         csvfile.write(header)
                         
                         # 写入数据行
-                        for point in trajectory:
-                            line = f"{point['time']},{point['area']},{point['center_x']},{point['center_y']},{point['major_axis']},{point['minor_axis']},{point['angle']}\n"
+                        rows = trajectories.object_slice(obj_id)
+                        columns = [trajectory_time[rows].tolist()] + [
+                            trajectories[column][rows].tolist()
+                            for column in ('area', 'center_x', 'center_y', 'major_axis', 'minor_axis', 'angle')]
+                        for point in zip(*columns):
+                            line = ",".join(map(str, point)) + "\n"
                             csvfile.write(line)
                     
                     # 定期更新进度
@@ -627,8 +628,9 @@ class FilterController:
             self.filter_log_message(f"- 总帧数: {total_frames} 帧", "info")
             self.filter_log_message(f"- 对象数: {len(object_ids)} 个", "info")
             frames_per_obj = {}
-            for obj_id, trajectory in self.main_window.filter_thread.object_trajectories.items():
-                frames_per_obj[obj_id] = len(trajectory)
+            for obj_id in object_ids:
+                rows = trajectories.object_slice(obj_id)
+                frames_per_obj[obj_id] = rows.stop - rows.start
             avg_frames = sum(frames_per_obj.values()) / len(frames_per_obj) if frames_per_obj else 0
             self.filter_log_message(f"- 平均帧数: {avg_frames:.1f} 帧/对象", "info")
             
@@ -46,8 +46,11 @@ class ProcessingController:
             args.mask_dir = self.main_window.mask_dir
         else:
             args.mask_dir = None
+        args.mask_format = "stream" if self.main_window.mask_stream_check.isChecked() else "png"
+        args.export_png = False
             
         args.device = self.main_window.device_combo.currentData()
+        args.model_manager = self.main_window.model_manager
         
         # 显示进度条
         self.main_window.progress_bar.setVisible(True)
@@ -62,7 +65,11 @@ class ProcessingController:
         self.main_window.log_message(f"处理设备: {args.device}", "info")
         if args.mask_dir:
             self.main_window.log_message(f"掩码保存目录: {args.mask_dir}", "info")
-            self.main_window.log_message("掩码格式: 每帧一张8位灰度图像，像素值表示对象ID+1，背景为0", "info")
+            if args.mask_format == "stream":
+                self.main_window.log_message("掩码格式: 单文件16位标签流 labels.mtl，像素值表示对象ID+1，背景为0", "info")
+            else:
+                self.main_window.log_message("掩码格式: 每帧一张8位灰度图像，像素值表示对象ID+1，背景为0", "info")
+                self.main_window.log_message("同时写入掩码栈文件 masks.npy，供筛选阶段按需读取", "info")
         else:
             self.main_window.log_message("不保存掩码", "warning")
         self.main_window.log_message(f"保存处理视频: {'是' if args.save_to_video else '否'}", "info")
@@ -109,6 +116,7 @@ class ProcessingController:
         self.main_window.result_video_thread = self.main_window.VideoThread(output_path)
         self.main_window.result_video_thread.frame_ready.connect(self.main_window.update_result_video_frame)
         self.main_window.result_video_thread.frame_index_changed.connect(self.main_window.update_result_frame_slider)
+        self.main_window.result_label.attach_frame_source(self.main_window.result_video_thread)
         
         # 启动视频线程 - 保持暂停状态
         self.main_window.result_video_thread.start()
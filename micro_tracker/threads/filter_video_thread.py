@@ -2,31 +2,38 @@ import cv2
 import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal, QMutex, QDateTime
 
+from micro_tracker.utils.frame_mailbox import FrameMailbox
+from micro_tracker.utils.video_frame_reader import fit_frame_to_display
+
 class FilterVideoThread(QThread):
     """筛选结果视频播放线程"""
-    frame_ready = pyqtSignal(np.ndarray)
+    frame_ready = pyqtSignal(np.ndarray, int, int)  # (显示帧, 原始帧宽, 原始帧高)，显示帧可能是缩小的代理帧
     frame_index_changed = pyqtSignal(int)
     
     def __init__(self, filtered_masks):
         super().__init__()
-        self.filtered_masks = filtered_masks
+        self.filtered_masks = filtered_masks  # 可按帧索引访问的可视化帧序列，FilterPreviewRenderer在访问时才渲染
         self.running = True
         self.paused = True
         self.frame_index = 0
         self.total_frames = len(filtered_masks) if filtered_masks else 0
         self.fps = 10  # 默认播放帧率
         self.frame_time_ms = int(1000 / self.fps)
+        self.display_size = None  # 显示区域的物理像素尺寸，帧按此尺寸缩小后发送
         self.mutex = QMutex()
         self.frame_changed = False
         self.last_frame_time = 0
+        # 帧和帧索引经单槽邮箱送到界面线程，界面处理不过来时只保留最新的一帧
+        self.frame_mailbox = FrameMailbox(self.frame_ready, self)
+        self.index_mailbox = FrameMailbox(self.frame_index_changed, self)
     
     def run(self):
         if not self.filtered_masks:
             return
             
         # 设置初始帧
-        self.frame_ready.emit(self.filtered_masks[0])
-        self.frame_index_changed.emit(0)
+        self._post_frame(self.filtered_masks[0], self.display_size)
+        self.index_mailbox.post(0)
         
         self.last_frame_time = QDateTime.currentMSecsSinceEpoch()
         
@@ -36,14 +43,15 @@ class FilterVideoThread(QThread):
             self.mutex.lock()
             paused = self.paused
             current_index = self.frame_index
+            display_size = self.display_size
             frame_changed = self.frame_changed
             self.frame_changed = False
             self.mutex.unlock()
             
             if not paused or frame_changed:
                 # 发送当前帧
-                self.frame_ready.emit(self.filtered_masks[current_index])
-                self.frame_index_changed.emit(current_index)
+                self._post_frame(self.filtered_masks[current_index], display_size)
+                self.index_mailbox.post(current_index)
                 
                 # 更新时间戳
                 self.last_frame_time = current_time
@@ -74,6 +82,11 @@ class FilterVideoThread(QThread):
                 # 如果暂停，则较长时间休眠以减少CPU使用
                 self.msleep(100)
     
+    @property
+    def dropped_frames(self):
+        """界面线程来不及显示而被新帧覆盖的帧数，用于诊断"""
+        return self.frame_mailbox.dropped_frames
+    
     def stop(self):
         self.running = False
         self.wait()
@@ -85,6 +98,18 @@ class FilterVideoThread(QThread):
         self.frame_changed = True
         self.mutex.unlock()
     
+    def set_display_size(self, width, height):
+        """设置显示区域尺寸，尺寸变化时按新尺寸重新发送当前帧"""
+        self.mutex.lock()
+        if self.display_size != (width, height):
+            self.display_size = (width, height)
+            self.frame_changed = True
+        self.mutex.unlock()
+    
+    def _post_frame(self, frame, display_size):
+        h, w = frame.shape[:2]
+        self.frame_mailbox.post(fit_frame_to_display(frame, display_size), w, h)
+    
     def toggle_pause(self):
         """切换暂停/播放状态"""
         self.mutex.lock()
@@ -7,6 +7,8 @@ import json
 from pathlib import Path
 import traceback
 
+from micro_tracker.utils.frame_mailbox import FrameMailbox
+
 class ProcessingThread(QThread):
     """视频处理线程"""
     progress_update = pyqtSignal(str)  # 进度更新信号
@@ -19,6 +21,8 @@ class ProcessingThread(QThread):
         self.args = args
         self.bbox_list = bbox_list
         self.is_running = True
+        # 预览帧经单槽邮箱送到界面线程，界面处理不过来时只保留最新的一帧
+        self.frame_mailbox = FrameMailbox(self.frame_processed, self)
     
     def run(self):
         try:
@@ -116,9 +120,15 @@ class ProcessingThread(QThread):
                 
                 return True  # 返回True表示继续处理
             
-            # 修改原始Args对象，添加进度回调
+            # 修改原始Args对象，添加进度回调和实时预览回调
             self.args.progress_callback = progress_callback
-            self.progress_update.emit(f"正在加载模型到{self.args.device}设备...")
+            # 跟踪过程中限速发布的缩小预览帧，经帧邮箱送到界面
+            self.args.preview_callback = self.frame_mailbox.post
+            model_manager = getattr(self.args, "model_manager", None)
+            if model_manager is not None and model_manager.is_loaded(self.args.model_path, self.args.device):
+                self.progress_update.emit(f"使用已加载到{self.args.device}设备的模型")
+            else:
+                self.progress_update.emit(f"正在加载模型到{self.args.device}设备...")
             self.progress_update.emit("处理开始，这可能需要几分钟时间...")
             
             # 执行处理
@@ -138,26 +148,6 @@ class ProcessingThread(QThread):
             self.progress_update.emit(f"处理完成，总耗时: {minutes}分{seconds}秒")
             self.progress_update.emit(f"处理速度: {total_frames / elapsed_time:.1f} FPS")
             
-            # 尝试加载处理后的视频进行预览
-            try:
-                if self.args.save_to_video:
-                    self.progress_update.emit("正在加载预览...")
-                    preview_cap = cv2.VideoCapture(self.args.video_output_path)
-                    frame_count = int(preview_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                    
-                    for i in range(frame_count):
-                        ret, frame = preview_cap.read()
-                        if ret:
-                            self.frame_processed.emit(frame, i, frame_count)
-                            # 放慢预览速度
-                            self.msleep(30)
-                        else:
-                            break
-                    
-                    preview_cap.release()
-            except Exception as e:
-                self.progress_update.emit(f"加载处理后的视频预览时出错: {str(e)}")
-            
             # 处理成功
             self.processing_finished.emit(True, "视频处理成功")
             
@@ -172,6 +162,14 @@ class ProcessingThread(QThread):
             # 清理临时文件
             if 'bbox_file' in locals() and bbox_file.exists():
                 bbox_file.unlink()
+            # 模型保持常驻以便下次处理复用，设备内存紧张时才释放
+            if getattr(self.args, "model_manager", None) is not None:
+                self.args.model_manager.trim()
+    
+    @property
+    def dropped_frames(self):
+        """界面线程来不及显示而被新帧覆盖的帧数，用于诊断"""
+        return self.frame_mailbox.dropped_frames
     
     def stop(self):
         """停止处理线程"""
@@ -1,10 +1,19 @@
-import cv2
 import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal, QMutex, QDateTime
 
+from micro_tracker.utils.frame_mailbox import FrameMailbox
+from micro_tracker.utils.video_frame_reader import VideoFrameReader, fit_frame_to_display
+
+# 暂停时在当前帧之后预先解码的帧数
+READ_AHEAD_FRAMES = 8
+
 class VideoThread(QThread):
-    """视频读取线程，用于显示视频第一帧和滑动浏览视频帧"""
-    frame_ready = pyqtSignal(np.ndarray)
+    """
+    视频读取线程，用于显示视频第一帧和滑动浏览视频帧
+
+    帧通过VideoFrameReader读取: 顺序播放不再每帧seek，滑动浏览优先命中光标附近的解码帧缓存
+    """
+    frame_ready = pyqtSignal(np.ndarray, int, int)  # (显示帧, 原始帧宽, 原始帧高)，显示帧可能是缩小的代理帧
     frame_index_changed = pyqtSignal(int)  # 添加帧索引变化信号
     
     def __init__(self, video_path):
@@ -16,20 +25,24 @@ class VideoThread(QThread):
         self.total_frames = 0
         self.fps = 30  # 默认帧率，会在run()中更新为实际帧率
         self.frame_time_ms = 33  # 默认帧间隔(毫秒)，会在run()中更新
-        self.cap = None
+        self.reader = None
+        self.display_size = None  # 显示区域的物理像素尺寸，帧按此尺寸缩小后发送
         self.mutex = QMutex()  # 添加互斥锁保护共享数据
         self.frame_changed = False  # 标记是否请求了新帧
         self.last_frame_time = 0  # 上一帧的时间戳
+        # 帧和帧索引经单槽邮箱送到界面线程，界面处理不过来时只保留最新的一帧
+        self.frame_mailbox = FrameMailbox(self.frame_ready, self)
+        self.index_mailbox = FrameMailbox(self.frame_index_changed, self)
         
     def run(self):
-        self.cap = cv2.VideoCapture(self.video_path)
-        if not self.cap.isOpened():
+        self.reader = VideoFrameReader(self.video_path)
+        if not self.reader.isOpened():
             print(f"Error: Could not open video file {self.video_path}")
             return
             
         # 获取视频信息
-        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.total_frames = self.reader.total_frames
+        self.fps = self.reader.fps
         if self.fps <= 0:
             self.fps = 30  # 如果无法获取帧率，使用默认值
         
@@ -37,11 +50,10 @@ class VideoThread(QThread):
         self.frame_time_ms = int(1000 / self.fps)
         
         # 立即读取第一帧
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        ret, frame = self.cap.read()
-        if ret:
-            self.frame_ready.emit(frame)
-            self.frame_index_changed.emit(0)  # 发送初始帧索引信号
+        frame = self.reader.read(0)
+        if frame is not None:
+            self._post_frame(frame, self.display_size)
+            self.index_mailbox.post(0)  # 发送初始帧索引信号
         
         self.last_frame_time = QDateTime.currentMSecsSinceEpoch()
         
@@ -51,18 +63,18 @@ class VideoThread(QThread):
             self.mutex.lock()
             paused = self.paused
             current_index = self.frame_index
+            display_size = self.display_size
             frame_changed = self.frame_changed
             self.frame_changed = False  # 重置标志
             self.mutex.unlock()
             
             if not paused or frame_changed:
-                # 设置视频位置并读取帧
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, current_index)
-                ret, frame = self.cap.read()
+                # 读取帧: 顺序播放时直接复用解码器位置，跳转时优先命中缓存
+                frame = self.reader.read(current_index)
                 
-                if ret:
-                    self.frame_ready.emit(frame)
-                    self.frame_index_changed.emit(current_index)  # 发送帧索引变化信号
+                if frame is not None:
+                    self._post_frame(frame, display_size)
+                    self.index_mailbox.post(current_index)  # 发送帧索引变化信号
                     
                     # 更新时间戳
                     self.last_frame_time = current_time
@@ -99,12 +111,20 @@ class VideoThread(QThread):
                 else:
                     # 如果处理时间已经超过了帧间隔，至少休眠1毫秒避免CPU占用过高
                     self.msleep(1)
+            elif not frame_changed and self.reader.read_ahead(current_index, READ_AHEAD_FRAMES):
+                # 暂停时逐帧预先解码当前帧之后的帧，每次只解码一帧以便及时响应跳转请求
+                self.msleep(1)
             else:
                 # 如果暂停，则较长时间休眠以减少CPU使用
                 self.msleep(100)
         
-        if self.cap:
-            self.cap.release()
+        if self.reader:
+            self.reader.release()
+    
+    @property
+    def dropped_frames(self):
+        """界面线程来不及显示而被新帧覆盖的帧数，用于诊断"""
+        return self.frame_mailbox.dropped_frames
     
     def stop(self):
         """停止线程并等待其结束"""
@@ -118,6 +138,18 @@ class VideoThread(QThread):
         self.frame_changed = True  # 标记需要切换到新帧
         self.mutex.unlock()
         
+    def set_display_size(self, width, height):
+        """设置显示区域尺寸，尺寸变化时按新尺寸重新发送当前帧"""
+        self.mutex.lock()
+        if self.display_size != (width, height):
+            self.display_size = (width, height)
+            self.frame_changed = True
+        self.mutex.unlock()
+    
+    def _post_frame(self, frame, display_size):
+        h, w = frame.shape[:2]
+        self.frame_mailbox.post(fit_frame_to_display(frame, display_size), w, h)
+    
     def toggle_pause(self):
         """切换暂停/播放状态"""
         self.mutex.lock()
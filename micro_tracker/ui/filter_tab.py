@@ -227,6 +227,13 @@ class FilterTab(BaseTab):
         self.main_window.um_per_pixel_input.setMinimumHeight(24)
         param_setting_layout.addRow("比例系数 (" + "<span style='font-family: \"Times New Roman\", Arial, sans-serif;'>μm</span>" + "/pixel):", self.main_window.um_per_pixel_input)
         
+        # 并行进程数
+        self.main_window.filter_workers_input = QLineEdit("1")
+        self.main_window.filter_workers_input.setValidator(QRegExpValidator(QRegExp(r'[1-9][0-9]{0,2}')))
+        self.main_window.filter_workers_input.setMinimumHeight(24)
+        self.main_window.filter_workers_input.setToolTip("读取和测量掩膜时使用的进程数，1表示串行处理")
+        param_setting_layout.addRow("并行进程数:", self.main_window.filter_workers_input)
+        
         param_setting_group.setLayout(param_setting_layout)
         return param_setting_group
     
@@ -10,7 +10,7 @@ from pathlib import Path
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QLabel, 
                             QFileDialog, QMessageBox, QApplication, QTabWidget)
 from PyQt5.QtGui import QIcon, QTextCursor
-from PyQt5.QtCore import Qt, QDateTime, QMutex
+from PyQt5.QtCore import Qt, QDateTime, QMutex, pyqtSignal
 
 from micro_tracker.config.style import COMPLETE_STYLE
 from micro_tracker.ui.setup_tab import SetupTab
@@ -20,10 +20,16 @@ from micro_tracker.ui.guide_tab import GuideTab
 from micro_tracker.threads.video_processing_threads import VideoThread, ProcessingThread, FilterMaskThread, FilterVideoThread
 from micro_tracker.controllers.processing_controller import ProcessingController
 from micro_tracker.controllers.filter_controller import FilterController
+from micro_tracker.utils.model_manager import ModelManager
+from utils.label_stream import label_stream_path
+from utils.mask_stack import mask_stack_path
 
 class MainWindow(QMainWindow):
     """主窗口类，集成所有UI组件和功能"""
     
+    # 后台预加载模型失败时发出(在预加载线程中发出，日志在界面线程中记录)
+    model_warm_up_failed = pyqtSignal(str)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Micro Tracker | 显微视频目标分割和追踪工具")
@@ -55,6 +61,10 @@ class MainWindow(QMainWindow):
         # 记录当前聚焦的视频标签，用于键盘控制
         self.focused_video = None
         
+        # 常驻模型管理器，多次处理之间复用已加载的模型
+        self.model_manager = ModelManager()
+        self.model_warm_up_failed.connect(lambda message: self.log_message(message, "warning"))
+        
         # 初始化控制器
         self.processing_controller = ProcessingController(self)
         self.filter_controller = FilterController(self)
@@ -137,6 +147,24 @@ class MainWindow(QMainWindow):
             self.model_path_edit.setToolTip(file_path)
             self.log_message(f"选择模型文件: {file_path}", "info")
             self.check_start_enabled()
+            self.warm_up_model()
+    
+    def warm_up_model(self):
+        """在后台预加载当前选择的模型和设备，开始处理时可直接使用"""
+        if not (self.model_path and os.path.exists(self.model_path)):
+            return
+        device = self.device_combo.currentData()
+        if self.model_manager.is_loaded(self.model_path, device):
+            return
+        self.log_message(f"正在后台预加载模型到{device}设备...", "info")
+        future = self.model_manager.warm_up(self.model_path, device)
+        future.add_done_callback(self._on_model_warm_up_done)
+    
+    def _on_model_warm_up_done(self, future):
+        """预加载完成时在预加载线程中调用，失败时通过信号在界面线程中记录日志"""
+        if future.cancelled() or future.exception() is None:
+            return
+        self.model_warm_up_failed.emit(f"后台预加载模型失败，开始处理时将重新加载: {future.exception()}")
     
     def browse_output(self):
         """设置输出视频文件路径"""
@@ -178,7 +206,13 @@ class MainWindow(QMainWindow):
             # 检查是否含有掩膜图片
             mask_files = [f for f in os.listdir(dir_path) if f.endswith('.png') and f.startswith('frame_')]
             
-            if mask_files:
+            if os.path.exists(label_stream_path(dir_path)):
+                self.log_message("找到标签流文件，将按需从磁盘读取掩膜", "info")
+                self.apply_filter_btn.setEnabled(True)
+            elif os.path.exists(mask_stack_path(dir_path)):
+                self.log_message("找到掩膜栈文件，将按需从磁盘读取掩膜", "info")
+                self.apply_filter_btn.setEnabled(True)
+            elif mask_files:
                 self.log_message(f"找到 {len(mask_files)} 个掩膜图片", "info")
                 self.apply_filter_btn.setEnabled(True)
             else:
@@ -254,6 +288,7 @@ class MainWindow(QMainWindow):
         self.video_thread = VideoThread(self.video_path)
         self.video_thread.frame_ready.connect(self.update_video_frame)
         self.video_thread.frame_index_changed.connect(self.update_frame_slider)
+        self.video_label.attach_frame_source(self.video_thread)
         
         # 启动视频线程 - 线程默认已设置为暂停状态
         self.video_thread.start()
@@ -310,7 +345,8 @@ class MainWindow(QMainWindow):
                 
                 # 检查掩膜目录中是否有图片
                 mask_files = [f for f in os.listdir(self.mask_dir) if f.endswith('.png') and f.startswith('frame_')]
-                if mask_files:
+                if (mask_files or os.path.exists(mask_stack_path(self.mask_dir))
+                        or os.path.exists(label_stream_path(self.mask_dir))):
                     self.apply_filter_btn.setEnabled(True)
                     self.log_message(f"已自动加载掩膜目录: {self.mask_dir}", "info")
         else:
@@ -363,10 +399,10 @@ class MainWindow(QMainWindow):
                 border-radius: 6px;
             """)
     
-    def update_video_frame(self, frame):
-        """更新视频帧显示"""
+    def update_video_frame(self, frame, source_width, source_height):
+        """更新视频帧显示，frame为按显示尺寸缩小的代理帧"""
         if frame is not None:
-            self.video_label.set_frame(frame)
+            self.video_label.set_frame(frame, source_width, source_height)
     
     def update_frame_slider(self, frame_index):
         """更新当前帧滑块位置，但不触发新的帧加载"""
@@ -406,7 +442,7 @@ class MainWindow(QMainWindow):
                 self.log_message("视频预览开始播放", "info")
     
     def update_result_frame(self, frame, current_idx, total_frames):
-        """更新结果预览帧"""
+        """更新跟踪过程中的实时预览帧(限速发布的缩小叠加帧)"""
         if frame is None:
             return
         
@@ -422,10 +458,6 @@ class MainWindow(QMainWindow):
         # 更新结果信息标签
         percent = int((current_idx + 1) / total_frames * 100)
         self.result_info_label.setText(f"处理结果: {current_idx+1} / {total_frames} ({percent}%)")
-        
-        # 定期更新日志（避免大量更新），每50帧或达到100%时更新一次
-        if current_idx % 50 == 0 or current_idx == total_frames - 1:
-            self.log_message(f"已处理: {current_idx+1}/{total_frames} 帧 ({percent}%)", "info")
     
     def update_result_frame_slider(self, frame_index):
         """更新结果预览帧滑块位置，但不触发新的帧加载"""
@@ -439,10 +471,10 @@ class MainWindow(QMainWindow):
         percent = int((frame_index + 1) / total_frames * 100) if total_frames > 0 else 0
         self.result_info_label.setText(f"处理结果: {frame_index+1} / {total_frames} ({percent}%)")
     
-    def update_result_video_frame(self, frame):
-        """更新结果预览的视频帧"""
+    def update_result_video_frame(self, frame, source_width, source_height):
+        """更新结果预览的视频帧，frame为按显示尺寸缩小的代理帧"""
         if frame is not None:
-            self.result_label.setVideoFrame(frame)
+            self.result_label.setVideoFrame(frame, source_width, source_height)
     
     def set_result_frame_index(self, index):
         """设置结果预览的帧索引"""
@@ -215,6 +215,8 @@ class SetupTab(BaseTab):
                 border-radius: 0 0 4px 4px;
             }
         """)
+        # 切换设备时在后台预加载模型
+        self.main_window.device_combo.currentIndexChanged.connect(lambda _: self.main_window.warm_up_model())
         param_layout.addRow("处理设备:", self.main_window.device_combo)
         
         # 保存视频选项
@@ -243,8 +245,22 @@ class SetupTab(BaseTab):
         mask_save_layout.addWidget(mask_save_label)
         mask_save_layout.addStretch(1)
         
+        mask_stream_layout = QHBoxLayout()
+        mask_stream_layout.setSpacing(5)
+        self.main_window.mask_stream_check = QCheckBox()
+        self.main_window.mask_stream_check.setChecked(False)
+        self.main_window.mask_stream_check.setMinimumHeight(24)  # 设置复选框高度
+        self.main_window.mask_stream_check.setToolTip("将16位标签掩膜逐帧压缩保存为单个 labels.mtl 文件，不再逐帧保存PNG图片")
+        mask_stream_label = QLabel("单文件标签流")
+        mask_stream_label.setStyleSheet("font-weight: normal;")
+        mask_stream_layout.addWidget(self.main_window.mask_stream_check)
+        mask_stream_layout.addWidget(mask_stream_label)
+        mask_stream_layout.addStretch(1)
+        self.main_window.save_mask_check.toggled.connect(self.main_window.mask_stream_check.setEnabled)
+        
         save_options_layout.addLayout(video_save_layout)
         save_options_layout.addLayout(mask_save_layout)
+        save_options_layout.addLayout(mask_stream_layout)
         
         param_layout.addRow("输出选项:", save_options_layout)
         
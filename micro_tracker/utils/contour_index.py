@@ -0,0 +1,82 @@
+"""
+轮廓空间索引模块
+---------------
+按帧为每个对象的轮廓点分别建立KD树，用于相互最短距离筛选中快速查询
+"阈值范围内距离最近的其他对象"，距离基于全部轮廓点精确计算。
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class FrameContourIndex:
+    """
+    轨迹表中每一帧轮廓点的空间索引，首次查询某帧时建立并缓存
+
+    每个对象的轮廓点单独建立KD树，查询时先用轮廓外接框排除距离超过阈值的对象，
+    只在剩余的其他对象的KD树中查找最近点，查询开销与对象自身的轮廓点数呈线性关系，
+    不会因搜索半径覆盖对象自身而退化为轮廓点数的平方。
+    """
+
+    def __init__(self, table):
+        """
+        初始化轮廓索引
+
+        Args:
+            table: TrajectoryTable轨迹表
+        """
+        self.table = table
+        self._frame_rows = {}  # {帧: [行号, ...]}
+        for row, frame in enumerate(table['frame'].tolist()):
+            self._frame_rows.setdefault(frame, []).append(row)
+        self._frames = {}  # {帧: (对象ID数组, 外接框数组 (N, 4), [KD树, ...])}
+
+    def _frame_entry(self, frame):
+        entry = self._frames.get(frame)
+        if entry is None:
+            rows = np.asarray(self._frame_rows.get(frame, []), dtype=np.int64)
+            contours = [self.table.contour(row).reshape(-1, 2) for row in rows]
+            # 外接框 [x_min, y_min, x_max, y_max]，空轮廓的外接框为空区间，不会成为候选
+            bounds = np.array([np.concatenate([c.min(axis=0), c.max(axis=0)]) if len(c)
+                               else [np.inf, np.inf, -np.inf, -np.inf] for c in contours],
+                              dtype=np.float64).reshape(-1, 4)
+            trees = [cKDTree(c) for c in contours]
+            entry = self._frames[frame] = (self.table['obj_id'][rows], bounds, trees)
+        return entry
+
+    def nearest_other(self, row, max_distance):
+        """
+        查找与第row行对象在同一帧中距离不超过max_distance(像素)的最近其他对象
+
+        Args:
+            row: 轨迹表行号
+            max_distance: 搜索半径(像素)
+
+        Returns:
+            tuple: (对象ID, 轮廓间最短距离)，范围内没有其他对象时返回 (None, inf)
+        """
+        obj_id = self.table['obj_id'][row]
+        obj_ids, bounds, trees = self._frame_entry(int(self.table['frame'][row]))
+        obj_points = self.table.contour(row).reshape(-1, 2)
+        if len(obj_points) == 0:
+            return None, float('inf')
+
+        # 外接框之间的距离是轮廓间距离的下界，超过搜索半径的对象无需查询
+        obj_bounds = np.concatenate([obj_points.min(axis=0), obj_points.max(axis=0)])
+        gap_x = np.maximum(0, np.maximum(bounds[:, 0] - obj_bounds[2], obj_bounds[0] - bounds[:, 2]))
+        gap_y = np.maximum(0, np.maximum(bounds[:, 1] - obj_bounds[3], obj_bounds[1] - bounds[:, 3]))
+        candidates = np.flatnonzero((np.hypot(gap_x, gap_y) <= max_distance) & (obj_ids != obj_id))
+
+        # query 只返回距离严格小于上界的点，上界取略大于半径的值使半径上的点也被包含
+        upper_bound = np.nextafter(max_distance, np.inf)
+        best_id, best_distance = None, float('inf')
+        for i in candidates:
+            distances, _ = trees[i].query(obj_points, k=1, distance_upper_bound=upper_bound)
+            distance = float(distances.min())
+            # 距离相同时取ID较小的对象，保证结果确定
+            other_id = int(obj_ids[i])
+            if distance < best_distance or (distance == best_distance and best_id is not None and other_id < best_id):
+                best_id, best_distance = other_id, distance
+        if best_id is None:
+            return None, float('inf')
+        return best_id, best_distance
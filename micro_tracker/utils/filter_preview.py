@@ -0,0 +1,162 @@
+"""
+筛选结果预览渲染模块
+-------------------
+按需渲染筛选结果的可视化帧(对象着色、轨迹、主次轴和ID标签)，
+已渲染的帧保存在有界的LRU缓存中，内存占用与视频长度无关。
+"""
+
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class FilterPreviewRenderer:
+    """
+    筛选结果预览帧的按需渲染器
+
+    支持 len() 和按帧索引访问，可直接替代预先生成的帧列表。每个对象的轨迹点是轨迹表中
+    连续的行，渲染时直接以截至当前帧的行切片作为折线绘制，任意跳转都无需重建状态。
+    """
+
+    def __init__(self, masks, table, object_colors, um_per_pixel, cache_size=32):
+        """
+        初始化渲染器
+
+        Args:
+            masks: 原始标签掩膜栈，形状为 (帧数, 高, 宽)
+            table: 通过筛选的轨迹表TrajectoryTable
+            object_colors: {obj_id: (r, g, b)} 对象颜色
+            um_per_pixel: 像素比例(μm/pixel)，用于将主次轴长度换算为像素
+            cache_size: 缓存的渲染帧数
+        """
+        self.masks = masks
+        self.table = table
+        self.um_per_pixel = um_per_pixel
+        self.cache_size = cache_size
+        self.num_frames = len(masks)
+
+        # 颜色查找表，行号为对象ID
+        max_label = np.iinfo(masks.dtype).max if np.issubdtype(masks.dtype, np.integer) else 0
+        max_id = int(table.object_ids.max()) if table.num_objects else 0
+        self._colors = np.zeros((max(max_label, max_id) + 1, 3), dtype=np.uint8)
+        for obj_id, color in object_colors.items():
+            self._colors[obj_id] = color
+
+        # 每一帧中出现的对象所在的行(帧内按对象ID升序)
+        order = np.argsort(table['frame'], kind='stable')
+        bounds = np.searchsorted(table['frame'][order], np.arange(self.num_frames + 1))
+        self._frame_rows = [order[bounds[i]:bounds[i + 1]] for i in range(self.num_frames)]
+
+        # 轨迹折线的顶点(中心点像素坐标)，以及每一行所属对象在轨迹表中的起始行
+        self._centers = np.stack([table['center_x_px'], table['center_y_px']], axis=1).astype(np.int32)
+        obj_ids = table['obj_id']
+        is_first = np.ones(len(obj_ids), dtype=bool)
+        is_first[1:] = obj_ids[1:] != obj_ids[:-1]
+        self._obj_start_row = np.maximum.accumulate(np.where(is_first, np.arange(len(obj_ids)), 0))
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, frame_idx):
+        """返回第frame_idx帧的可视化图像，返回的图像不应被修改"""
+        if not 0 <= frame_idx < self.num_frames:
+            raise IndexError(frame_idx)
+
+        with self._lock:
+            frame = self._cache.get(frame_idx)
+            if frame is not None:
+                self._cache.move_to_end(frame_idx)
+                return frame
+
+            frame = self._render(frame_idx)
+            self._cache[frame_idx] = frame
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return frame
+
+    def _render(self, frame_idx):
+        rows = self._frame_rows[frame_idx]
+        ids_in_frame = self.table['obj_id'][rows]
+
+        # 对象着色: 只有当前帧通过筛选的对象保留颜色
+        lut = np.zeros_like(self._colors)
+        lut[ids_in_frame] = self._colors[ids_in_frame]
+        vis_mask = lut[self.masks[frame_idx]]
+
+        # 依次绘制当前帧中每个对象截至当前帧的轨迹和主次轴，并收集ID标签以便最后绘制在最上层
+        id_labels = []
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 1.0
+        thickness = 2
+        for row in rows.tolist():
+            start = int(self._obj_start_row[row])
+            if row > start:
+                color = tuple(int(c) for c in self._colors[self.table['obj_id'][row]])
+                cv2.polylines(vis_mask, [self._centers[start:row + 1]], False, color, 2)
+
+            center = (int(self.table['center_x_px'][row]), int(self.table['center_y_px'][row]))
+
+            # 计算文本大小以进行居中放置
+            id_text = str(int(self.table['obj_id'][row]))
+            (text_width, text_height), baseline = cv2.getTextSize(id_text, font, font_scale, thickness)
+            text_x = int(center[0] - text_width/2)
+            text_y = int(center[1] + text_height/2)
+            id_labels.append((id_text, (text_x, text_y)))
+
+            self._draw_axes(vis_mask, center, self.table['major_axis'][row], self.table['minor_axis'][row],
+                            self.table['angle'][row], self.table.contour(row))
+
+        for id_text, pos in id_labels:
+            # 绘制白色文本
+            cv2.putText(vis_mask, id_text, pos, font, font_scale, (255, 255, 255), thickness)
+
+        return vis_mask
+
+    def _draw_axes(self, vis_mask, center, major_axis, minor_axis, angle, contour):
+        """绘制主轴（红色）和次轴（蓝色）"""
+        if not (major_axis > 0 and minor_axis > 0):
+            return
+
+        # 转换为像素单位
+        major_axis_px = major_axis / self.um_per_pixel
+        minor_axis_px = minor_axis / self.um_per_pixel
+
+        # 重新拟合椭圆以确定主轴方向，需要至少5个点
+        if len(contour) < 5:
+            return
+        try:
+            center_point, axes_len, ellipse_angle = cv2.fitEllipse(contour)
+
+            # 如果宽是主轴，则角度不变；如果高是主轴，则角度加90度
+            if axes_len[0] > axes_len[1]:
+                major_angle = ellipse_angle
+            else:
+                major_angle = (ellipse_angle + 90) % 180
+
+            # 次轴垂直于主轴
+            minor_angle = (major_angle + 90) % 180
+            major_angle_rad = np.deg2rad(major_angle)
+            minor_angle_rad = np.deg2rad(minor_angle)
+        except:
+            # 如果重新拟合失败，使用记录的角度
+            major_angle_rad = np.deg2rad(angle)
+            minor_angle_rad = major_angle_rad + np.pi/2
+
+        # 计算主轴和次轴端点
+        dx_major = major_axis_px * np.cos(major_angle_rad)
+        dy_major = major_axis_px * np.sin(major_angle_rad)
+        dx_minor = minor_axis_px * np.cos(minor_angle_rad)
+        dy_minor = minor_axis_px * np.sin(minor_angle_rad)
+
+        pt1_major = (int(center[0] - dx_major), int(center[1] - dy_major))
+        pt2_major = (int(center[0] + dx_major), int(center[1] + dy_major))
+        cv2.line(vis_mask, pt1_major, pt2_major, (0, 0, 255), 2)
+
+        pt1_minor = (int(center[0] - dx_minor), int(center[1] - dy_minor))
+        pt2_minor = (int(center[0] + dx_minor), int(center[1] + dy_minor))
+        cv2.line(vis_mask, pt1_minor, pt2_minor, (255, 0, 0), 2)
@@ -0,0 +1,54 @@
+"""
+帧邮箱模块
+---------
+工作线程与界面控件之间的单槽帧传递: 工作线程投递的帧只保留最新的一帧，界面线程空闲时
+再取出发送。界面线程处理不过来时，尚未取走的旧帧被新帧覆盖并计为丢弃，
+事件队列中不会堆积大量帧数据，控件总是绘制最新的帧。
+"""
+
+import threading
+
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+
+
+class FrameMailbox(QObject):
+    """
+    最新帧优先的单槽邮箱
+
+    需要在界面线程中创建。工作线程调用 post() 投递参数，界面线程在事件循环中取出最新的
+    参数并通过 signal 发出，连接到 signal 的槽函数因此在界面线程中直接调用。
+    """
+
+    _posted = pyqtSignal()
+
+    def __init__(self, signal, parent=None):
+        """
+        Args:
+            signal: 取出帧时发出的信号(已绑定到对象)，参数与 post() 的参数一致
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self._signal = signal
+        self._lock = threading.Lock()
+        self._payload = None
+        self.posted_frames = 0  # 投递的帧数
+        self.dropped_frames = 0  # 未发出就被新帧覆盖的帧数
+        self._posted.connect(self._deliver, Qt.QueuedConnection)
+
+    def post(self, *payload):
+        """投递一帧，若上一帧尚未取走则覆盖它"""
+        with self._lock:
+            pending = self._payload is not None
+            if pending:
+                self.dropped_frames += 1
+            self._payload = payload
+            self.posted_frames += 1
+        # 只有邮箱由空变满时才通知界面线程，事件队列中最多只有一个通知
+        if not pending:
+            self._posted.emit()
+
+    def _deliver(self):
+        with self._lock:
+            payload, self._payload = self._payload, None
+        if payload is not None:
+            self._signal.emit(*payload)
@@ -0,0 +1,150 @@
+"""
+掩膜测量模块
+-----------
+对单帧标签掩膜(像素值为对象ID，背景为0)中的所有对象一次性提取面积、质心、
+椭圆拟合参数和边界接触信息。
+"""
+
+import cv2
+import numpy as np
+from scipy import ndimage
+
+from utils.mask_stack import open_mask_stack
+
+
+def label_ids(mask):
+    """返回掩膜中出现的所有对象ID(不含背景0)，按升序排列"""
+    counts = np.bincount(mask.ravel())
+    ids = np.flatnonzero(counts)
+    return ids[ids > 0]
+
+
+def boundary_label_ids(mask):
+    """返回接触图像边界的对象ID集合"""
+    edges = np.concatenate((mask[0, :], mask[-1, :], mask[:, 0], mask[:, -1]))
+    return {int(obj_id) for obj_id in np.unique(edges) if obj_id > 0}
+
+
+def measure_frame_objects(mask, frame_idx, fps, um_per_pixel):
+    """
+    测量一帧掩膜中所有对象的属性
+
+    每个对象只在其外扩1像素的包围盒内提取轮廓，轮廓坐标通过offset映射回整帧，
+    因此结果与在整帧二值掩膜上逐对象计算完全一致。
+
+    Args:
+        mask: 二维标签掩膜
+        frame_idx: 帧索引
+        fps: 帧率，用于计算时间
+        um_per_pixel: 像素比例(μm/pixel)
+
+    Returns:
+        list: [(obj_id, frame_data), ...]，按对象ID升序排列
+    """
+    h, w = mask.shape[:2]
+    touching_ids = boundary_label_ids(mask)
+    results = []
+
+    # find_objects一次扫描得到所有标签的包围盒，不存在的标签为None
+    for obj_id, bbox in enumerate(ndimage.find_objects(mask), start=1):
+        if bbox is None:
+            continue
+
+        # 外扩1像素，保证裁剪区域的边界条件与整帧一致
+        y0 = max(bbox[0].start - 1, 0)
+        y1 = min(bbox[0].stop + 1, h)
+        x0 = max(bbox[1].start - 1, 0)
+        x1 = min(bbox[1].stop + 1, w)
+
+        obj_mask = (mask[y0:y1, x0:x1] == obj_id).astype(np.uint8) * 255
+        contours, _ = cv2.findContours(obj_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+
+        if not contours:
+            continue
+
+        # 获取最大轮廓
+        largest_contour = max(contours, key=cv2.contourArea)
+
+        # 计算面积 (单位: μm²)
+        area_pixels = cv2.contourArea(largest_contour)
+        area_um2 = area_pixels * (um_per_pixel ** 2)
+
+        # 计算质心
+        M = cv2.moments(largest_contour)
+        if M["m00"] == 0:
+            continue
+
+        cx = int(M["m10"] / M["m00"])
+        cy = int(M["m01"] / M["m00"])
+
+        # 尝试椭圆拟合
+        major_axis = 0
+        minor_axis = 0
+        angle = 0
+
+        if len(largest_contour) >= 5:  # 需要至少5个点才能拟合椭圆
+            try:
+                ellipse = cv2.fitEllipse(largest_contour)
+                center, axes, angle = ellipse
+
+                # 转换为实际单位 (μm)
+                major_axis = max(axes) * um_per_pixel / 2
+                minor_axis = min(axes) * um_per_pixel / 2
+
+                # 确保角度在0-180度范围内
+                angle = angle % 180
+            except:
+                pass
+
+        frame_data = {
+            'frame': frame_idx,
+            'time': frame_idx / fps,  # 单位为秒
+            'area': area_um2,
+            'center_x': cx * um_per_pixel,
+            'center_y': cy * um_per_pixel,
+            'center_x_px': cx,
+            'center_y_px': cy,
+            'major_axis': major_axis,
+            'minor_axis': minor_axis,
+            'angle': angle,
+            'touches_boundary': obj_id in touching_ids,
+            'contour': largest_contour
+        }
+        results.append((obj_id, frame_data))
+
+    return results
+
+
+# ==== 进程池工作函数 ====
+# 以下函数在筛选线程的工作进程中执行，参数和返回值均需可序列化
+
+_worker_stacks = {}  # 工作进程中已打开的标签流或掩膜栈 {路径: 内存映射数组或LabelStreamReader}
+
+
+def _worker_stack(stack_path):
+    stack = _worker_stacks.get(stack_path)
+    if stack is None:
+        stack = _worker_stacks[stack_path] = open_mask_stack(stack_path)
+    return stack
+
+
+def read_mask_file(mask_path):
+    """读取一张8位或16位掩膜图片，返回 (掩膜, 对象ID数组)，读取失败时均为None"""
+    mask = cv2.imread(mask_path, cv2.IMREAD_UNCHANGED)
+    if mask is None:
+        return None, None
+    if mask.ndim == 3:
+        mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY if mask.shape[2] == 3 else cv2.COLOR_BGRA2GRAY)
+    return mask, label_ids(mask)
+
+
+def stack_frame_ids(task):
+    """返回掩膜栈中一帧的对象ID数组，task为 (掩膜栈路径, 帧索引)"""
+    stack_path, frame_idx = task
+    return label_ids(_worker_stack(stack_path)[frame_idx])
+
+
+def measure_stack_frame(task):
+    """测量掩膜栈中一帧的所有对象，task为 (掩膜栈路径, 帧索引, 帧率, 像素比例)"""
+    stack_path, frame_idx, fps, um_per_pixel = task
+    return measure_frame_objects(_worker_stack(stack_path)[frame_idx], frame_idx, fps, um_per_pixel)
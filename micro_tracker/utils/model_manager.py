@@ -0,0 +1,172 @@
+"""
+常驻模型管理模块
+---------------
+以 (检查点, 设备, 配置) 为键缓存已加载的SAM2视频预测器，多次处理之间复用同一个模型，
+避免每次开始处理都重新组合Hydra配置、实例化模型和加载检查点。
+设备内存不足时按最近最少使用的顺序释放空闲模型，并支持在后台线程中预先加载模型。
+"""
+
+import gc
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+# 同时常驻的模型数上限
+MAX_RESIDENT_MODELS = 2
+# 设备可用内存低于总内存的该比例时视为内存紧张
+MIN_FREE_MEMORY_FRACTION = 0.15
+
+
+def resolve_device(device):
+    """CUDA不可用时回退到CPU，与处理线程的设备选择一致"""
+    if device.startswith("cuda") and not torch.cuda.is_available():
+        return "cpu"
+    return device
+
+
+def _available_memory(device):
+    """返回设备的 (可用内存, 总内存) 字节数，无法获取时返回None"""
+    if device.startswith("cuda"):
+        return torch.cuda.mem_get_info(torch.device(device))
+
+    # CPU内存只在Linux上通过 /proc/meminfo 获取
+    try:
+        with open("/proc/meminfo") as f:
+            meminfo = dict(line.split(":", 1) for line in f)
+        available = int(meminfo["MemAvailable"].split()[0]) * 1024
+        total = int(meminfo["MemTotal"].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        return None
+    return available, total
+
+
+class ModelManager:
+    """
+    常驻模型管理器，各方法可在任意线程中调用
+
+    模型构建是串行的: 后台预加载与处理线程请求同一个模型时，后者等待预加载完成后直接复用。
+    被释放的模型若仍在某次处理中使用，会在该次处理结束后才真正释放内存。
+    """
+
+    def __init__(self, max_models=MAX_RESIDENT_MODELS, min_free_fraction=MIN_FREE_MEMORY_FRACTION, build_func=None):
+        """
+        Args:
+            max_models: 同时常驻的模型数上限
+            min_free_fraction: 设备可用内存低于总内存的该比例时释放空闲模型
+            build_func: 模型构建函数 (model_cfg, model_path, device) -> predictor，默认为build_sam2_video_predictor
+        """
+        self.max_models = max_models
+        self.min_free_fraction = min_free_fraction
+        self._build_func = build_func
+        self._models = OrderedDict()  # {(检查点, 设备, 配置): predictor}，按最近使用排序
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model_warm_up")
+
+    def _key(self, model_path, device, model_cfg=None):
+        if model_cfg is None:
+            from utils.utils import determine_model_cfg
+            model_cfg = determine_model_cfg(model_path)
+        return os.path.abspath(model_path), resolve_device(device), model_cfg
+
+    def is_loaded(self, model_path, device, model_cfg=None):
+        """模型是否已常驻，无法识别的模型返回False"""
+        try:
+            key = self._key(model_path, device, model_cfg)
+        except ValueError:
+            return False
+        with self._lock:
+            return key in self._models
+
+    def get(self, model_path, device, model_cfg=None):
+        """返回已加载的预测器，未加载时在当前线程中构建"""
+        key = self._key(model_path, device, model_cfg)
+        with self._lock:
+            predictor = self._models.get(key)
+            if predictor is not None:
+                self._models.move_to_end(key)
+                return predictor
+
+        with self._build_lock:
+            # 等待期间可能已由其他线程构建完成
+            with self._lock:
+                predictor = self._models.get(key)
+                if predictor is not None:
+                    self._models.move_to_end(key)
+                    return predictor
+
+            # 为新模型腾出位置: 超出数量上限或设备内存紧张时释放其他模型
+            self._evict(keep=self.max_models - 1)
+            if self._under_memory_pressure(key[1]):
+                self._evict(keep=0)
+
+            predictor = self._build(*key)
+            with self._lock:
+                self._models[key] = predictor
+            return predictor
+
+    def warm_up(self, model_path, device):
+        """
+        在后台线程中预先加载模型，返回Future
+
+        加载失败时异常保存在Future中(future.exception())，由调用方决定如何报告；
+        预加载失败不影响使用，开始处理时会重新加载并报告错误
+        """
+        return self._executor.submit(self.get, os.path.abspath(model_path), device)
+
+    def trim(self):
+        """设备内存紧张时按最近最少使用的顺序释放模型，最近使用的模型保留到内存仍不足为止"""
+        # 与模型构建互斥，避免构建中途腾出的内存被误判或刚构建的模型被立即释放
+        with self._build_lock:
+            with self._lock:
+                devices = {key[1] for key in self._models}
+            for device in devices:
+                while self._under_memory_pressure(device) and self._evict_one(device):
+                    pass
+
+    def clear(self):
+        """释放所有常驻模型"""
+        self._evict(keep=0)
+
+    def _build(self, model_path, device, model_cfg):
+        build_func = self._build_func
+        if build_func is None:
+            from models.sam2.sam2.build_sam import build_sam2_video_predictor
+            build_func = lambda cfg, path, dev: build_sam2_video_predictor(cfg, path, device=dev)
+        return build_func(model_cfg, model_path, device)
+
+    def _under_memory_pressure(self, device):
+        memory = _available_memory(device)
+        if memory is None:
+            return False
+        available, total = memory
+        return available < self.min_free_fraction * total
+
+    def _evict(self, keep):
+        """只保留最近使用的keep个模型"""
+        with self._lock:
+            evicted = []
+            while len(self._models) > keep:
+                evicted.append(self._models.popitem(last=False)[1])
+        if evicted:
+            self._release(evicted)
+
+    def _evict_one(self, device):
+        """释放指定设备上最久未使用的模型，没有可释放的模型时返回False"""
+        with self._lock:
+            key = next((key for key in self._models if key[1] == device), None)
+            if key is None:
+                return False
+            evicted = [self._models.pop(key)]
+        self._release(evicted)
+        return True
+
+    @staticmethod
+    def _release(predictors):
+        predictors.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
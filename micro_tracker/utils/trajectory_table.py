@@ -0,0 +1,143 @@
+"""
+列式轨迹表模块
+-------------
+以列式结构保存所有对象在每一帧的测量结果：每个字段一个NumPy数组，行按 (对象ID, 帧) 排序，
+轮廓点统一存放在一个不规则缓冲区中，通过偏移数组定位。
+"""
+
+import numpy as np
+
+# 字段名及其数据类型，字段含义与 measure_frame_objects 返回的 frame_data 一致
+TRAJECTORY_FIELDS = {
+    'obj_id': np.int32,
+    'frame': np.int32,
+    'area': np.float64,
+    'center_x': np.float64,
+    'center_y': np.float64,
+    'center_x_px': np.int32,
+    'center_y_px': np.int32,
+    'major_axis': np.float64,
+    'minor_axis': np.float64,
+    'angle': np.float64,
+    'touches_boundary': np.bool_,
+}
+
+
+class TrajectoryTable:
+    """所有对象轨迹的列式存储"""
+
+    def __init__(self, columns, contour_offsets, contour_points, fps):
+        """
+        初始化轨迹表
+
+        Args:
+            columns: {字段名: 一维数组}，所有数组长度相同且已按 (obj_id, frame) 排序
+            contour_offsets: 长度为行数+1的偏移数组，第i行的轮廓为 contour_points[offsets[i]:offsets[i+1]]
+            contour_points: 形状为 (点数, 2) 的int32数组
+            fps: 帧率，用于计算时间
+        """
+        self.columns = columns
+        self.contour_offsets = contour_offsets
+        self.contour_points = contour_points
+        self.fps = fps
+
+        # 每个对象在表中占据连续的行区间
+        ids, starts, counts = np.unique(columns['obj_id'], return_index=True, return_counts=True)
+        self.object_ids = ids
+        self._object_slices = {int(obj_id): slice(int(start), int(start + count))
+                               for obj_id, start, count in zip(ids, starts, counts)}
+
+    @classmethod
+    def empty(cls, fps=1.0):
+        """创建空轨迹表"""
+        columns = {name: np.empty(0, dtype=dtype) for name, dtype in TRAJECTORY_FIELDS.items()}
+        return cls(columns, np.zeros(1, dtype=np.int64), np.empty((0, 2), dtype=np.int32), fps)
+
+    def __len__(self):
+        return len(self.columns['obj_id'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def time(self):
+        """每一行对应的时间(秒)"""
+        return self.columns['frame'] / self.fps
+
+    @property
+    def num_objects(self):
+        return len(self.object_ids)
+
+    def object_slice(self, obj_id):
+        """返回对象的行区间，对象不存在时返回空区间"""
+        return self._object_slices.get(int(obj_id), slice(0, 0))
+
+    def frame_object_ids(self, num_frames):
+        """
+        建立帧到对象的索引
+
+        Args:
+            num_frames: 总帧数
+
+        Returns:
+            list: 长度为num_frames，第i项为第i帧中出现的对象ID数组
+        """
+        order = np.argsort(self.columns['frame'], kind='stable')
+        bounds = np.searchsorted(self.columns['frame'][order], np.arange(num_frames + 1))
+        ids = self.columns['obj_id'][order]
+        return [ids[bounds[i]:bounds[i + 1]] for i in range(num_frames)]
+
+    def contour(self, row):
+        """返回第row行的轮廓，形状为 (点数, 1, 2)，与cv2.findContours的输出格式一致"""
+        start, stop = self.contour_offsets[row], self.contour_offsets[row + 1]
+        return self.contour_points[start:stop].reshape(-1, 1, 2)
+
+    def take(self, rows):
+        """按行索引(需保持 (obj_id, frame) 顺序)提取子表"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {name: values[rows] for name, values in self.columns.items()}
+        lengths = self.contour_offsets[rows + 1] - self.contour_offsets[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if len(rows):
+            points = np.concatenate([self.contour_points[self.contour_offsets[r]:self.contour_offsets[r + 1]]
+                                     for r in rows])
+        else:
+            points = np.empty((0, 2), dtype=np.int32)
+        return TrajectoryTable(columns, offsets, points, self.fps)
+
+
+class TrajectoryTableBuilder:
+    """按帧追加测量结果，最后生成排序后的轨迹表"""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self._columns = {name: [] for name in TRAJECTORY_FIELDS}
+        self._contours = []
+
+    def append_frame(self, measurements):
+        """追加一帧的测量结果，measurements为 measure_frame_objects 的返回值"""
+        if not measurements:
+            return
+        for name, dtype in TRAJECTORY_FIELDS.items():
+            if name == 'obj_id':
+                values = [obj_id for obj_id, _ in measurements]
+            else:
+                values = [frame_data[name] for _, frame_data in measurements]
+            self._columns[name].append(np.array(values, dtype=dtype))
+        self._contours.extend(frame_data['contour'].reshape(-1, 2) for _, frame_data in measurements)
+
+    def build(self):
+        """生成按 (obj_id, frame) 排序的轨迹表"""
+        if not self._contours:
+            return TrajectoryTable.empty(self.fps)
+
+        columns = {name: np.concatenate(chunks) for name, chunks in self._columns.items()}
+        order = np.lexsort((columns['frame'], columns['obj_id']))
+        columns = {name: values[order] for name, values in columns.items()}
+
+        contours = [self._contours[i] for i in order]
+        offsets = np.zeros(len(contours) + 1, dtype=np.int64)
+        np.cumsum([len(c) for c in contours], out=offsets[1:])
+        points = np.concatenate(contours).astype(np.int32, copy=False)
+        return TrajectoryTable(columns, offsets, points, self.fps)
@@ -0,0 +1,172 @@
+"""
+视频帧随机访问模块
+-----------------
+封装 cv2.VideoCapture 的按帧号读取: 顺序播放时直接复用解码器位置逐帧读取，不再每帧seek；
+跳转时根据关键帧索引决定向前解码还是seek到关键帧，解码过的帧保存在按内存大小限制的
+LRU缓存中，拖动滑块在光标附近来回浏览时直接命中缓存。显示时再按视口尺寸生成代理帧。
+"""
+
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# 解码帧缓存的默认内存上限(字节)
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# seek后向前解码到目标帧时，目标帧之前最多缓存的帧数
+SEEK_CACHE_FRAMES = 16
+# 没有关键帧索引时，向前跳转不超过该帧数则直接解码而不seek
+MAX_FORWARD_DECODE = 30
+
+
+def load_keyframe_index(video_path):
+    """
+    只解复用不解码地扫描视频，返回升序排列的关键帧帧号数组
+
+    需要可选依赖 PyAV，未安装或扫描失败时返回None
+    """
+    try:
+        import av
+    except ImportError:
+        return None
+
+    try:
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            packets = [(packet.pts, packet.is_keyframe) for packet in container.demux(stream)
+                       if packet.pts is not None]
+    except Exception:
+        return None
+    if not packets:
+        return None
+
+    # 帧号按显示时间戳顺序排列
+    packets.sort()
+    keyframes = np.flatnonzero([is_keyframe for _, is_keyframe in packets])
+    return keyframes if len(keyframes) else None
+
+
+def fit_frame_to_display(frame, display_size):
+    """
+    生成显示用的代理帧: 按显示尺寸等比缩小帧，显示尺寸不小于帧时原样返回
+
+    Args:
+        frame: (H, W, C) 图像
+        display_size: (宽, 高) 显示区域的物理像素尺寸，为None时不缩放
+    """
+    if display_size is None:
+        return frame
+    h, w = frame.shape[:2]
+    scale = min(display_size[0] / w, display_size[1] / h)
+    if scale >= 1:
+        return frame
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+class VideoFrameReader:
+    """
+    按帧号读取视频帧
+
+    连续读取相邻帧时只调用 read()；向前跳转时若与目标帧之间没有关键帧，则直接解码过去，
+    否则seek到目标帧之前最近的关键帧再向前解码，并缓存目标帧之前的若干帧。
+    返回的帧与缓存共享，调用方不应修改。只应在一个线程中使用。
+    """
+
+    def __init__(self, video_path, cache_bytes=DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            video_path: 视频文件路径
+            cache_bytes: 解码帧缓存的内存上限(字节)
+        """
+        self.video_path = video_path
+        self.cache_bytes = cache_bytes
+        self.cap = cv2.VideoCapture(video_path)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) if self.cap.isOpened() else 0
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        self.keyframes = load_keyframe_index(video_path) if self.cap.isOpened() else None
+
+        self._next_index = 0  # 解码器下一次 read() 返回的帧号，未知时为None
+        self._cache = OrderedDict()
+        self._cache_nbytes = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, index):
+        """返回第index帧(BGR)，读取失败时返回None"""
+        frame = self._cache.get(index)
+        if frame is not None:
+            self._cache.move_to_end(index)
+            return frame
+
+        start = self._decode_start(index)
+        if start != self._next_index:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            self._next_index = start
+
+        # 目标帧之前较远的帧只grab不转换，较近的帧解码后放入缓存
+        while self._next_index < index:
+            if index - self._next_index > SEEK_CACHE_FRAMES:
+                ok = self.cap.grab()
+            else:
+                ok, frame = self.cap.read()
+                if ok:
+                    self._put(self._next_index, frame)
+            if not ok:
+                self._next_index = None
+                return None
+            self._next_index += 1
+
+        ok, frame = self.cap.read()
+        if not ok:
+            self._next_index = None
+            return None
+        self._next_index = index + 1
+        self._put(index, frame)
+        return frame
+
+    def read_ahead(self, index, count):
+        """
+        在空闲时把index之后count帧内第一个未缓存的帧解码到缓存中
+
+        只在解码器恰好位于该帧时读取，不会触发seek。返回是否解码了一帧
+        """
+        for ahead in range(index + 1, min(index + count, self.total_frames - 1) + 1):
+            if ahead in self._cache:
+                continue
+            if ahead != self._next_index:
+                return False
+            return self.read(ahead) is not None
+        return False
+
+    def _decode_start(self, index):
+        """返回读取index帧时解码器应开始的帧号"""
+        position = self._next_index
+        if self.keyframes is None:
+            if position is not None and 0 <= index - position <= MAX_FORWARD_DECODE:
+                return position
+            return index
+
+        # 目标帧之前最近的关键帧，解码器已位于该关键帧之后时直接向前解码更快
+        keyframe = int(self.keyframes[max(np.searchsorted(self.keyframes, index, side='right') - 1, 0)])
+        keyframe = min(keyframe, index)
+        if position is not None and keyframe <= position <= index:
+            return position
+        return keyframe
+
+    def _put(self, index, frame):
+        old = self._cache.pop(index, None)
+        if old is not None:
+            self._cache_nbytes -= old.nbytes
+        self._cache[index] = frame
+        self._cache_nbytes += frame.nbytes
+        # 至少保留当前帧
+        while self._cache_nbytes > self.cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_nbytes -= evicted.nbytes
+
+    def release(self):
+        self._cache.clear()
+        self._cache_nbytes = 0
+        self.cap.release()
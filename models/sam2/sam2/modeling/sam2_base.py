@@ -4,8 +4,12 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
+import bisect
+import math
+
 from loguru import logger
 
+import numpy as np
 import torch
 import torch.distributed
 import torch.nn.functional as F
@@ -198,15 +202,9 @@ class SAM2Base(torch.nn.Module):
         # Whether to use SAMURAI or original SAM 2
         self.samurai_mode = samurai_mode
 
-        # Init Kalman Filter
+        # Init Kalman Filter (the per-object filter states are kept in a `KalmanFilterState`
+        # owned by the caller, e.g. the inference state of the video predictor)
         self.kf = KalmanFilter()
-        self.kf_mean = None
-        self.kf_covariance = None
-        self.stable_frames = 0
-
-        # Debug purpose
-        self.history = {} # debug
-        self.frame_cnt = 0 # debug
 
         # Hyperparameters for SAMURAI
         self.stable_frames_threshold = stable_frames_threshold
@@ -299,6 +297,7 @@ class SAM2Base(torch.nn.Module):
         mask_inputs=None,
         high_res_features=None,
         multimask_output=False,
+        kf_state=None,
     ):
         """
         Forward SAM prompt encoders and mask heads.
@@ -318,6 +317,10 @@ class SAM2Base(torch.nn.Module):
         - multimask_output: if it's True, we output 3 candidate masks and their 3
           corresponding IoU estimates, and if it's False, we output only 1 mask and
           its corresponding IoU estimate.
+        - kf_state: either None or a `KalmanFilterState` with one row per object in the
+          batch. In SAMURAI mode it's used (and updated) to select among the multimask
+          outputs with the motion model; if None, the mask with the highest IoU estimate
+          is selected.
 
         Outputs:
         - low_res_multimasks: [B, M, H*4, W*4] shape (where M = 3 if
@@ -417,96 +420,25 @@ class SAM2Base(torch.nn.Module):
 
         sam_output_token = sam_output_tokens[:, 0]
         kf_ious = None
-        if multimask_output and self.samurai_mode:
-            if self.kf_mean is None and self.kf_covariance is None or self.stable_frames == 0:
-                best_iou_inds = torch.argmax(ious, dim=-1)
-                batch_inds = torch.arange(B, device=device)
-                low_res_masks = low_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
-                high_res_masks = high_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
-                non_zero_indices = torch.argwhere(high_res_masks[0][0] > 0.0)
-                if len(non_zero_indices) == 0:
-                    high_res_bbox = [0, 0, 0, 0]
-                else:
-                    y_min, x_min = non_zero_indices.min(dim=0).values
-                    y_max, x_max = non_zero_indices.max(dim=0).values
-                    high_res_bbox = [x_min.item(), y_min.item(), x_max.item(), y_max.item()]
-                self.kf_mean, self.kf_covariance = self.kf.initiate(self.kf.xyxy_to_xyah(high_res_bbox))
-                if sam_output_tokens.size(1) > 1:
-                    sam_output_token = sam_output_tokens[batch_inds, best_iou_inds]
-                self.frame_cnt += 1
-                self.stable_frames += 1
-            elif self.stable_frames < self.stable_frames_threshold:
-                self.kf_mean, self.kf_covariance = self.kf.predict(self.kf_mean, self.kf_covariance)
-                best_iou_inds = torch.argmax(ious, dim=-1)
-                batch_inds = torch.arange(B, device=device)
-                low_res_masks = low_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
-                high_res_masks = high_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
-                non_zero_indices = torch.argwhere(high_res_masks[0][0] > 0.0)
-                if len(non_zero_indices) == 0:
-                    high_res_bbox = [0, 0, 0, 0]
-                else:
-                    y_min, x_min = non_zero_indices.min(dim=0).values
-                    y_max, x_max = non_zero_indices.max(dim=0).values
-                    high_res_bbox = [x_min.item(), y_min.item(), x_max.item(), y_max.item()]
-                if ious[0][best_iou_inds].mean() > self.stable_ious_threshold:
-                    self.kf_mean, self.kf_covariance = self.kf.update(self.kf_mean, self.kf_covariance, self.kf.xyxy_to_xyah(high_res_bbox))
-                    self.stable_frames += 1
-                else:
-                    self.stable_frames = 0
-                if sam_output_tokens.size(1) > 1:
-                    sam_output_token = sam_output_tokens[batch_inds, best_iou_inds]
-                self.frame_cnt += 1
+        if multimask_output:
+            if self.samurai_mode and kf_state is not None:
+                # select the masks with the per-object motion model
+                best_iou_inds, kf_ious = self._select_multimask_with_kf(
+                    kf_state, ious, high_res_multimasks
+                )
             else:
-                self.kf_mean, self.kf_covariance = self.kf.predict(self.kf_mean, self.kf_covariance)
-                high_res_multibboxes = []
-                batch_inds = torch.arange(B, device=device)
-                for i in range(ious.shape[1]):
-                    non_zero_indices = torch.argwhere(high_res_multimasks[batch_inds, i].unsqueeze(1)[0][0] > 0.0)
-                    if len(non_zero_indices) == 0:
-                        high_res_multibboxes.append([0, 0, 0, 0])
-                    else:
-                        y_min, x_min = non_zero_indices.min(dim=0).values
-                        y_max, x_max = non_zero_indices.max(dim=0).values
-                        high_res_multibboxes.append([x_min.item(), y_min.item(), x_max.item(), y_max.item()])
-                # compute the IoU between the predicted bbox and the high_res_multibboxes
-                kf_ious = torch.tensor(self.kf.compute_iou(self.kf_mean[:4], high_res_multibboxes), device=device)
-                # weighted iou
-                weighted_ious = self.kf_score_weight * kf_ious + (1 - self.kf_score_weight) * ious
-                best_iou_inds = torch.argmax(weighted_ious, dim=-1)
-                batch_inds = torch.arange(B, device=device)
-                low_res_masks = low_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
-                high_res_masks = high_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
-                if sam_output_tokens.size(1) > 1:
-                    sam_output_token = sam_output_tokens[batch_inds, best_iou_inds]
-
-                if False:
-                    # make all these on cpu                        
-                    self.history[self.frame_cnt] = {
-                        "kf_predicted_bbox": self.kf.xyah_to_xyxy(self.kf_mean[:4]),
-                        # "multi_masks": high_res_multimasks.cpu(),
-                        "ious": ious.cpu(),
-                        "multi_bboxes": high_res_multibboxes,
-                        "kf_ious": kf_ious,
-                        "weighted_ious": weighted_ious.cpu(),
-                        "final_selection": best_iou_inds.cpu(),
-                    }
-                self.frame_cnt += 1
-
-                if ious[0][best_iou_inds].mean() < self.stable_ious_threshold:
-                    self.stable_frames = 0
-                else:
-                    self.kf_mean, self.kf_covariance = self.kf.update(self.kf_mean, self.kf_covariance, self.kf.xyxy_to_xyah(high_res_multibboxes[best_iou_inds[0]]))
-        elif multimask_output and not self.samurai_mode:
-            # take the best mask prediction (with the highest IoU estimation)
-            best_iou_inds = torch.argmax(ious, dim=-1)
+                # take the best mask prediction (with the highest IoU estimation)
+                best_iou_inds = torch.argmax(ious, dim=-1)
             batch_inds = torch.arange(B, device=device)
             low_res_masks = low_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
             high_res_masks = high_res_multimasks[batch_inds, best_iou_inds].unsqueeze(1)
             if sam_output_tokens.size(1) > 1:
                 sam_output_token = sam_output_tokens[batch_inds, best_iou_inds]
+            best_iou_score = ious[batch_inds, best_iou_inds]
         else:
             best_iou_inds = 0
             low_res_masks, high_res_masks = low_res_multimasks, high_res_multimasks
+            best_iou_score = ious[0][best_iou_inds]
 
         # Extract object pointer from the SAM output token (with occlusion handling)
         obj_ptr = self.obj_ptr_proj(sam_output_token)
@@ -529,10 +461,96 @@ class SAM2Base(torch.nn.Module):
             high_res_masks,
             obj_ptr,
             object_score_logits,
-            ious[0][best_iou_inds],
-            kf_ious[best_iou_inds] if kf_ious is not None else None,
+            best_iou_score,
+            kf_ious,
         )
 
+    @staticmethod
+    def _masks_to_bboxes(masks):
+        """
+        Compute the [x1, y1, x2, y2] pixel bboxes of the foreground (logits > 0) of
+        [B, M, H, W] masks with a single batched reduction. Empty masks get [0, 0, 0, 0].
+        Returns a [B, M, 4] int64 numpy array.
+        """
+        H, W = masks.shape[-2:]
+        fg = masks > 0.0
+        rows = fg.any(dim=-1).to(torch.uint8)  # [B, M, H]
+        cols = fg.any(dim=-2).to(torch.uint8)  # [B, M, W]
+        # argmax returns the first maximal index, i.e. the first foreground row/column
+        y_min = rows.argmax(dim=-1)
+        y_max = H - 1 - rows.flip(-1).argmax(dim=-1)
+        x_min = cols.argmax(dim=-1)
+        x_max = W - 1 - cols.flip(-1).argmax(dim=-1)
+        bboxes = torch.stack([x_min, y_min, x_max, y_max], dim=-1)
+        non_empty = rows.amax(dim=-1).bool().unsqueeze(-1)
+        bboxes = torch.where(non_empty, bboxes, torch.zeros_like(bboxes))
+        return bboxes.cpu().numpy()
+
+    def _select_multimask_with_kf(self, kf_state, ious, high_res_multimasks):
+        """
+        SAMURAI motion-aware mask selection, vectorized over all objects in the batch.
+
+        Objects without a stable track pick the mask with the highest IoU estimate (and
+        (re)initiate or update their track); objects that have been stable for
+        `stable_frames_threshold` frames weight the IoU estimates with the IoU between
+        the Kalman-predicted bbox and each candidate mask's bbox.
+
+        Returns the [B] selected mask indices (on the device of `ious`) and the [B]
+        Kalman IoU of the selected masks (NaN for objects without a stable track),
+        or None if no object has a stable track.
+        """
+        device = ious.device
+        B = ious.size(0)
+        kf_state.ensure_size(B)
+        stable_frames = kf_state.stable_frames[:B]
+
+        ious_np = ious.float().cpu().numpy()
+        multibboxes = self._masks_to_bboxes(high_res_multimasks)
+        best_iou_inds = ious_np.argmax(axis=-1)
+
+        to_initiate = stable_frames == 0
+        tracked = ~to_initiate
+        is_stable = tracked & (stable_frames >= self.stable_frames_threshold)
+        if tracked.any():
+            kf_state.mean[:B][tracked], kf_state.covariance[:B][tracked] = self.kf.multi_predict(
+                kf_state.mean[:B][tracked], kf_state.covariance[:B][tracked]
+            )
+
+        kf_ious = None
+        if is_stable.any():
+            # compute the IoU between the predicted bbox and the candidate bboxes, then
+            # take the mask with the highest weighted IoU
+            stable_kf_ious = self.kf.multi_compute_iou(
+                kf_state.mean[:B][is_stable, :4], multibboxes[is_stable]
+            )
+            weighted_ious = self.kf_score_weight * stable_kf_ious + (1 - self.kf_score_weight) * ious_np[is_stable]
+            best_iou_inds[is_stable] = weighted_ious.argmax(axis=-1)
+            kf_ious = np.full(B, np.nan, dtype=np.float32)
+            kf_ious[is_stable] = stable_kf_ious[np.arange(len(stable_kf_ious)), best_iou_inds[is_stable]]
+            kf_ious = torch.from_numpy(kf_ious).to(device)
+
+        obj_inds = np.arange(B)
+        best_bboxes = self.kf.multi_xyxy_to_xyah(multibboxes[obj_inds, best_iou_inds])
+        best_ious = ious_np[obj_inds, best_iou_inds]
+
+        # objects without a track (or whose track was reset) start a new one
+        if to_initiate.any():
+            kf_state.mean[:B][to_initiate], kf_state.covariance[:B][to_initiate] = self.kf.multi_initiate(
+                best_bboxes[to_initiate]
+            )
+        # objects not yet stable only update their track on confident masks
+        unstable = tracked & ~is_stable
+        confident = np.where(unstable, best_ious > self.stable_ious_threshold, best_ious >= self.stable_ious_threshold)
+        to_update = tracked & confident
+        if to_update.any():
+            kf_state.mean[:B][to_update], kf_state.covariance[:B][to_update] = self.kf.multi_update(
+                kf_state.mean[:B][to_update], kf_state.covariance[:B][to_update], best_bboxes[to_update]
+            )
+        stable_frames[to_initiate | (unstable & confident)] += 1
+        stable_frames[tracked & ~confident] = 0
+
+        return torch.from_numpy(best_iou_inds).to(device), kf_ious
+
     def _use_mask_as_output(self, backbone_features, high_res_features, mask_inputs):
         """
         Directly turn binary `mask_inputs` into a output mask logits without using SAM.
@@ -617,6 +635,87 @@ class SAM2Base(torch.nn.Module):
 
         return backbone_out, vision_feats, vision_pos_embeds, feat_sizes
 
+    def _memory_bank_scores(self, out):
+        """
+        Host copies of the mean SAMURAI scores (mask affinity, object and motion scores) of a
+        frame output. They are computed with a single device sync and cached in the output.
+        Returns None for outputs without scores (e.g. those consolidated from user inputs).
+        """
+        if "memory_bank_scores" in out:
+            return out["memory_bank_scores"]
+        iou_score = out.get("best_iou_score")  # Get mask affinity score
+        if iou_score is None:
+            scores = None
+        else:
+            obj_score = out["object_score_logits"]  # Get object score
+            means = [iou_score.mean().float(), obj_score.mean().float().to(iou_score.device)]
+            kf_score = out.get("kf_score")  # Get motion score if available
+            if kf_score is not None:
+                # only objects with a stable track have a motion score (the others are NaN)
+                means.append(torch.nanmean(kf_score).float().to(iou_score.device))
+            means = torch.stack(means).tolist()
+            kf_mean = means[2] if len(means) > 2 and not math.isnan(means[2]) else None
+            scores = (means[0], means[1], kf_mean)
+        out["memory_bank_scores"] = scores
+        return scores
+
+    def _is_memory_bank_candidate(self, out):
+        """Whether a non-conditioning frame output passes the SAMURAI memory bank thresholds."""
+        scores = self._memory_bank_scores(out)
+        if scores is None:
+            return False
+        iou_score, obj_score, kf_score = scores
+        return (
+            iou_score > self.memory_bank_iou_threshold
+            and obj_score > self.memory_bank_obj_score_threshold
+            and (kf_score is None or kf_score > self.memory_bank_kf_score_threshold)
+        )
+
+    def _record_memory_bank_frame(self, output_dict, frame_idx):
+        """
+        Add a newly stored non-conditioning frame output to the sorted SAMURAI memory bank
+        index `output_dict["memory_bank_frames"]` if it passes the thresholds, so that the
+        memory selection doesn't need to rescan all past outputs on every frame.
+        """
+        if not self.samurai_mode or "memory_bank_frames" not in output_dict:
+            return
+        if not self._is_memory_bank_candidate(output_dict["non_cond_frame_outputs"][frame_idx]):
+            return
+        frames = output_dict["memory_bank_frames"]
+        pos = bisect.bisect_left(frames, frame_idx)
+        if pos == len(frames) or frames[pos] != frame_idx:
+            frames.insert(pos, frame_idx)
+
+    def _latest_memory_bank_frames(self, frame_idx, output_dict, max_num_frames):
+        """
+        Return (in temporal order) the latest `max_num_frames` frames in (1, frame_idx) whose
+        non-conditioning outputs pass the SAMURAI memory bank thresholds.
+        """
+        non_cond_frame_outputs = output_dict["non_cond_frame_outputs"]
+        frames = output_dict.get("memory_bank_frames")
+        valid_indices = []
+        if frames is None:
+            # no index on this output dict, scan backwards through the previous frames
+            for t in range(frame_idx - 1, 1, -1):
+                if len(valid_indices) >= max_num_frames:
+                    break
+                out = non_cond_frame_outputs.get(t)
+                if out is not None and self._is_memory_bank_candidate(out):
+                    valid_indices.append(t)
+        else:
+            i = bisect.bisect_left(frames, frame_idx) - 1
+            while i >= 0 and frames[i] > 1 and len(valid_indices) < max_num_frames:
+                t = frames[i]
+                out = non_cond_frame_outputs.get(t)
+                if out is not None and self._is_memory_bank_candidate(out):
+                    valid_indices.append(t)
+                else:
+                    # the output has been released or replaced since it was recorded
+                    del frames[i]
+                i -= 1
+        valid_indices.reverse()
+        return valid_indices
+
     def _prepare_memory_conditioned_features(
         self,
         frame_idx,
@@ -661,23 +760,11 @@ class SAM2Base(torch.nn.Module):
             stride = 1 if self.training else self.memory_temporal_stride_for_eval
 
             if self.samurai_mode:
-                valid_indices = [] 
+                valid_indices = []
                 if frame_idx > 1:  # Ensure we have previous frames to evaluate
-                    for i in range(frame_idx - 1, 1, -1):  # Iterate backwards through previous frames
-                        if i in output_dict["non_cond_frame_outputs"]:  # Check if the frame exists in the output
-                            iou_score = output_dict["non_cond_frame_outputs"][i]["best_iou_score"]  # Get mask affinity score
-                            obj_score = output_dict["non_cond_frame_outputs"][i]["object_score_logits"]  # Get object score
-                            kf_score = output_dict["non_cond_frame_outputs"][i]["kf_score"] if "kf_score" in output_dict["non_cond_frame_outputs"][i] else None  # Get motion score if available
-                            # Check if the scores meet the criteria for being a valid index
-                            if iou_score.mean().item() > self.memory_bank_iou_threshold and \
-                               obj_score.mean().item() > self.memory_bank_obj_score_threshold and \
-                               (kf_score is None or kf_score.mean().item() > self.memory_bank_kf_score_threshold):
-                                valid_indices.insert(0, i)
-                            # Check the number of valid indices
-                            if len(valid_indices) >= self.max_obj_ptrs_in_encoder - 1:
-                                break
-                        else:
-                            continue
+                    valid_indices = self._latest_memory_bank_frames(
+                        frame_idx, output_dict, self.max_obj_ptrs_in_encoder - 1
+                    )
                 if frame_idx - 1 not in valid_indices: 
                     valid_indices.append(frame_idx - 1)
                 for t_pos in range(1, self.num_maskmem):  # Iterate over the number of mask memories
@@ -889,6 +976,7 @@ class SAM2Base(torch.nn.Module):
         num_frames,
         track_in_reverse,
         prev_sam_mask_logits,
+        kf_state=None,
     ):
         current_out = {"point_inputs": point_inputs, "mask_inputs": mask_inputs}
         # High-resolution feature maps for the SAM head, reshape (HW)BC => BCHW
@@ -933,6 +1021,7 @@ class SAM2Base(torch.nn.Module):
                 mask_inputs=mask_inputs,
                 high_res_features=high_res_features,
                 multimask_output=multimask_output,
+                kf_state=kf_state,
             )
 
         return current_out, sam_outputs, high_res_features, pix_feat
@@ -982,6 +1071,8 @@ class SAM2Base(torch.nn.Module):
         run_mem_encoder=True,
         # The previously predicted SAM mask logits (which can be fed together with new clicks in demo).
         prev_sam_mask_logits=None,
+        # The per-object Kalman filter states used by SAMURAI for motion-aware mask selection.
+        kf_state=None,
     ):
         current_out, sam_outputs, _, _ = self._track_step(
             frame_idx,
@@ -995,6 +1086,7 @@ class SAM2Base(torch.nn.Module):
             num_frames,
             track_in_reverse,
             prev_sam_mask_logits,
+            kf_state,
         )
 
         (
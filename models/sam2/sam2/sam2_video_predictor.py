@@ -4,17 +4,29 @@
 # This source code is licensed under the license found in the
 # LICENSE file in the root directory of this source tree.
 
+import sys
+import time
 import warnings
 from collections import OrderedDict
 
-import cv2
 import numpy as np
 import torch
-import torchvision.transforms.functional as TF
 from tqdm import tqdm
 
 from sam2.modeling.sam2_base import NO_OBJ_SCORE, SAM2Base
-from sam2.utils.misc import concat_points, fill_holes_in_mask_scores, load_video_frames
+from sam2.utils.kalman_filter import KalmanFilterState
+from sam2.utils.misc import (
+    CompressedVideoFrames,
+    ImageFeatureCache,
+    StreamingVideoFrameLoader,
+    VideoFrameRingBuffer,
+    bgr_frame_to_uint8_tensor,
+    concat_points,
+    fill_holes_in_mask_scores,
+    load_video_frames,
+    normalize_video_frames,
+    stack_video_frames,
+)
 
 
 class SAM2VideoPredictor(SAM2Base):
@@ -33,6 +45,13 @@ class SAM2VideoPredictor(SAM2Base):
         # if `add_all_frames_to_correct_as_cond` is True, we also append to the conditioning frame list any frame that receives a later correction click
         # if `add_all_frames_to_correct_as_cond` is False, we conditioning frame list to only use those initial conditioning frames
         add_all_frames_to_correct_as_cond=False,
+        # the number of frames (and optionally bytes) whose image features are kept in an LRU cache,
+        # so that interactions that go back and forth between a few frames don't re-run the image encoder
+        # (only frames visited by interactions are cached; frames encoded during propagation are used once)
+        image_feature_cache_frames=8,
+        image_feature_cache_bytes=None,
+        # whether to keep the cached image features in CPU memory (moved back to the device on a hit)
+        offload_image_feature_cache_to_cpu=False,
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -41,109 +60,108 @@ class SAM2VideoPredictor(SAM2Base):
         self.clear_non_cond_mem_around_input = clear_non_cond_mem_around_input
         self.clear_non_cond_mem_for_multi_obj = clear_non_cond_mem_for_multi_obj
         self.add_all_frames_to_correct_as_cond = add_all_frames_to_correct_as_cond
+        self.image_feature_cache_frames = image_feature_cache_frames
+        self.image_feature_cache_bytes = image_feature_cache_bytes
+        self.offload_image_feature_cache_to_cpu = offload_image_feature_cache_to_cpu
 
     def append_frame_to_inference_state(self, inference_state, new_frame):
-        """将实时图像帧添加到 inference_state 中。"""
+        """
+        将实时图像帧添加到 inference_state 中。
+
+        对于使用环形帧缓冲区初始化的实时会话(见 init_state_from_numpy_frames 的
+        live_buffer_size)，新帧覆盖缓冲区中最旧的帧，并释放记忆注意力不再使用的旧帧输出，
+        每帧开销与会话时长无关。
+        """
         compute_device = inference_state["device"]
         storage_device = inference_state.get("storage_device", compute_device)
         image_size = self.image_size
-
-        # 1. 预处理图像
-        img_rgb = cv2.cvtColor(new_frame, cv2.COLOR_BGR2RGB)
-        img_tensor = torch.from_numpy(img_rgb).float().permute(2, 0, 1) / 255.0
-        img_tensor = TF.resize(img_tensor, [image_size, image_size])
-        img_tensor = img_tensor.to(storage_device)
-
-        img_mean = torch.tensor([0.485, 0.456, 0.406], dtype=torch.float32, device=storage_device)[:, None, None]
-        img_std = torch.tensor([0.229, 0.224, 0.225], dtype=torch.float32, device=storage_device)[:, None, None]
-        img_tensor = (img_tensor - img_mean) / img_std
-
-        # 2. 追加到 images tensor
-        inference_state["images"] = torch.cat(
-            [inference_state["images"].to(storage_device), img_tensor.unsqueeze(0)],
-            dim=0
-        )
-        inference_state["num_frames"] += 1
+        images = inference_state["images"]
+
+        # 1. 预处理图像(以uint8保存，送入图像编码器时再归一化)
+        img_tensor = bgr_frame_to_uint8_tensor(new_frame, image_size)
+
+        # 2. 追加到帧存储
+        if isinstance(images, VideoFrameRingBuffer):
+            frame_idx = images.append(img_tensor)
+            inference_state["num_frames"] = len(images)
+            # 实时跟踪只会向前进行，释放之后的帧不会再选用的旧帧输出
+            self.release_old_frame_outputs(inference_state, frame_idx)
+            # 被覆盖的帧无法再交互，不再记录其跟踪状态
+            inference_state["frames_already_tracked"].pop(frame_idx - images.capacity, None)
+        elif isinstance(images, CompressedVideoFrames):
+            images.append(img_tensor)
+            inference_state["num_frames"] = len(images)
+        else:
+            img_tensor = img_tensor.to(storage_device)
+            inference_state["images"] = torch.cat(
+                [images.to(storage_device), img_tensor.unsqueeze(0)],
+                dim=0
+            )
+            inference_state["num_frames"] += 1
 
     def init_state_from_numpy_frames(
             self,
             numpy_frames,  # List[np.ndarray]
             offload_video_to_cpu=False,
             offload_state_to_cpu=False,
+            frame_compression=None,
+            live_buffer_size=None,
     ):
-        """支持 RealSense 相机图像，直接从 NumPy 图像帧初始化推理状态。"""
+        """
+        支持 RealSense 相机图像，直接从 NumPy 图像帧初始化推理状态。
+
+        帧缩放后以uint8保存，frame_compression 为 "jpeg" 或 "png" 时以压缩图像保存在CPU内存中。
+        live_buffer_size 不为 None 时，帧保存在该容量的预分配环形缓冲区中，用于通过
+        append_frame_to_inference_state 持续追加相机帧的实时会话，容量至少需要覆盖记忆注意力
+        可能选用的帧(见 _memory_retention_window)及当前帧，否则抛出 ValueError。
+        """
         assert isinstance(numpy_frames, list) and isinstance(numpy_frames[0], np.ndarray), \
             "输入必须是 numpy 图像帧列表"
+        if live_buffer_size is not None:
+            min_buffer_size = self._memory_retention_window() + 1
+            if live_buffer_size < min_buffer_size:
+                raise ValueError(
+                    f"live_buffer_size={live_buffer_size} 小于记忆注意力所需的帧数 {min_buffer_size}"
+                    f"(num_maskmem={self.num_maskmem}, max_obj_ptrs_in_encoder={self.max_obj_ptrs_in_encoder})"
+                )
 
         compute_device = self.device
         image_size = self.image_size
         video_height, video_width = numpy_frames[0].shape[:2]
 
-        processed = []
-        for img in numpy_frames:
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            img_tensor = torch.from_numpy(img_rgb).float().permute(2, 0, 1) / 255.0
-            img_tensor = TF.resize(img_tensor, [image_size, image_size])
-            processed.append(img_tensor)
-
-        images = torch.stack(processed)
-        if not offload_video_to_cpu:
-            images = images.to(compute_device)
-
-        img_mean = torch.tensor([0.485, 0.456, 0.406], dtype=torch.float32)[:, None, None].to(images.device)
-        img_std = torch.tensor([0.229, 0.224, 0.225], dtype=torch.float32)[:, None, None].to(images.device)
-        images = (images - img_mean) / img_std
+        frames = (bgr_frame_to_uint8_tensor(img, image_size) for img in numpy_frames)
+        if live_buffer_size is not None:
+            images = VideoFrameRingBuffer(
+                live_buffer_size,
+                image_size,
+                device=torch.device("cpu") if offload_video_to_cpu else compute_device,
+            )
+            for img in frames:
+                images.append(img)
+        else:
+            images = stack_video_frames(frames, frame_compression)
+            if not offload_video_to_cpu and frame_compression is None:
+                images = images.to(compute_device)
 
-        inference_state = {}
-        inference_state["images"] = images
-        inference_state["num_frames"] = len(images)
-        inference_state["offload_video_to_cpu"] = offload_video_to_cpu
-        inference_state["offload_state_to_cpu"] = offload_state_to_cpu
-        inference_state["video_height"] = video_height
-        inference_state["video_width"] = video_width
-        inference_state["device"] = compute_device
-        inference_state["storage_device"] = torch.device("cpu") if offload_state_to_cpu else compute_device
-        inference_state["point_inputs_per_obj"] = {}
-        inference_state["mask_inputs_per_obj"] = {}
-        inference_state["cached_features"] = {}
-        inference_state["constants"] = {}
-        inference_state["obj_id_to_idx"] = OrderedDict()
-        inference_state["obj_idx_to_id"] = OrderedDict()
-        inference_state["obj_ids"] = []
-        inference_state["output_dict"] = {
-            "cond_frame_outputs": {},
-            "non_cond_frame_outputs": {},
-        }
-        inference_state["output_dict_per_obj"] = {}
-        inference_state["temp_output_dict_per_obj"] = {}
-        inference_state["consolidated_frame_inds"] = {
-            "cond_frame_outputs": set(),
-            "non_cond_frame_outputs": set(),
-        }
-        inference_state["tracking_has_started"] = False
-        inference_state["frames_already_tracked"] = {}
+        inference_state = self._new_inference_state(
+            images, video_height, video_width, offload_video_to_cpu, offload_state_to_cpu
+        )
 
-        # 使用第 0 帧进行视觉特征提取
-        self._get_image_feature(inference_state, frame_idx=0, batch_size=1)
+        # 使用第 0 帧(实时会话为缓冲区中最新一帧)进行视觉特征提取
+        warmup_frame_idx = len(images) - 1 if live_buffer_size is not None else 0
+        self._get_image_feature(inference_state, frame_idx=warmup_frame_idx, batch_size=1)
         return inference_state
 
-    @torch.inference_mode()
-    def init_state(
+    def _new_inference_state(
         self,
-        video_path,
-        offload_video_to_cpu=False,
-        offload_state_to_cpu=False,
-        async_loading_frames=False,
+        images,
+        video_height,
+        video_width,
+        offload_video_to_cpu,
+        offload_state_to_cpu,
     ):
-        """Initialize an inference state."""
+        """Create an empty inference state around the given frame container."""
         compute_device = self.device  # device of the model
-        images, video_height, video_width = load_video_frames(
-            video_path=video_path,
-            image_size=self.image_size,
-            offload_video_to_cpu=offload_video_to_cpu,
-            async_loading_frames=async_loading_frames,
-            compute_device=compute_device,
-        )
         inference_state = {}
         inference_state["images"] = images
         inference_state["num_frames"] = len(images)
@@ -167,7 +185,12 @@ class SAM2VideoPredictor(SAM2Base):
         inference_state["point_inputs_per_obj"] = {}
         inference_state["mask_inputs_per_obj"] = {}
         # visual features on a small number of recently visited frames for quick interactions
-        inference_state["cached_features"] = {}
+        inference_state["cached_features"] = ImageFeatureCache(
+            max_frames=self.image_feature_cache_frames,
+            max_bytes=self.image_feature_cache_bytes,
+            offload_to_cpu=self.offload_image_feature_cache_to_cpu,
+            compute_device=compute_device,
+        )
         # values that don't change across frames (so we only need to hold one copy of them)
         inference_state["constants"] = {}
         # mapping between client-side object id and model-side object index
@@ -178,6 +201,8 @@ class SAM2VideoPredictor(SAM2Base):
         inference_state["output_dict"] = {
             "cond_frame_outputs": {},  # dict containing {frame_idx: <out>}
             "non_cond_frame_outputs": {},  # dict containing {frame_idx: <out>}
+            # sorted indices of the non-conditioning frames passing the SAMURAI memory bank thresholds
+            "memory_bank_frames": [],
         }
         # Slice (view) of each object tracking results, sharing the same memory with "output_dict"
         inference_state["output_dict_per_obj"] = {}
@@ -193,10 +218,93 @@ class SAM2VideoPredictor(SAM2Base):
         # metadata for each tracking frame (e.g. which direction it's tracked)
         inference_state["tracking_has_started"] = False
         inference_state["frames_already_tracked"] = {}
+        # SAMURAI Kalman filter states of each object (one row per object index)
+        inference_state["kf_state"] = KalmanFilterState()
+        # image features encoded ahead of the tracker during propagation
+        # (dict containing {frame_idx: (image, backbone_out, ready_event)})
+        inference_state["prefetched_features"] = OrderedDict()
+        # time spent in the image encoder and in the tracker (see `get_perf_counters`)
+        inference_state["perf_counters"] = {
+            "backbone_frames": 0,
+            "backbone_batches": 0,
+            "backbone_time": 0.0,
+            "tracker_frames": 0,
+            "tracker_time": 0.0,
+        }
+        # pending (start, end) CUDA events of the image encoder, resolved lazily
+        inference_state["backbone_timing_events"] = []
+        return inference_state
+
+    @torch.inference_mode()
+    def init_state(
+        self,
+        video_path,
+        offload_video_to_cpu=False,
+        offload_state_to_cpu=False,
+        async_loading_frames=False,
+        frame_compression=None,
+    ):
+        """Initialize an inference state."""
+        compute_device = self.device  # device of the model
+        # the frames are kept as uint8 (or as JPEG/PNG images in CPU memory if `frame_compression`
+        # is set) and only normalized frame by frame when they are fed to the image encoder
+        images, video_height, video_width = load_video_frames(
+            video_path=video_path,
+            image_size=self.image_size,
+            offload_video_to_cpu=offload_video_to_cpu,
+            img_mean=None,
+            img_std=None,
+            async_loading_frames=async_loading_frames,
+            compute_device=compute_device,
+            frame_compression=frame_compression,
+        )
+        inference_state = self._new_inference_state(
+            images, video_height, video_width, offload_video_to_cpu, offload_state_to_cpu
+        )
         # Warm up the visual backbone and cache the image feature on frame 0
         self._get_image_feature(inference_state, frame_idx=0, batch_size=1)
         return inference_state
 
+    @torch.inference_mode()
+    def init_state_from_frame_iterator(
+        self,
+        frames,
+        num_frames,
+        offload_video_to_cpu=False,
+        offload_state_to_cpu=False,
+        window_size=8,
+    ):
+        """
+        从BGR图像帧迭代器流式初始化推理状态。
+
+        帧在跟踪过程中按需解码，只保留最近window_size帧(原始帧和模型输入)，
+        原始帧可通过 inference_state["images"].get_frame(frame_idx) 取回用于叠加渲染，
+        调用方无需再次解码视频。只支持正向跟踪。
+
+        Args:
+            frames: BGR图像帧(np.ndarray)的可迭代对象
+            num_frames: 总帧数
+            offload_video_to_cpu: 是否将模型输入帧保存在CPU内存中
+            offload_state_to_cpu: 是否将推理状态保存在CPU内存中
+            window_size: 保留的最近帧数
+        """
+        compute_device = self.device
+        images = StreamingVideoFrameLoader(
+            frames,
+            num_frames,
+            image_size=self.image_size,
+            offload_video_to_cpu=offload_video_to_cpu,
+            img_mean=None,
+            img_std=None,
+            compute_device=compute_device,
+            window_size=window_size,
+        )
+        inference_state = self._new_inference_state(
+            images, images.video_height, images.video_width, offload_video_to_cpu, offload_state_to_cpu
+        )
+        self._get_image_feature(inference_state, frame_idx=0, batch_size=1)
+        return inference_state
+
     @classmethod
     def from_pretrained(cls, model_id: str, **kwargs) -> "SAM2VideoPredictor":
         """
@@ -753,15 +861,42 @@ class SAM2VideoPredictor(SAM2Base):
         start_frame_idx=None,
         max_frame_num_to_track=None,
         reverse=False,
-        disable_display = True
+        disable_display = True,
+        release_old_outputs=False,
+        prefetch_depth=0,
+        prefetch_batch_size=4,
     ):
-        """Propagate the input points across frames to track in the entire video."""
+        """
+        Propagate the input points across frames to track in the entire video.
+
+        If `prefetch_depth` > 0, the image encoder runs ahead of the tracker on the next
+        `prefetch_depth` frames in batches of `prefetch_batch_size` (on a side CUDA stream
+        when running on GPU), so that the memory attention and mask decoder don't wait on
+        the image encoder. The frames must then stay accessible that far ahead in
+        `inference_state["images"]`.
+
+        If `release_old_outputs` is True (forward tracking only), the non-conditioning
+        outputs that the memory attention can no longer select are released during
+        propagation (see `release_old_frame_outputs`), so that the tracking state stays
+        bounded on long videos. The yielded masks are unaffected, but the released frames
+        can no longer be reused by later interactions on this state.
+
+        For a streamed video (see `init_state_from_frame_iterator`), `num_frames` is only
+        the container's estimate, so forward tracking runs until the decoder actually
+        reaches the end of the video (or `max_frame_num_to_track` is reached).
+        """
+        if release_old_outputs and reverse:
+            raise ValueError("release_old_outputs is only supported for forward tracking")
         self.propagate_in_video_preflight(inference_state)
 
         output_dict = inference_state["output_dict"]
         consolidated_frame_inds = inference_state["consolidated_frame_inds"]
         obj_ids = inference_state["obj_ids"]
         num_frames = inference_state["num_frames"]
+        images = inference_state["images"]
+        streaming = isinstance(images, StreamingVideoFrameLoader)
+        if streaming and reverse:
+            raise ValueError("reverse tracking is not supported on a streamed video")
         batch_size = self._get_obj_num(inference_state)
         if len(output_dict["cond_frame_outputs"]) == 0:
             raise RuntimeError("No points are provided; please add points first")
@@ -774,9 +909,13 @@ class SAM2VideoPredictor(SAM2Base):
             # default: start from the earliest frame with input points
             start_frame_idx = min(output_dict["cond_frame_outputs"])
         if max_frame_num_to_track is None:
-            # default: track all the frames in the video
-            max_frame_num_to_track = num_frames
-        if reverse:
+            # default: track all the frames in the video (the real end of a streamed
+            # video is only known once it is decoded)
+            max_frame_num_to_track = sys.maxsize - start_frame_idx - 1 if streaming else num_frames
+        if streaming:
+            processing_order = range(start_frame_idx, start_frame_idx + max_frame_num_to_track + 1)
+            progress_total = max(min(len(processing_order), num_frames - start_frame_idx), 0)
+        elif reverse:
             end_frame_idx = max(start_frame_idx - max_frame_num_to_track, 0)
             if start_frame_idx > 0:
                 processing_order = range(start_frame_idx, end_frame_idx - 1, -1)
@@ -787,8 +926,34 @@ class SAM2VideoPredictor(SAM2Base):
                 start_frame_idx + max_frame_num_to_track, num_frames - 1
             )
             processing_order = range(start_frame_idx, end_frame_idx + 1)
-
-        for frame_idx in tqdm(processing_order, desc="propagate in video", disable=disable_display):
+        if not streaming:
+            progress_total = len(processing_order)
+
+        # release in batches so that the scan over stored outputs is amortized over frames
+        max_stored_outputs = 2 * self._memory_retention_window() + self.max_obj_ptrs_in_encoder
+
+        perf_counters = inference_state["perf_counters"]
+
+        for pos, frame_idx in enumerate(
+            tqdm(processing_order, total=progress_total, desc="propagate in video", disable=disable_display)
+        ):
+            if streaming:
+                has_frame = images.has_frame(frame_idx)
+                inference_state["num_frames"] = len(images)
+                if not has_frame:
+                    break
+            if release_old_outputs and len(output_dict["non_cond_frame_outputs"]) >= max_stored_outputs:
+                self.release_old_frame_outputs(inference_state, frame_idx)
+            if prefetch_depth > 0:
+                upcoming_frames = processing_order[pos : pos + prefetch_depth]
+                if streaming:
+                    upcoming_frames = [t for t in upcoming_frames if images.has_frame(t)]
+                self._prefetch_ahead(
+                    inference_state,
+                    upcoming_frames,
+                    prefetch_batch_size,
+                    max_prefetched=prefetch_depth + prefetch_batch_size,
+                )
             # We skip those frames already in consolidated outputs (these are frames
             # that received input clicks or mask). Note that we cannot directly run
             # batched forward on them via `_run_single_frame_inference` because the
@@ -806,6 +971,7 @@ class SAM2VideoPredictor(SAM2Base):
                 pred_masks = current_out["pred_masks"]
             else:
                 storage_key = "non_cond_frame_outputs"
+                tracker_start = time.perf_counter()
                 current_out, pred_masks = self._run_single_frame_inference(
                     inference_state=inference_state,
                     output_dict=output_dict,
@@ -816,8 +982,13 @@ class SAM2VideoPredictor(SAM2Base):
                     mask_inputs=None,
                     reverse=reverse,
                     run_mem_encoder=True,
+                    kf_state=inference_state["kf_state"],
+                    cache_features=False,
                 )
+                perf_counters["tracker_time"] += time.perf_counter() - tracker_start
+                perf_counters["tracker_frames"] += 1
                 output_dict[storage_key][frame_idx] = current_out
+                self._record_memory_bank_frame(output_dict, frame_idx)
             # Create slices of per-object outputs for subsequent interaction with each
             # individual object after tracking.
             self._add_output_per_object(
@@ -959,25 +1130,54 @@ class SAM2VideoPredictor(SAM2Base):
             v["non_cond_frame_outputs"].clear()
         inference_state["output_dict"]["cond_frame_outputs"].clear()
         inference_state["output_dict"]["non_cond_frame_outputs"].clear()
+        inference_state["output_dict"]["memory_bank_frames"].clear()
         inference_state["consolidated_frame_inds"]["cond_frame_outputs"].clear()
         inference_state["consolidated_frame_inds"]["non_cond_frame_outputs"].clear()
         inference_state["tracking_has_started"] = False
         inference_state["frames_already_tracked"].clear()
+        inference_state["kf_state"].reset()
 
-    def _get_image_feature(self, inference_state, frame_idx, batch_size):
-        """Compute the image features on a given frame."""
-        # Look up in the cache first
-        image, backbone_out = inference_state["cached_features"].get(
-            frame_idx, (None, None)
-        )
-        if backbone_out is None:
-            # Cache miss -- we will run inference on a single image
-            device = inference_state["device"]
-            image = inference_state["images"][frame_idx].to(device).float().unsqueeze(0)
-            backbone_out = self.forward_image(image)
-            # Cache the most recent frame's feature (for repeated interactions with
-            # a frame; we can use an LRU cache for more frames in the future).
-            inference_state["cached_features"] = {frame_idx: (image, backbone_out)}
+    @staticmethod
+    def _normalize_frames(images):
+        """
+        Turn stored frames into the model input. Frames are normally kept as uint8; frames
+        that are already floating point were normalized by the caller (e.g. loaded with
+        explicit `img_mean`/`img_std`) and are used as they are.
+        """
+        if images.dtype == torch.uint8:
+            return normalize_video_frames(images)
+        return images.float()
+
+    def _get_image_feature(self, inference_state, frame_idx, batch_size, cache_features=True):
+        """
+        Compute the image features on a given frame.
+
+        Features encoded on a cache miss are put into the LRU cache only if `cache_features`
+        is True; propagation passes False so that the frames it tracks (each used only once)
+        don't evict the features of the frames visited by interactions.
+        """
+        # Take the features encoded ahead by the prefetch stage first
+        prefetched = inference_state["prefetched_features"].pop(frame_idx, None)
+        if prefetched is not None:
+            image, backbone_out, ready_event = prefetched
+            if ready_event is not None:
+                # wait (on device) for the side stream and let the allocator know
+                # that these tensors are now also used on the current stream
+                current_stream = torch.cuda.current_stream(image.device)
+                current_stream.wait_event(ready_event)
+                for x in [image, *backbone_out["backbone_fpn"], *backbone_out["vision_pos_enc"]]:
+                    x.record_stream(current_stream)
+        else:
+            # Look up in the LRU cache of recently visited frames
+            image, backbone_out = inference_state["cached_features"].get(frame_idx)
+            if backbone_out is None:
+                # Cache miss -- we will run inference on a single image
+                device = inference_state["device"]
+                image = inference_state["images"][frame_idx].to(device, non_blocking=True)
+                image = self._normalize_frames(image.unsqueeze(0))
+                backbone_out, _ = self._run_image_encoder(inference_state, image)
+                if cache_features:
+                    inference_state["cached_features"].put(frame_idx, image, backbone_out)
 
         # expand the features to have the same dimension as the number of objects
         expanded_image = image.expand(batch_size, -1, -1, -1)
@@ -997,6 +1197,133 @@ class SAM2VideoPredictor(SAM2Base):
         features = (expanded_image,) + features
         return features
 
+    def _run_image_encoder(self, inference_state, images, stream=None):
+        """
+        Run the image encoder on a batch of images and account its time in the perf
+        counters. On CUDA, the encoder runs on `stream` (or the current stream) and the
+        returned event marks the end of its work; on CPU the event is None.
+        """
+        counters = inference_state["perf_counters"]
+        counters["backbone_frames"] += images.size(0)
+        counters["backbone_batches"] += 1
+
+        def _forward():
+            backbone_out = self.forward_image(images)
+            if images.size(0) > 1:
+                # the position encoding is the same for all images, so keep a single copy of it
+                backbone_out["vision_pos_enc"] = [
+                    pos[:1].clone() for pos in backbone_out["vision_pos_enc"]
+                ]
+            return backbone_out
+
+        if images.device.type != "cuda":
+            start = time.perf_counter()
+            backbone_out = _forward()
+            counters["backbone_time"] += time.perf_counter() - start
+            return backbone_out, None
+
+        stream = stream or torch.cuda.current_stream(images.device)
+        start_event = torch.cuda.Event(enable_timing=True)
+        end_event = torch.cuda.Event(enable_timing=True)
+        with torch.cuda.stream(stream):
+            start_event.record(stream)
+            backbone_out = _forward()
+            end_event.record(stream)
+        self._collect_backbone_timing(inference_state, wait=False)
+        inference_state["backbone_timing_events"].append((start_event, end_event))
+        return backbone_out, end_event
+
+    def _collect_backbone_timing(self, inference_state, wait):
+        """Add the GPU time of finished image encoder runs to the perf counters."""
+        pending = inference_state["backbone_timing_events"]
+        counters = inference_state["perf_counters"]
+        while pending:
+            start_event, end_event = pending[0]
+            if wait:
+                end_event.synchronize()
+            elif not end_event.query():
+                break
+            counters["backbone_time"] += start_event.elapsed_time(end_event) / 1000.0
+            pending.pop(0)
+
+    def _prefetch_ahead(self, inference_state, upcoming_frames, batch_size, max_prefetched):
+        """
+        Make sure the image features of the upcoming frames (the first one being the
+        current frame) are being encoded. The encoder runs in full batches ahead of the
+        tracker, or immediately if the current frame has no features yet.
+
+        The work is issued from the calling thread. On GPU it is only enqueued on a side
+        stream (frame decoding and stacking still happen on the caller), so the encoder
+        overlaps with the tracker on the current stream; on CPU it runs synchronously and
+        only batches the encoder calls.
+        """
+        prefetched = inference_state["prefetched_features"]
+        consolidated_frame_inds = inference_state["consolidated_frame_inds"]
+        missing = [
+            t
+            for t in upcoming_frames
+            if t not in prefetched
+            and t not in inference_state["cached_features"]
+            # frames with consolidated inputs reuse their stored outputs
+            and t not in consolidated_frame_inds["cond_frame_outputs"]
+            and t not in consolidated_frame_inds["non_cond_frame_outputs"]
+        ]
+        if len(missing) == 0:
+            return
+        if missing[0] != upcoming_frames[0]:
+            # the current frame is ready, only encode full batches ahead of it
+            missing = missing[: len(missing) // batch_size * batch_size]
+
+        device = inference_state["device"]
+        stream = None
+        if device.type == "cuda":
+            stream = inference_state.get("prefetch_stream")
+            if stream is None:
+                stream = inference_state["prefetch_stream"] = torch.cuda.Stream(device)
+            # the side stream must see everything issued so far on the current stream
+            stream.wait_stream(torch.cuda.current_stream(device))
+
+        for start in range(0, len(missing), batch_size):
+            batch_frames = missing[start : start + batch_size]
+            frames = [inference_state["images"][t] for t in batch_frames]
+            # stack, transfer and normalize the uint8 frames on the side stream as well, so
+            # that none of this work is ordered after the tracker on the current stream
+            with torch.cuda.stream(stream):
+                if stream is not None and frames[0].device.type == "cpu":
+                    # stage CPU frames in pinned memory so that the host-to-device copy is
+                    # really asynchronous (a copy from pageable memory blocks the caller);
+                    # the caching host allocator keeps the buffer alive until the copy is done
+                    images = torch.empty(
+                        (len(frames), *frames[0].shape), dtype=frames[0].dtype, pin_memory=True
+                    )
+                    torch.stack(frames, out=images)
+                else:
+                    images = torch.stack(frames)
+                images = self._normalize_frames(images.to(device, non_blocking=True))
+            backbone_out, ready_event = self._run_image_encoder(inference_state, images, stream)
+            for i, t in enumerate(batch_frames):
+                frame_backbone_out = {
+                    "backbone_fpn": [x[i : i + 1] for x in backbone_out["backbone_fpn"]],
+                    "vision_pos_enc": [pos[:1] for pos in backbone_out["vision_pos_enc"]],
+                }
+                prefetched[t] = (images[i : i + 1], frame_backbone_out, ready_event)
+
+        # evict the oldest entries (e.g. frames skipped by the caller)
+        while len(prefetched) > max_prefetched:
+            prefetched.popitem(last=False)
+
+    def get_perf_counters(self, inference_state):
+        """
+        返回图像编码器与跟踪器的耗时统计，以及图像特征缓存的命中率
+
+        backbone_time 为图像编码器的耗时(CUDA上为GPU执行时间)，tracker_time 为跟踪器
+        (记忆注意力、掩膜解码器和记忆编码器)每帧的墙钟时间，单位均为秒。
+        """
+        self._collect_backbone_timing(inference_state, wait=True)
+        counters = dict(inference_state["perf_counters"])
+        counters.update(inference_state["cached_features"].stats())
+        return counters
+
     def _run_single_frame_inference(
         self,
         inference_state,
@@ -1009,6 +1336,8 @@ class SAM2VideoPredictor(SAM2Base):
         reverse,
         run_mem_encoder,
         prev_sam_mask_logits=None,
+        kf_state=None,
+        cache_features=True,
     ):
         """Run tracking on a single frame based on current inputs and previous memory."""
         # Retrieve correct image features
@@ -1018,7 +1347,7 @@ class SAM2VideoPredictor(SAM2Base):
             current_vision_feats,
             current_vision_pos_embeds,
             feat_sizes,
-        ) = self._get_image_feature(inference_state, frame_idx, batch_size)
+        ) = self._get_image_feature(inference_state, frame_idx, batch_size, cache_features)
 
         # point and mask should not appear as input simultaneously on the same frame
         assert point_inputs is None or mask_inputs is None
@@ -1035,6 +1364,7 @@ class SAM2VideoPredictor(SAM2Base):
             track_in_reverse=reverse,
             run_mem_encoder=run_mem_encoder,
             prev_sam_mask_logits=prev_sam_mask_logits,
+            kf_state=kf_state,
         )
 
         # optionally offload the output to CPU memory to save GPU space
@@ -1198,6 +1528,7 @@ class SAM2VideoPredictor(SAM2Base):
         _map_keys(inference_state["mask_inputs_per_obj"])
         _map_keys(inference_state["output_dict_per_obj"])
         _map_keys(inference_state["temp_output_dict_per_obj"])
+        inference_state["kf_state"].remove(old_obj_idx_to_rm)
 
         # Step 3: For packed tensor storage, we index the remaining ids and rebuild the per-object slices.
         def _slice_state(output_dict, storage_key):
@@ -1213,6 +1544,12 @@ class SAM2VideoPredictor(SAM2Base):
                 out["object_score_logits"] = out["object_score_logits"][
                     remain_old_obj_inds
                 ]
+                # per-object SAMURAI scores (absent or unbatched on prompted frames)
+                for key in ("best_iou_score", "kf_score"):
+                    score = out.get(key)
+                    if score is not None and score.dim() == 1 and len(score) == len(old_obj_ids):
+                        out[key] = score[remain_old_obj_inds]
+                out.pop("memory_bank_scores", None)
                 # also update the per-object slices
                 self._add_output_per_object(
                     inference_state, frame_idx, out, storage_key
@@ -1220,6 +1557,8 @@ class SAM2VideoPredictor(SAM2Base):
 
         _slice_state(inference_state["output_dict"], "cond_frame_outputs")
         _slice_state(inference_state["output_dict"], "non_cond_frame_outputs")
+        # the scores of the remaining objects decide the SAMURAI memory bank frames from now on
+        self._reindex_memory_bank_frames(inference_state)
 
         # Step 4: Further collect the outputs on those frames in `obj_input_frames_inds`, which
         # could show an updated mask for objects previously occluded by the object being removed
@@ -1244,6 +1583,58 @@ class SAM2VideoPredictor(SAM2Base):
 
         return inference_state["obj_ids"], updated_frames
 
+    def _memory_retention_window(self):
+        """Number of frames before the current frame whose outputs the memory attention may
+        select regardless of their scores (mask memories and object pointers)."""
+        return max(
+            self.num_maskmem * self.memory_temporal_stride_for_eval,
+            self.max_obj_ptrs_in_encoder,
+        )
+
+    def release_old_frame_outputs(self, inference_state, frame_idx):
+        """
+        释放正向跟踪到 frame_idx 及之后各帧时记忆注意力不会再选用的非条件帧输出。
+
+        保留的帧包括: frame_idx 之前 num_maskmem * stride 及 max_obj_ptrs_in_encoder 帧内的输出，
+        以及SAMURAI模式下最近的 max_obj_ptrs_in_encoder - 1 个满足记忆库阈值的候选帧。
+        条件帧和带有用户输入的帧始终保留。之后的帧只会选用更新的帧，因此释放后跟踪结果不变。
+
+        Args:
+            inference_state: 推理状态
+            frame_idx: 下一个要跟踪的帧
+
+        Returns:
+            int: 释放的帧数
+        """
+        non_cond_frame_outputs = inference_state["output_dict"]["non_cond_frame_outputs"]
+        window_begin = frame_idx - self._memory_retention_window()
+        keep = {t for t in non_cond_frame_outputs if t >= window_begin}
+        # frames with user inputs are never released
+        keep.update(inference_state["consolidated_frame_inds"]["non_cond_frame_outputs"])
+        if self.samurai_mode:
+            # same selection as in `_prepare_memory_conditioned_features`
+            keep.update(
+                self._latest_memory_bank_frames(
+                    frame_idx, inference_state["output_dict"], self.max_obj_ptrs_in_encoder - 1
+                )
+            )
+
+        released = [t for t in non_cond_frame_outputs if t not in keep]
+        for t in released:
+            non_cond_frame_outputs.pop(t)
+            for obj_output_dict in inference_state["output_dict_per_obj"].values():
+                obj_output_dict["non_cond_frame_outputs"].pop(t, None)
+        memory_bank_frames = inference_state["output_dict"]["memory_bank_frames"]
+        memory_bank_frames[:] = [t for t in memory_bank_frames if t in non_cond_frame_outputs]
+        return len(released)
+
+    def _reindex_memory_bank_frames(self, inference_state):
+        """Rebuild the SAMURAI memory bank index from the stored non-conditioning outputs."""
+        output_dict = inference_state["output_dict"]
+        output_dict["memory_bank_frames"].clear()
+        for t in sorted(output_dict["non_cond_frame_outputs"]):
+            self._record_memory_bank_frame(output_dict, t)
+
     def _clear_non_cond_mem_around_input(self, inference_state, frame_idx):
         """
         Remove the non-conditioning memory around the input frame. When users provide
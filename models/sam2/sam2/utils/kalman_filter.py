@@ -179,10 +179,8 @@ class KalmanFilter(object):
             self._std_weight_velocity * mean[:, 3]]
         sqr = np.square(np.r_[std_pos, std_vel]).T
 
-        motion_cov = []
-        for i in range(len(mean)):
-            motion_cov.append(np.diag(sqr[i]))
-        motion_cov = np.asarray(motion_cov)
+        motion_cov = np.zeros((len(mean), 8, 8))
+        motion_cov[:, np.arange(8), np.arange(8)] = sqr
 
         mean = np.dot(mean, self._motion_mat.T)
         left = np.dot(self._motion_mat, covariance).transpose((1, 0, 2))
@@ -190,6 +188,96 @@ class KalmanFilter(object):
 
         return mean, covariance
 
+    def multi_initiate(self, measurements):
+        """Create tracks from unassociated measurements (Vectorized version).
+
+        Parameters
+        ----------
+        measurements : ndarray
+            The Nx4 dimensional matrix of bounding boxes (x, y, a, h).
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx8 mean matrix and Nx8x8 covariance matrices of the new
+            tracks.
+
+        """
+        measurements = np.asarray(measurements, dtype=np.float64).reshape(-1, 4)
+        mean = np.concatenate([measurements, np.zeros_like(measurements)], axis=1)
+
+        h = measurements[:, 3]
+        std = np.stack([
+            2 * self._std_weight_position * h,
+            2 * self._std_weight_position * h,
+            1e-2 * np.ones_like(h),
+            2 * self._std_weight_position * h,
+            10 * self._std_weight_velocity * h,
+            10 * self._std_weight_velocity * h,
+            1e-5 * np.ones_like(h),
+            10 * self._std_weight_velocity * h], axis=1)
+        covariance = np.zeros((len(measurements), 8, 8))
+        covariance[:, np.arange(8), np.arange(8)] = np.square(std)
+        return mean, covariance
+
+    def multi_project(self, mean, covariance):
+        """Project state distributions to measurement space (Vectorized version).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 projected covariances.
+
+        """
+        h = mean[:, 3]
+        std = np.stack([
+            self._std_weight_position * h,
+            self._std_weight_position * h,
+            1e-1 * np.ones_like(h),
+            self._std_weight_position * h], axis=1)
+
+        projected_mean = np.dot(mean, self._update_mat.T)
+        projected_cov = np.matmul(np.matmul(self._update_mat, covariance), self._update_mat.T)
+        projected_cov[:, np.arange(4), np.arange(4)] += np.square(std)
+        return projected_mean, projected_cov
+
+    def multi_update(self, mean, covariance, measurements):
+        """Run Kalman filter correction step (Vectorized version).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional predicted mean matrix.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices.
+        measurements : ndarray
+            The Nx4 dimensional measurement matrix (x, y, a, h).
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # K = P H^T S^-1, solved as S K^T = (P H^T)^T since S is symmetric
+        cov_ht = np.matmul(covariance, self._update_mat.T)
+        kalman_gain = np.linalg.solve(projected_cov, cov_ht.transpose(0, 2, 1)).transpose(0, 2, 1)
+        innovation = np.asarray(measurements, dtype=np.float64) - projected_mean
+
+        new_mean = mean + np.einsum('nij,nj->ni', kalman_gain, innovation)
+        new_covariance = covariance - np.matmul(
+            np.matmul(kalman_gain, projected_cov), kalman_gain.transpose(0, 2, 1))
+        return new_mean, new_covariance
+
     def update(self, mean, covariance, measurement):
         """Run Kalman filter correction step.
 
@@ -279,6 +367,35 @@ class KalmanFilter(object):
             ious.append(iou)
         return ious
 
+    def multi_compute_iou(self, pred_bboxes, bboxes):
+        """
+        Compute the IoU between each predicted bbox and its candidate bboxes
+
+        Parameters
+        ----------
+        pred_bboxes : ndarray
+            The Nx4 dimensional predicted bboxes (x, y, a, h).
+        bboxes : ndarray
+            The NxMx4 dimensional candidate bboxes [x1, y1, x2, y2]. All-zero
+            bboxes (empty masks) get an IoU of 0.
+
+        Returns
+        -------
+        ndarray
+            The NxM dimensional IoU matrix.
+        """
+        pred_bboxes = self.multi_xyah_to_xyxy(pred_bboxes)[:, None, :]
+        bboxes = np.asarray(bboxes, dtype=np.float64)
+        inter_w = np.maximum(0, np.minimum(pred_bboxes[..., 2], bboxes[..., 2]) - np.maximum(pred_bboxes[..., 0], bboxes[..., 0]))
+        inter_h = np.maximum(0, np.minimum(pred_bboxes[..., 3], bboxes[..., 3]) - np.maximum(pred_bboxes[..., 1], bboxes[..., 1]))
+        intersection_area = inter_w * inter_h
+        union_area = ((pred_bboxes[..., 2] - pred_bboxes[..., 0]) * (pred_bboxes[..., 3] - pred_bboxes[..., 1])
+                      + (bboxes[..., 2] - bboxes[..., 0]) * (bboxes[..., 3] - bboxes[..., 1]) - intersection_area)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ious = np.where(union_area != 0, intersection_area / union_area, 0.0)
+        ious[np.all(bboxes == 0, axis=-1)] = 0.0
+        return ious
+
     def _compute_iou(self, bbox1, bbox2):
         """
         Compute the Intersection over Union (IoU) of two bounding boxes.
@@ -322,3 +439,49 @@ class KalmanFilter(object):
         x2 = xc + a * h / 2
         y2 = yc + h / 2
         return [x1, y1, x2, y2]
+
+    def multi_xyxy_to_xyah(self, bboxes):
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        x1, y1, x2, y2 = bboxes.T
+        h = y2 - y1
+        h = np.where(h == 0, 1, h)
+        return np.stack([(x1 + x2) / 2, (y1 + y2) / 2, (x2 - x1) / h, h], axis=1)
+
+    def multi_xyah_to_xyxy(self, bboxes):
+        xc, yc, a, h = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4).T
+        return np.stack([xc - a * h / 2, yc - h / 2, xc + a * h / 2, yc + h / 2], axis=1)
+
+
+class KalmanFilterState(object):
+    """
+    Kalman filter states of a set of tracked objects, one row per object.
+
+    Rows are indexed by the model-side object index. A row that has not been
+    initiated yet (or whose track was reset) has `stable_frames == 0`.
+    """
+
+    def __init__(self):
+        self.mean = np.zeros((0, 8))
+        self.covariance = np.zeros((0, 8, 8))
+        self.stable_frames = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.stable_frames)
+
+    def ensure_size(self, num_objects):
+        """Append empty rows so that there is one row per object."""
+        extra = num_objects - len(self)
+        if extra > 0:
+            self.mean = np.concatenate([self.mean, np.zeros((extra, 8))])
+            self.covariance = np.concatenate([self.covariance, np.zeros((extra, 8, 8))])
+            self.stable_frames = np.concatenate([self.stable_frames, np.zeros(extra, dtype=np.int64)])
+
+    def remove(self, index):
+        """Remove the row of a removed object (later rows shift down by one)."""
+        if index < len(self):
+            self.mean = np.delete(self.mean, index, axis=0)
+            self.covariance = np.delete(self.covariance, index, axis=0)
+            self.stable_frames = np.delete(self.stable_frames, index)
+
+    def reset(self):
+        self.__init__()
@@ -6,11 +6,14 @@
 
 import os
 import warnings
+from collections import OrderedDict
+from functools import lru_cache
 from threading import Thread
 
 import cv2
 import numpy as np
 import torch
+import torchvision.transforms.functional as TF
 from PIL import Image
 from tqdm import tqdm
 
@@ -93,15 +96,343 @@ def mask_to_box(masks: torch.Tensor):
 def _load_img_as_tensor(img_path, image_size):
     img_pil = Image.open(img_path)
     img_np = np.array(img_pil.convert("RGB").resize((image_size, image_size)))
-    if img_np.dtype == np.uint8:  # np.uint8 is expected for JPEG images
-        img_np = img_np / 255.0
-    else:
+    # np.uint8 is expected for JPEG images, frames are kept as uint8 and only
+    # normalized when they are fed to the image encoder
+    if img_np.dtype != np.uint8:
         raise RuntimeError(f"Unknown image dtype: {img_np.dtype} on {img_path}")
     img = torch.from_numpy(img_np).permute(2, 0, 1)
     video_width, video_height = img_pil.size  # the original video size
     return img, video_height, video_width
 
 
+def bgr_frame_to_uint8_tensor(frame, image_size):
+    """将OpenCV读取的BGR图像帧转换为 (3, image_size, image_size) 的uint8 RGB张量"""
+    img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    img = torch.from_numpy(img_rgb).permute(2, 0, 1)
+    return TF.resize(img, [image_size, image_size], antialias=True)
+
+
+@lru_cache(maxsize=None)
+def _get_normalization_tensors(img_mean, img_std, device):
+    """Mean and std tensors (3, 1, 1) on a device, created once per device."""
+    img_mean = torch.tensor(img_mean, dtype=torch.float32, device=device)[:, None, None]
+    img_std = torch.tensor(img_std, dtype=torch.float32, device=device)[:, None, None]
+    return img_mean, img_std
+
+
+def normalize_video_frames(
+    images,
+    img_mean=(0.485, 0.456, 0.406),
+    img_std=(0.229, 0.224, 0.225),
+):
+    """
+    Convert uint8 video frames of shape (..., 3, H, W) into the float32 model input
+    normalized by mean and std (on the device where the frames are).
+    """
+    img_mean, img_std = _get_normalization_tensors(tuple(img_mean), tuple(img_std), images.device)
+    images = images.float() / 255.0
+    images -= img_mean
+    images /= img_std
+    return images
+
+
+class CompressedVideoFrames:
+    """
+    Video frames kept in memory as encoded JPEG or PNG images. Indexing decodes a frame
+    back into a uint8 tensor (3, H, W), so that only the compressed stream stays in
+    (CPU) memory. PNG is lossless, JPEG is much smaller at a small loss of fidelity.
+    If `img_mean` and `img_std` are given, decoded frames are normalized by them.
+    """
+
+    def __init__(self, frame_format="jpeg", jpeg_quality=95, img_mean=None, img_std=None):
+        if frame_format == "jpeg":
+            self.ext, self.params = ".jpg", [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        elif frame_format == "png":
+            self.ext, self.params = ".png", []
+        else:
+            raise ValueError(f"Unsupported frame compression: {frame_format}")
+        self.img_mean = img_mean
+        self.img_std = img_std
+        self.frames = []
+
+    def append(self, img):
+        """Encode a uint8 RGB frame tensor (3, H, W) and append it."""
+        img_bgr = cv2.cvtColor(img.permute(1, 2, 0).cpu().numpy(), cv2.COLOR_RGB2BGR)
+        ok, buf = cv2.imencode(self.ext, img_bgr, self.params)
+        if not ok:
+            raise RuntimeError(f"Failed to encode a video frame as {self.ext}")
+        self.frames.append(buf)
+
+    def __getitem__(self, index):
+        img_bgr = cv2.imdecode(self.frames[index], cv2.IMREAD_COLOR)
+        img = torch.from_numpy(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)).permute(2, 0, 1)
+        return _normalize_loaded_frames(img, self.img_mean, self.img_std)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.frames)
+
+
+def _normalize_loaded_frames(images, img_mean, img_std):
+    """
+    Normalize loaded uint8 frames by mean and std as the loaders' callers ask for.
+    With `img_mean` and `img_std` set to None (as the video predictor does), the frames
+    are kept as uint8 and normalized only when they are fed to the image encoder.
+    """
+    if img_mean is None or img_std is None:
+        return images
+    return normalize_video_frames(images, img_mean, img_std)
+
+
+def stack_video_frames(frames, frame_compression=None, img_mean=None, img_std=None):
+    """
+    Store a sequence of uint8 frame tensors (3, H, W) either as a single uint8 tensor
+    (N, 3, H, W) or, with `frame_compression` set to "jpeg" or "png", as
+    `CompressedVideoFrames` in CPU memory. `img_mean` and `img_std` are only used with
+    `frame_compression`, to normalize the frames when they are decoded.
+    """
+    if frame_compression is None:
+        return torch.stack(list(frames), dim=0)
+    images = CompressedVideoFrames(frame_compression, img_mean=img_mean, img_std=img_std)
+    for img in frames:
+        images.append(img)
+    return images
+
+
+# 帧迭代器结束的标记，帧迭代器产生的None不会被误当作视频结束
+_END_OF_FRAMES = object()
+
+
+class StreamingVideoFrameLoader:
+    """
+    从单个帧迭代器顺序解码视频帧，只在有界窗口中保留最近的帧。
+
+    窗口中同时保存原始BGR帧(供叠加渲染使用)和缩放后的uint8模型输入，主机内存占用
+    与窗口大小成正比而与视频长度无关。帧需要按递增顺序访问，已滑出窗口的帧无法再读取，
+    因此不支持反向跟踪。
+
+    num_frames 只是预计帧数(如视频容器报告的帧数，对可变帧率或封装有误的文件并不准确)：
+    解码超过预计帧数时随之增加，迭代器结束时更新为实际帧数。用 has_frame() 判断某帧是否存在。
+    """
+
+    def __init__(
+        self,
+        frames,
+        num_frames,
+        image_size,
+        offload_video_to_cpu,
+        img_mean=(0.485, 0.456, 0.406),
+        img_std=(0.229, 0.224, 0.225),
+        compute_device=torch.device("cuda"),
+        window_size=8,
+    ):
+        self.frames = iter(frames)
+        self.num_frames = num_frames
+        self.image_size = image_size
+        self.offload_video_to_cpu = offload_video_to_cpu
+        # img_mean/img_std 为 None 时模型输入保持为uint8，送入图像编码器时再归一化
+        self.img_mean = img_mean
+        self.img_std = img_std
+        self.compute_device = compute_device
+        self.window_size = max(1, window_size)
+        # {frame_idx: (BGR帧, 模型输入张量)}，按解码顺序排列
+        self.window = OrderedDict()
+        self.next_index = 0
+        self.exhausted = False  # 迭代器是否已结束，结束后 num_frames 为实际帧数
+
+        # 解码第一帧以获得视频尺寸
+        if not self.has_frame(0):
+            raise ValueError("视频中没有可解码的帧")
+        first_frame = self.get_frame(0)
+        self.video_height, self.video_width = first_frame.shape[:2]
+
+    def _decode_until(self, index):
+        while self.next_index <= index and not self.exhausted:
+            frame = next(self.frames, _END_OF_FRAMES)
+            if frame is _END_OF_FRAMES:
+                # 视频实际结束的位置，以此修正预计帧数
+                self.exhausted = True
+                self.num_frames = self.next_index
+                break
+            if frame is None:
+                raise ValueError(f"第 {self.next_index} 帧无法解码")
+            img = bgr_frame_to_uint8_tensor(frame, self.image_size)
+            if not self.offload_video_to_cpu:
+                img = img.to(self.compute_device, non_blocking=True)
+            img = _normalize_loaded_frames(img, self.img_mean, self.img_std)
+            self.window[self.next_index] = (frame, img)
+            self.next_index += 1
+            self.num_frames = max(self.num_frames, self.next_index)
+            while len(self.window) > self.window_size:
+                self.window.popitem(last=False)
+
+    def has_frame(self, index):
+        """第index帧是否存在，必要时向前解码到该帧以确定视频的实际结尾"""
+        if index >= self.next_index:
+            self._decode_until(index)
+        return 0 <= index < self.next_index
+
+    def _get_entry(self, index):
+        if index < 0:
+            index += self.num_frames
+        if not self.has_frame(index):
+            raise IndexError(f"帧索引 {index} 超出范围 (共 {self.num_frames} 帧)")
+        entry = self.window.get(index)
+        if entry is None:
+            raise IndexError(
+                f"第 {index} 帧已滑出流式解码窗口(窗口大小 {self.window_size})"
+            )
+        return entry
+
+    def __getitem__(self, index):
+        """返回缩放后的模型输入张量 (3, image_size, image_size)，未指定均值和标准差时为uint8"""
+        return self._get_entry(index)[1]
+
+    def get_frame(self, index):
+        """返回原始BGR帧"""
+        return self._get_entry(index)[0]
+
+    def __len__(self):
+        return self.num_frames
+
+
+class VideoFrameRingBuffer:
+    """
+    实时视频流使用的固定容量环形帧缓冲区。
+
+    预先分配 (capacity, 3, image_size, image_size) 的uint8存储，帧索引随追加单调递增，
+    只保留最近 capacity 帧，追加新帧时覆盖最旧的一帧，每帧开销与会话时长无关。
+    """
+
+    def __init__(self, capacity, image_size, device):
+        if capacity < 1:
+            raise ValueError(f"环形帧缓冲区容量必须为正数: {capacity}")
+        self.capacity = capacity
+        self.buffer = torch.empty(
+            (capacity, 3, image_size, image_size), dtype=torch.uint8, device=device
+        )
+        self.num_frames = 0  # 已追加的总帧数
+
+    def append(self, img):
+        """追加一帧uint8图像张量 (3, image_size, image_size)，返回其帧索引"""
+        frame_idx = self.num_frames
+        self.buffer[frame_idx % self.capacity].copy_(img, non_blocking=True)
+        self.num_frames += 1
+        return frame_idx
+
+    @property
+    def first_frame_idx(self):
+        """缓冲区中最旧一帧的索引"""
+        return max(0, self.num_frames - self.capacity)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.num_frames
+        if not 0 <= index < self.num_frames:
+            raise IndexError(f"帧索引 {index} 超出范围 (共 {self.num_frames} 帧)")
+        if index < self.first_frame_idx:
+            raise IndexError(f"第 {index} 帧已被环形帧缓冲区覆盖(容量 {self.capacity})")
+        return self.buffer[index % self.capacity]
+
+    def __len__(self):
+        return self.num_frames
+
+
+class ImageFeatureCache:
+    """
+    LRU cache of per-frame image features, bounded by a number of frames and optionally
+    by bytes. Entries can be kept in CPU memory and moved back to the compute device on
+    a hit. The position encodings are the same for all frames, so a single copy of them
+    is kept (on the compute device).
+    """
+
+    def __init__(
+        self,
+        max_frames=8,
+        max_bytes=None,
+        offload_to_cpu=False,
+        compute_device=torch.device("cuda"),
+    ):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.offload_to_cpu = offload_to_cpu
+        self.compute_device = compute_device
+        # {frame_idx: (image, backbone_fpn, nbytes)}, from least to most recently used
+        self.entries = OrderedDict()
+        self.vision_pos_enc = None
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, frame_idx):
+        return frame_idx in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, frame_idx):
+        """Return (image, backbone_out) of a frame, or (None, None) on a cache miss."""
+        entry = self.entries.get(frame_idx)
+        if entry is None:
+            self.misses += 1
+            return None, None
+        self.hits += 1
+        self.entries.move_to_end(frame_idx)
+        image, backbone_fpn, _ = entry
+        if self.offload_to_cpu:
+            image = image.to(self.compute_device, non_blocking=True)
+            backbone_fpn = [x.to(self.compute_device, non_blocking=True) for x in backbone_fpn]
+        backbone_out = {
+            "backbone_fpn": list(backbone_fpn),
+            "vision_pos_enc": list(self.vision_pos_enc),
+        }
+        return image, backbone_out
+
+    def put(self, frame_idx, image, backbone_out):
+        """Add the features of a frame, evicting the least recently used frames."""
+        if self.max_frames <= 0:
+            return
+        if self.vision_pos_enc is None:
+            self.vision_pos_enc = list(backbone_out["vision_pos_enc"])
+        backbone_fpn = list(backbone_out["backbone_fpn"])
+        if self.offload_to_cpu:
+            image = image.cpu()
+            backbone_fpn = [x.cpu() for x in backbone_fpn]
+        nbytes = sum(x.numel() * x.element_size() for x in [image, *backbone_fpn])
+
+        old_entry = self.entries.pop(frame_idx, None)
+        if old_entry is not None:
+            self.total_bytes -= old_entry[2]
+        self.entries[frame_idx] = (image, backbone_fpn, nbytes)
+        self.total_bytes += nbytes
+
+        # always keep the most recent frame (as the interactions happen on it)
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_frames
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            _, (_, _, evicted_bytes) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_bytes
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        """Return the hit/miss counts, hit rate and current size of the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "feature_cache_hits": self.hits,
+            "feature_cache_misses": self.misses,
+            "feature_cache_hit_rate": self.hits / lookups if lookups else 0.0,
+            "feature_cache_frames": len(self.entries),
+            "feature_cache_bytes": self.total_bytes,
+        }
+
+
 class AsyncVideoFrameLoader:
     """
     A list of video frames to be load asynchronously without blocking session start.
@@ -158,11 +489,10 @@ class AsyncVideoFrameLoader:
         )
         self.video_height = video_height
         self.video_width = video_width
-        # normalize by mean and std
-        img -= self.img_mean
-        img /= self.img_std
         if not self.offload_video_to_cpu:
             img = img.to(self.compute_device, non_blocking=True)
+        # normalize by mean and std (kept as uint8 if they are None)
+        img = _normalize_loaded_frames(img, self.img_mean, self.img_std)
         # self.images[index] = img
         return img
 
@@ -178,10 +508,14 @@ def load_video_frames(
     img_std=(0.229, 0.224, 0.225),
     async_loading_frames=False,
     compute_device=torch.device("cuda"),
+    frame_compression=None,
 ):
     """
     Load the video frames from video_path. The frames are resized to image_size as in
-    the model and are loaded to GPU if offload_video_to_cpu=False. This is used by the demo.
+    the model and normalized by `img_mean` and `img_std` (see `normalize_video_frames`);
+    with both set to None they are kept as uint8 and normalized only when fed to the
+    image encoder. They are loaded to GPU if offload_video_to_cpu=False, or kept in CPU
+    memory as JPEG/PNG images with `frame_compression`. This is used by the demo.
     """
     is_bytes = isinstance(video_path, bytes)
     is_str = isinstance(video_path, str)
@@ -197,6 +531,7 @@ def load_video_frames(
             img_mean=img_mean,
             img_std=img_std,
             compute_device=compute_device,
+            frame_compression=frame_compression,
         )
     elif is_str and os.path.isdir(video_path):
         return load_video_frames_from_jpg_images(
@@ -207,6 +542,7 @@ def load_video_frames(
             img_std=img_std,
             async_loading_frames=async_loading_frames,
             compute_device=compute_device,
+            frame_compression=frame_compression,
         )
     else:
         raise NotImplementedError(
@@ -214,6 +550,20 @@ def load_video_frames(
         )
 
 
+def list_jpg_frame_paths(jpg_folder):
+    """
+    List the JPEG frames ("<frame_index>.jpg" format) in a directory, sorted by
+    their numeric frame index.
+    """
+    frame_names = [
+        p
+        for p in os.listdir(jpg_folder)
+        if os.path.splitext(p)[-1] in [".jpg", ".jpeg", ".JPG", ".JPEG"]
+    ]
+    frame_names.sort(key=lambda p: int(os.path.splitext(p)[0]))
+    return [os.path.join(jpg_folder, frame_name) for frame_name in frame_names]
+
+
 def load_video_frames_from_jpg_images(
     video_path,
     image_size,
@@ -222,12 +572,15 @@ def load_video_frames_from_jpg_images(
     img_std=(0.229, 0.224, 0.225),
     async_loading_frames=False,
     compute_device=torch.device("cuda"),
+    frame_compression=None,
 ):
     """
     Load the video frames from a directory of JPEG files ("<frame_index>.jpg" format).
 
-    The frames are resized to image_size x image_size and are loaded to GPU if
+    The frames are resized to image_size x image_size, normalized by `img_mean` and
+    `img_std` (kept as uint8 if they are None) and are loaded to GPU if
     `offload_video_to_cpu` is `False` and to CPU if `offload_video_to_cpu` is `True`.
+    With `frame_compression` ("jpeg" or "png"), they are kept encoded in CPU memory.
 
     You can load a frame asynchronously by setting `async_loading_frames` to `True`.
     """
@@ -244,18 +597,10 @@ def load_video_frames_from_jpg_images(
             "ffmpeg to start the JPEG file from 00000.jpg."
         )
 
-    frame_names = [
-        p
-        for p in os.listdir(jpg_folder)
-        if os.path.splitext(p)[-1] in [".jpg", ".jpeg", ".JPG", ".JPEG"]
-    ]
-    frame_names.sort(key=lambda p: int(os.path.splitext(p)[0]))
-    num_frames = len(frame_names)
+    img_paths = list_jpg_frame_paths(jpg_folder)
+    num_frames = len(img_paths)
     if num_frames == 0:
         raise RuntimeError(f"no images found in {jpg_folder}")
-    img_paths = [os.path.join(jpg_folder, frame_name) for frame_name in frame_names]
-    img_mean = torch.tensor(img_mean, dtype=torch.float32)[:, None, None]
-    img_std = torch.tensor(img_std, dtype=torch.float32)[:, None, None]
 
     if async_loading_frames:
         lazy_images = AsyncVideoFrameLoader(
@@ -268,16 +613,21 @@ def load_video_frames_from_jpg_images(
         )
         return lazy_images, lazy_images.video_height, lazy_images.video_width
 
-    images = torch.zeros(num_frames, 3, image_size, image_size, dtype=torch.float32)
-    for n, img_path in enumerate(tqdm(img_paths, desc="frame loading (JPEG)")):
-        images[n], video_height, video_width = _load_img_as_tensor(img_path, image_size)
-    if not offload_video_to_cpu:
-        images = images.to(compute_device)
-        img_mean = img_mean.to(compute_device)
-        img_std = img_std.to(compute_device)
-    # normalize by mean and std
-    images -= img_mean
-    images /= img_std
+    video_width, video_height = Image.open(img_paths[0]).size  # the original video size
+    images = stack_video_frames(
+        (
+            _load_img_as_tensor(img_path, image_size)[0]
+            for img_path in tqdm(img_paths, desc="frame loading (JPEG)")
+        ),
+        frame_compression,
+        img_mean,
+        img_std,
+    )
+    if frame_compression is None:
+        if not offload_video_to_cpu:
+            images = images.to(compute_device)
+        # normalize by mean and std
+        images = _normalize_loaded_frames(images, img_mean, img_std)
     return images, video_height, video_width
 
 
@@ -288,28 +638,25 @@ def load_video_frames_from_video_file(
     img_mean=(0.485, 0.456, 0.406),
     img_std=(0.229, 0.224, 0.225),
     compute_device=torch.device("cuda"),
+    frame_compression=None,
 ):
-    """Load the video frames from a video file."""
+    """Load the video frames from a video file (see `load_video_frames`)."""
     import decord
 
-    img_mean = torch.tensor(img_mean, dtype=torch.float32)[:, None, None]
-    img_std = torch.tensor(img_std, dtype=torch.float32)[:, None, None]
     # Get the original video height and width
     decord.bridge.set_bridge("torch")
     video_height, video_width, _ = decord.VideoReader(video_path).next().shape
     # Iterate over all frames in the video
-    images = []
-    for frame in decord.VideoReader(video_path, width=image_size, height=image_size):
-        images.append(frame.permute(2, 0, 1))
-
-    images = torch.stack(images, dim=0).float() / 255.0
-    if not offload_video_to_cpu:
-        images = images.to(compute_device)
-        img_mean = img_mean.to(compute_device)
-        img_std = img_std.to(compute_device)
-    # normalize by mean and std
-    images -= img_mean
-    images /= img_std
+    frames = (
+        frame.permute(2, 0, 1)
+        for frame in decord.VideoReader(video_path, width=image_size, height=image_size)
+    )
+    images = stack_video_frames(frames, frame_compression, img_mean, img_std)
+    if frame_compression is None:
+        if not offload_video_to_cpu:
+            images = images.to(compute_device)
+        # normalize by mean and std
+        images = _normalize_loaded_frames(images, img_mean, img_std)
     return images, video_height, video_width
 
 
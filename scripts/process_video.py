@@ -1,6 +1,5 @@
 import argparse
 import os
-import os.path as osp
 
 import imageio
 import numpy as np
@@ -8,13 +7,243 @@ import cv2
 import torch
 import gc
 import sys
+import time
 
-from utils.color import COLOR
-from utils.utils import determine_model_cfg, bbox_process, prepare_frames_or_path, save_frames_to_temp_dir
+from utils.overlay import LabelOverlayRenderer, masks_to_labels
+from utils.utils import determine_model_cfg, bbox_process, prepare_frames_or_path, read_video_frames
+from utils.mask_stack import MaskStackWriter, mask_stack_path
+from utils.label_stream import LabelStreamWriter, label_stream_path
+from utils.image_writer import BackgroundVideoWriter, ImageWriterPool
 from models.sam2.sam2.build_sam import build_sam2_video_predictor
 from pathlib import Path
 import imageio.v3 as iio
 
+# 跟踪时提前编码的帧数及图像编码器的批大小
+PREFETCH_DEPTH = 8
+PREFETCH_BATCH_SIZE = 4
+# 流式解码保留的帧数，需覆盖预取的帧和当前叠加渲染的帧
+FRAME_WINDOW_SIZE = PREFETCH_DEPTH + 8
+# 每个后台输出线程(PNG掩膜写入、视频编码)最多排队的帧数
+OUTPUT_QUEUE_SIZE = 8
+# 跟踪过程中实时预览的最高帧率和预览帧的最长边(像素)
+PREVIEW_MAX_FPS = 5
+PREVIEW_MAX_SIZE = 960
+
+def print_perf_counters(predictor, state):
+    """打印图像编码器与跟踪器的耗时统计"""
+    counters = predictor.get_perf_counters(state)
+    print(f"图像编码器: {counters['backbone_frames']} 帧 / {counters['backbone_batches']} 批, "
+          f"耗时 {counters['backbone_time']:.2f}s; "
+          f"跟踪器: {counters['tracker_frames']} 帧, 耗时 {counters['tracker_time']:.2f}s")
+
+class MaskPostProcessor:
+    """
+    逐帧在设备上批量后处理掩膜，并将紧凑的标签图像和边界框异步传输到主机。
+
+    结果延迟一帧返回: 提交第t帧时返回第t-1帧的结果，使传输与下一帧的跟踪重叠。
+    CUDA上使用两组复用的锁页内存缓冲区轮流接收传输结果。
+    """
+
+    # 主机端标签类型对应的设备端类型，uint16 在设备上以相同位宽的 int16 合成
+    _DEVICE_LABEL_DTYPES = {np.dtype(np.uint8): torch.uint8, np.dtype(np.uint16): torch.int16}
+
+    def __init__(self, label_dtype=np.uint8):
+        """
+        Args:
+            label_dtype: 标签图像的数据类型，np.uint8 或 np.uint16
+        """
+        self.label_dtype = np.dtype(label_dtype)
+        self._device_dtype = self._DEVICE_LABEL_DTYPES[self.label_dtype]
+        self._pending = None
+        self._host_buffers = {}
+        self._slot = 0
+
+    def _host_buffer(self, name, tensor):
+        key = (name, self._slot)
+        buffer = self._host_buffers.get(key)
+        if buffer is None or buffer.shape != tensor.shape:
+            buffer = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+            self._host_buffers[key] = buffer
+        buffer.copy_(tensor, non_blocking=True)
+        return buffer
+
+    def submit(self, frame_idx, object_ids, masks):
+        """提交一帧的掩膜，返回已完成的上一帧结果列表(见flush)"""
+        labels, bboxes = masks_to_labels(masks, object_ids, dtype=self._device_dtype)
+        event = None
+        if labels.device.type == "cuda":
+            labels = self._host_buffer("labels", labels)
+            bboxes = self._host_buffer("bboxes", bboxes)
+            event = torch.cuda.Event()
+            event.record()
+            self._slot = 1 - self._slot
+        done = self.flush()
+        self._pending = (frame_idx, list(object_ids), labels, bboxes, event)
+        return done
+
+    def flush(self):
+        """
+        返回尚未取走的结果列表，每项为 (frame_idx, object_ids, labels, bboxes)，
+        labels 为 (H, W) label_dtype 数组，bboxes 为 [x, y, w, h] 列表
+        """
+        if self._pending is None:
+            return []
+        frame_idx, object_ids, labels, bboxes, event = self._pending
+        self._pending = None
+        if event is not None:
+            event.synchronize()
+        return [(frame_idx, object_ids, labels.numpy().view(self.label_dtype).copy(), bboxes.tolist())]
+
+
+def open_video_writer(path, fps, mask_alpha):
+    """
+    打开结果视频，叠加帧的渲染和H.264编码都在后台线程中进行
+
+    submit 的参数为 (BGR原始帧, 标签图像, 对象ID列表, 边界框列表)
+    """
+    renderer = LabelOverlayRenderer(alpha=mask_alpha)
+
+    def render(frame, labels, object_ids, bboxes):
+        img = renderer.render(frame, labels, object_ids, bboxes)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    writer = imageio.get_writer(path, fps=fps, format='FFMPEG')
+    return BackgroundVideoWriter(writer, max_pending=OUTPUT_QUEUE_SIZE, render_func=render)
+
+class PreviewPublisher:
+    """
+    跟踪过程中按限定帧率发布缩小的叠加预览帧
+
+    callback 的参数为 (BGR预览帧, 帧索引, 总帧数)，在跟踪循环所在线程中调用。
+    超过帧率的帧直接跳过，最后一帧总是发布。
+    """
+
+    def __init__(self, callback, max_fps=PREVIEW_MAX_FPS, max_size=PREVIEW_MAX_SIZE, mask_alpha=0.4):
+        self.callback = callback
+        self.min_interval = 1.0 / max_fps
+        self.max_size = max_size
+        self.renderer = LabelOverlayRenderer(alpha=mask_alpha)
+        self._last_time = None
+
+    def submit(self, frame_idx, total_frames, frame, labels, object_ids, bboxes):
+        now = time.monotonic()
+        is_last = frame_idx == total_frames - 1
+        if self._last_time is not None and now - self._last_time < self.min_interval and not is_last:
+            return
+        self._last_time = now
+
+        # 先缩小原始帧和标签图像再叠加渲染，渲染开销与原始分辨率无关
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.max_size / max(h, w))
+        if scale < 1.0:
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            labels = cv2.resize(labels, size, interpolation=cv2.INTER_NEAREST)
+            bboxes = [[int(v * scale) for v in bbox] for bbox in bboxes]
+        self.callback(self.renderer.render(frame, labels, object_ids, bboxes), frame_idx, total_frames)
+
+
+def load_predictor(args, model_cfg):
+    """
+    获取视频预测器: args.model_manager 存在时复用其中常驻的模型，否则重新构建
+
+    常驻模型在多次处理之间共享，每次处理的跟踪状态都保存在各自的推理状态中
+    """
+    model_manager = getattr(args, "model_manager", None)
+    if model_manager is not None:
+        return model_manager.get(args.model_path, args.device, model_cfg)
+    return build_sam2_video_predictor(model_cfg, args.model_path, device=args.device)
+
+
+def open_preview(args):
+    """args.preview_callback 存在时返回PreviewPublisher，否则返回None"""
+    callback = getattr(args, "preview_callback", None)
+    return PreviewPublisher(callback) if callback else None
+
+def remove_stale_file(path):
+    """删除已存在的旧结果文件"""
+    if os.path.exists(path):
+        os.remove(path)
+
+def open_mask_outputs(args, mask_dir, fps=None):
+    """
+    打开掩膜输出，返回 (标签数据类型, 掩膜栈或标签流写入器, PNG写入器)，未保存掩膜时后两者为None
+
+    args.mask_format 为 "png"(默认)时写入8位PNG目录和掩膜栈 masks.npy；为 "stream" 时
+    写入单文件16位标签流 labels.mtl，仅当 args.export_png 为真时同时导出16位PNG
+    """
+    if mask_dir is None:
+        return np.uint8, None, None
+    mask_dir.mkdir(exist_ok=True, parents=True)
+    # 删除上一次处理遗留的掩膜栈和标签流(两种掩膜格式都删除，滤波时标签流优先于掩膜栈)，
+    # 本次处理未完成时不会被误当作本次的结果
+    remove_stale_file(mask_stack_path(mask_dir))
+    remove_stale_file(label_stream_path(mask_dir))
+
+    if getattr(args, "mask_format", "png") == "stream":
+        if fps is None:
+            cap = cv2.VideoCapture(args.video_path)
+            fps = cap.get(cv2.CAP_PROP_FPS) or None
+            cap.release()
+        metadata = {"fps": fps, "um_per_pixel": getattr(args, "um_per_pixel", None),
+                    "video_path": str(args.video_path)}
+        label_dtype = np.uint16
+        mask_stack = LabelStreamWriter(label_stream_path(mask_dir), metadata=metadata)
+        export_png = getattr(args, "export_png", False)
+    else:
+        label_dtype = np.uint8
+        mask_stack = MaskStackWriter(mask_stack_path(mask_dir))
+        export_png = True
+
+    png_writer = ImageWriterPool(max_pending=OUTPUT_QUEUE_SIZE, write_func=iio.imwrite) if export_png else None
+    return label_dtype, mask_stack, png_writer
+
+def close_outputs(*outputs, completed=True):
+    """
+    等待后台写入完成并关闭所有输出
+
+    completed 为False(处理被取消或出错)时放弃各输出: 后台写入线程不再等待排队的数据，
+    掩膜栈等删除其临时文件，不留下只包含部分帧却看似完整的结果文件。
+    某个输出关闭失败时仍会关闭其余输出；正常完成时之后重新抛出第一个错误，
+    取消或出错时只打印该错误，不掩盖原来的异常
+    """
+    error = None
+    for output in outputs:
+        if output is None:
+            continue
+        try:
+            if not completed and hasattr(output, "discard"):
+                output.discard()
+            else:
+                output.close()
+        except Exception as e:
+            if completed and error is None:
+                error = e
+            elif not completed:
+                print(f"关闭输出失败: {e}")
+    if error is not None:
+        raise error
+
+def save_frame_result(result, state, mask_dir, mask_stack, png_writer, video_writer, preview=None):
+    """
+    保存一帧的标签掩膜(掩膜栈或标签流，及可选的PNG)，并提交叠加掩膜和边界框的帧到结果视频和实时预览
+
+    PNG压缩和视频编码在后台线程中进行，队列满时阻塞以限制内存占用
+    """
+    frame_idx, object_ids, labels, bboxes = result
+
+    # 保存组合掩码作为单一灰度图像
+    if png_writer is not None:
+        png_writer.submit(str(mask_dir / f'frame_{frame_idx:04}.png'), labels)
+    if mask_stack is not None:
+        mask_stack.append(labels)
+
+    if video_writer is not None:
+        video_writer.submit(state["images"].get_frame(frame_idx), labels, object_ids, bboxes)
+
+    if preview is not None:
+        preview.submit(frame_idx, state["num_frames"], state["images"].get_frame(frame_idx), labels, object_ids, bboxes)
+
 def process_video_in_chunks(args, initial_bbox_list: list[list[float]], chunk_seconds: int = 2, chunk_frames: int = None):
     """
     分块处理视频，支持基于时间（秒）或基于帧数的分块
@@ -27,230 +256,127 @@ def process_video_in_chunks(args, initial_bbox_list: list[list[float]], chunk_se
     """
     cap = cv2.VideoCapture(args.video_path)
     fps = int(cap.get(cv2.CAP_PROP_FPS))
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    device = args.device
+    cap.release()
+    # 整个视频只顺序解码一次，帧直接交给predictor，不再经过临时JPEG目录
+    total_frames, frame_iter = read_video_frames(args.video_path)
 
     model_cfg = determine_model_cfg(args.model_path)
-    predictor = build_sam2_video_predictor(model_cfg, args.model_path, device=device)
+    predictor = load_predictor(args, model_cfg)
 
     mask_dir = Path(args.mask_dir) if args.mask_dir else None
-    if mask_dir:
-        mask_dir.mkdir(exist_ok=True, parents=True)
+    writer = mask_stack = png_writer = None
+    completed = False
+    try:
+        label_dtype, mask_stack, png_writer = open_mask_outputs(args, mask_dir, fps)
 
-    if args.save_to_video:
-        writer = imageio.get_writer(args.video_output_path, fps=fps, format='FFMPEG')
+        if args.save_to_video:
+            writer = open_video_writer(args.video_output_path, fps, mask_alpha=0.5)
 
-    # 确定每块的大小（优先使用帧数，否则使用时间）
-    if chunk_frames is not None:
-        chunk_size = chunk_frames
-    else:
-        chunk_size = chunk_seconds * fps
-        
-    # 输出分块信息
-    if hasattr(args, 'progress_callback') and args.progress_callback:
-        total_chunks = (total_frames + chunk_size - 1) // chunk_size
-        args.progress_callback(0, total_frames)  # 初始化进度
-    
-    current_frame_idx = 0
-    bbox_list = initial_bbox_list
-
-    while current_frame_idx < total_frames:
-        # Step 1: 读取 chunk 的帧
-        frames = []
-        cap.set(cv2.CAP_PROP_POS_FRAMES, current_frame_idx)
-        chunk_frame_count = min(chunk_size, total_frames - current_frame_idx)
-        
-        for frame_offset in range(chunk_frame_count):
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frames.append(frame)
-            
-            # 如果有进度回调，更新处理进度
-            if hasattr(args, 'progress_callback') and args.progress_callback:
-                if not args.progress_callback(current_frame_idx + frame_offset, total_frames):
-                    # 用户取消处理
-                    cap.release()
-                    if args.save_to_video:
-                        writer.close()
-                    del predictor
-                    return False
-        
-        if len(frames) == 0:
-            break
+        # 确定每块的大小（优先使用帧数，否则使用时间）
+        if chunk_frames is not None:
+            chunk_size = chunk_frames
+        else:
+            chunk_size = chunk_seconds * fps
             
-        frames_folder = save_frames_to_temp_dir(frames)
-        # Step 2: 准备和初始化 predictor
+        # 输出分块信息
+        if hasattr(args, 'progress_callback') and args.progress_callback:
+            total_chunks = (total_frames + chunk_size - 1) // chunk_size
+            args.progress_callback(0, total_frames)  # 初始化进度
+
         with torch.inference_mode(), torch.autocast('cuda', dtype=torch.float16):
-            state = predictor.init_state(frames_folder, offload_video_to_cpu=True, offload_state_to_cpu=True)
-            prompts = bbox_process(bbox_list)
+            # Step 1: 初始化 predictor，所有块共用同一个推理状态
+            state = predictor.init_state_from_frame_iterator(frame_iter, total_frames, offload_video_to_cpu=True, offload_state_to_cpu=True,
+                                                             window_size=FRAME_WINDOW_SIZE)
+            prompts = bbox_process(initial_bbox_list)
             for idx, (bbox, _) in enumerate(prompts.values()):
                 _, _, masks = predictor.add_new_points_or_box(state, box=bbox, frame_idx=0, obj_id=idx)
+            postprocessor = MaskPostProcessor(label_dtype)
+            preview = open_preview(args)
+
+            # 容器报告的帧数只是估计值，逐块跟踪直到视频实际结束
+            current_frame_idx = 0
+            while state["images"].has_frame(current_frame_idx):
+                # Step 2: 释放记忆注意力不再使用的旧帧输出，上一块的记忆库(提示帧和近期记忆)保留到本块
+                predictor.release_old_frame_outputs(state, current_frame_idx)
+
+                # Step 3: 跟踪本块的帧
+                for frame_idx, object_ids, masks in predictor.propagate_in_video(
+                        state, start_frame_idx=current_frame_idx, max_frame_num_to_track=chunk_size - 1,
+                        disable_display=False, prefetch_depth=PREFETCH_DEPTH, prefetch_batch_size=PREFETCH_BATCH_SIZE):
+                    # 如果有进度回调，更新处理进度
+                    if hasattr(args, 'progress_callback') and args.progress_callback:
+                        if not args.progress_callback(frame_idx, state["num_frames"]):
+                            # 用户取消处理，未完成的输出在finally中放弃
+                            del predictor, state
+                            return False
+
+                    # 所有对象的掩膜在设备上批量后处理，结果延迟一帧取回
+                    for result in postprocessor.submit(frame_idx, object_ids, masks):
+                        save_frame_result(result, state, mask_dir, mask_stack, png_writer, writer, preview)
+
+                torch.clear_autocast_cache()
+                torch.cuda.empty_cache()
+                gc.collect()
+                current_frame_idx += chunk_size
+
+            for result in postprocessor.flush():
+                save_frame_result(result, state, mask_dir, mask_stack, png_writer, writer, preview)
+            print_perf_counters(predictor, state)
+        completed = True
+    finally:
+        close_outputs(writer, png_writer, mask_stack, completed=completed)
 
-            for i, object_ids, masks in predictor.propagate_in_video(state, disable_display=False):
-                mask_to_vis = {}
-                bbox_to_vis = {}
-                
-                # 创建一个8位灰度图像，用于存储所有对象的掩码
-                if mask_dir:
-                    combined_mask = np.zeros((height, width), dtype=np.uint8)
-                
-                for obj_id, mask in zip(object_ids, masks):
-                    mask = mask[0].cpu().numpy()
-                    binary_mask = mask > 0.0
-                    non_zero_indices = np.argwhere(binary_mask)
-                    if len(non_zero_indices) == 0:
-                        bbox = [0, 0, 0, 0]
-                    else:
-                        y_min, x_min = non_zero_indices.min(axis=0).tolist()
-                        y_max, x_max = non_zero_indices.max(axis=0).tolist()
-                        bbox = [x_min, y_min, x_max - x_min, y_max - y_min]
-
-                    mask_to_vis[obj_id] = binary_mask
-                    bbox_to_vis[obj_id] = bbox
-
-                    # 将每个对象的二值掩码添加到组合掩码中，使用对象ID+1作为灰度值
-                    if mask_dir:
-                        combined_mask[binary_mask] = obj_id + 1
-
-                # 保存组合掩码作为单一灰度图像
-                if mask_dir:
-                    mask_path = mask_dir / f'frame_{current_frame_idx+i:04}.png'
-                    iio.imwrite(mask_path, combined_mask)
-
-                if args.save_to_video:
-                    img = frames[i]
-                    for obj_id, mask in mask_to_vis.items():
-                        mask_img = np.zeros((height, width, 3), np.uint8)
-                        mask_img[mask] = COLOR[obj_id % len(COLOR)]
-                        img = cv2.addWeighted(img, 1, mask_img, 0.5, 0)
-
-                    for obj_id, bbox in bbox_to_vis.items():
-                        label = f"obj_{obj_id}"
-                        cv2.rectangle(img, (bbox[0], bbox[1]), (bbox[0]+bbox[2], bbox[1]+bbox[3]), COLOR[obj_id % len(COLOR)], 2)
-                        cv2.putText(img, label, (bbox[0], bbox[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, COLOR[obj_id % len(COLOR)], 2)
-
-                    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                    writer.append_data(img)
-
-            # Step 3: 更新 bbox_list（取最后一帧的检测框）
-            bbox_list = list(bbox_to_vis.values())
-
-            del state
-            torch.clear_autocast_cache()
-            torch.cuda.empty_cache()
-            gc.collect()
-
-        current_frame_idx += len(frames)
-
-    cap.release()
-    if args.save_to_video:
-        writer.close()
-    del predictor
+    del predictor, state
 
 def main(args, bbox_list:list[list[float]]):
-    device = args.device
     model_cfg = determine_model_cfg(args.model_path)
-    predictor = build_sam2_video_predictor(model_cfg, args.model_path, device=device,)
+    predictor = load_predictor(args, model_cfg)
     frames_or_path = prepare_frames_or_path(args.video_path)
     prompts = bbox_process(bbox_list)
 
-    if args.save_to_video:
-        if osp.isdir(args.video_path):
-            frames = sorted([osp.join(args.video_path, f) for f in os.listdir(args.video_path) if f.endswith(".jpg")])
-            loaded_frames = [cv2.imread(frame_path) for frame_path in frames]
-            height, width = loaded_frames[0].shape[:2]
-        else:
-            cap = cv2.VideoCapture(args.video_path)
-            loaded_frames = []
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                loaded_frames.append(frame)
-            cap.release()
-            height, width = loaded_frames[0].shape[:2]
-
-            if len(loaded_frames) == 0:
-                raise ValueError("No frames were loaded from the video.")
-                
-    # 获取视频总帧数
-    total_frames = len(loaded_frames)
-
-    if args.save_to_video:
-        writer = imageio.get_writer(args.video_output_path, fps=30, format='FFMPEG')
-
-    mask_dir = args.mask_dir
-    if args.mask_dir is not None:
-        mask_dir = Path(mask_dir)
-        mask_dir.mkdir(exist_ok=True, parents=True)
-    with torch.inference_mode(), torch.autocast('cuda', dtype=torch.float16):
-        state = predictor.init_state(frames_or_path, offload_video_to_cpu=True, offload_state_to_cpu=True, async_loading_frames=True)
-        all_masks = []
-        for idx, (bbox, track_label) in enumerate(prompts.values()):
-            _, _, masks = predictor.add_new_points_or_box(state, box=bbox, frame_idx=0, obj_id=idx)
-            all_masks.append(masks)
-
-        for frame_idx, object_ids, masks in predictor.propagate_in_video(state, disable_display=False):
-            # 更新进度
-            if hasattr(args, 'progress_callback') and args.progress_callback:
-                if not args.progress_callback(frame_idx, total_frames):
-                    # 用户取消了处理
-                    if args.save_to_video:
-                        writer.close()
-                    del predictor, state
-                    return False
-                    
-            mask_to_vis = {}
-            bbox_to_vis = {}
-            
-            # 创建一个8位灰度图像，用于存储所有对象的掩码
-            if mask_dir is not None:
-                combined_mask = np.zeros((height, width), dtype=np.uint8)
-
-            for obj_id, mask in zip(object_ids, masks):
-                mask = mask[0].cpu().numpy()
-                mask = mask > 0.0
-                non_zero_indices = np.argwhere(mask)
-                if len(non_zero_indices) == 0:
-                    bbox = [0, 0, 0, 0]
-                else:
-                    y_min, x_min = non_zero_indices.min(axis=0).tolist()
-                    y_max, x_max = non_zero_indices.max(axis=0).tolist()
-                    bbox = [x_min, y_min, x_max - x_min, y_max - y_min]
-                bbox_to_vis[obj_id] = bbox
-                mask_to_vis[obj_id] = mask
-                
-                # 将每个对象的二值掩码添加到组合掩码中，使用对象ID+1作为灰度值
-                if mask_dir is not None:
-                    combined_mask[mask] = obj_id + 1
-            
-            # 保存组合掩码作为单一灰度图像
-            if mask_dir is not None:
-                mask_path = mask_dir / f'frame_{frame_idx:04}.png'
-                iio.imwrite(mask_path, combined_mask)
-
-            if args.save_to_video:
-                img = loaded_frames[frame_idx]
-                for obj_id, mask in mask_to_vis.items():
-                    mask_img = np.zeros((height, width, 3), np.uint8)
-                    mask_img[mask] = COLOR[obj_id % len(COLOR)]
-                    img = cv2.addWeighted(img, 1, mask_img, 0.4, 0)
-
-                for obj_id, bbox in bbox_to_vis.items():
-                    label = f"obj_{obj_id}"
-                    cv2.rectangle(img, (bbox[0], bbox[1]), (bbox[0] + bbox[2], bbox[1] + bbox[3]), COLOR[obj_id % len(COLOR)], 2)
-                    cv2.putText(img, label, (bbox[0], bbox[1] - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6,
-                                COLOR[obj_id % len(COLOR)], 2)
-
-                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                writer.append_data(img)
+    # 视频只解码一次：同一个帧流同时供模型推理和结果视频叠加使用
+    # total_frames 只是预计帧数，跟踪进行到解码器实际读到的最后一帧
+    total_frames, frame_iter = read_video_frames(frames_or_path)
 
+    mask_dir = Path(args.mask_dir) if args.mask_dir is not None else None
+    writer = mask_stack = png_writer = None
+    completed = False
+    try:
         if args.save_to_video:
-            writer.close()
+            writer = open_video_writer(args.video_output_path, 30, mask_alpha=0.4)
+
+        label_dtype, mask_stack, png_writer = open_mask_outputs(args, mask_dir)
+        with torch.inference_mode(), torch.autocast('cuda', dtype=torch.float16):
+            state = predictor.init_state_from_frame_iterator(frame_iter, total_frames, offload_video_to_cpu=True, offload_state_to_cpu=True,
+                                                             window_size=FRAME_WINDOW_SIZE)
+            all_masks = []
+            for idx, (bbox, track_label) in enumerate(prompts.values()):
+                _, _, masks = predictor.add_new_points_or_box(state, box=bbox, frame_idx=0, obj_id=idx)
+                all_masks.append(masks)
+            postprocessor = MaskPostProcessor(label_dtype)
+            preview = open_preview(args)
+
+            # 跟踪过程中释放记忆注意力不再使用的旧帧输出，长视频的推理状态占用内存保持恒定
+            for frame_idx, object_ids, masks in predictor.propagate_in_video(state, disable_display=False, release_old_outputs=True,
+                                                                             prefetch_depth=PREFETCH_DEPTH,
+                                                                             prefetch_batch_size=PREFETCH_BATCH_SIZE):
+                # 更新进度
+                if hasattr(args, 'progress_callback') and args.progress_callback:
+                    if not args.progress_callback(frame_idx, state["num_frames"]):
+                        # 用户取消了处理，未完成的输出在finally中放弃
+                        del predictor, state
+                        return False
+                        
+                # 所有对象的掩膜在设备上批量后处理，结果延迟一帧取回
+                for result in postprocessor.submit(frame_idx, object_ids, masks):
+                    save_frame_result(result, state, mask_dir, mask_stack, png_writer, writer, preview)
+
+            for result in postprocessor.flush():
+                save_frame_result(result, state, mask_dir, mask_stack, png_writer, writer, preview)
+            print_perf_counters(predictor, state)
+        completed = True
+    finally:
+        close_outputs(writer, png_writer, mask_stack, completed=completed)
 
     del predictor, state
     gc.collect()
@@ -267,6 +393,9 @@ if __name__ == "__main__":
     parser.add_argument("--video_output_path", default="processed_video.mp4", help="Path to save the output video.")
     parser.add_argument("--save_to_video", default=True, help="Save results to a video.")
     parser.add_argument("--mask_dir", help="If provided, save mask images to the given directory")
+    parser.add_argument("--mask_format", choices=["png", "stream"], default="png",
+                        help="png: 8-bit PNG directory plus masks.npy; stream: single-file 16-bit label stream labels.mtl")
+    parser.add_argument("--export_png", action="store_true", help="Also export PNG masks when using --mask_format stream")
     parser.add_argument("--device", default="cuda:0")
     args = parser.parse_args()
     main(args, bbox_list=[[607.75244140625, 126.3901596069336, 791.4397583007812, 356.09332275390625],
@@ -14,15 +14,18 @@ import queue      # 用于线程间安全通信
 import cv2        # OpenCV库，用于图像处理和视频捕获
 import torch      # PyTorch深度学习框架
 import gc         # 垃圾回收模块，用于内存管理
-import numpy as np  # 数值计算库
 import imageio    # 用于视频写入
 from PIL import Image  # 图像处理库
 
 # 导入自定义模块
 from models.sam2.sam2.build_sam import build_sam2_video_predictor  # SAM2视频预测器构建函数
-from utils.color import COLOR  # 预定义的颜色列表，用于可视化不同对象
+from utils.overlay import LabelOverlayRenderer, masks_to_labels  # 标签图像合成与叠加渲染
 from utils.utils import determine_model_cfg  # 根据模型路径确定配置文件
 
+# 实时会话中保留的最近帧数(预分配的环形帧缓冲区容量)，
+# 需不小于记忆注意力所需的帧数(默认配置下为 max_obj_ptrs_in_encoder + 1 = 17)
+LIVE_BUFFER_SIZE = 32
+
 
 class Lang2SegTrack:
     """
@@ -66,6 +69,7 @@ class Lang2SegTrack:
         
         self.paused = True  # 视频是否暂停，设置为True表示初始状态为暂停
         self.current_frame = None  # 当前帧
+        self.renderer = LabelOverlayRenderer(alpha=0.6)  # 掩膜叠加渲染器，透明度为0.6
 
     def input_thread(self):
         """
@@ -158,23 +162,15 @@ class Lang2SegTrack:
             # 使用SAM2预测器进行推理，得到分割掩码
             for frame_idx, obj_ids, masks in predictor.propagate_in_video(state, state["num_frames"] - 1, 1):
                 self.history.clear()
-                # 处理每个对象的分割掩码
-                for obj_id, mask in zip(obj_ids, masks):
-                    # 将掩码转换为布尔数组
-                    mask = mask[0].cpu().numpy() > 0.0
-                    # 找到掩码中的非零点（对象区域）
-                    nonzero = np.argwhere(mask)
-                    if nonzero.size == 0:  # 如果掩码为空
-                        bbox = [0, 0, 0, 0]
-                    else:
-                        # 计算边界框坐标
-                        y_min, x_min = nonzero.min(axis=0)
-                        y_max, x_max = nonzero.max(axis=0)
-                        bbox = [x_min, y_min, x_max - x_min, y_max - y_min]  # [x, y, w, h]
-                    # 绘制掩码和边界框
-                    self.draw_mask_and_bbox(frame, mask, bbox, obj_id)
-                    # 记录边界框到历史记录（格式转换为[x1, y1, x2, y2]）
-                    self.history.append([bbox[0], bbox[1], bbox[0] + bbox[2], bbox[1] + bbox[3]])
+                # 在设备上批量合成所有对象的标签图像并计算边界框 [x, y, w, h]
+                labels, bboxes = masks_to_labels(masks, obj_ids)
+                labels = labels.cpu().numpy()
+                bboxes = bboxes.tolist()
+                # 绘制掩码和边界框
+                self.draw_mask_and_bbox(frame, labels, obj_ids, bboxes)
+                # 记录边界框到历史记录（格式转换为[x1, y1, x2, y2]）
+                for x, y, w, h in bboxes:
+                    self.history.append([x, y, x + w, y + h])
         else:
             # 如果没有标注输入，仅显示当前帧
             cv2.imshow("Video Tracking", self.frame_display)
@@ -195,27 +191,17 @@ class Lang2SegTrack:
         # 显示处理后的帧
         cv2.imshow("Video Tracking", frame)
 
-    def draw_mask_and_bbox(self, frame, mask, bbox, obj_id):
+    def draw_mask_and_bbox(self, frame, labels, obj_ids, bboxes):
         """
-        在帧上绘制分割掩码和边界框
+        在帧上一次性绘制所有对象的分割掩码、边界框和对象标签
         
         参数:
-            frame: 要绘制的视频帧
-            mask: 对象分割掩码（布尔数组）
-            bbox: 边界框坐标 [x, y, w, h]
-            obj_id: 对象ID，用于确定颜色
+            frame: 要绘制的视频帧（原地绘制）
+            labels: 标签图像，像素值为对象ID+1，背景为0
+            obj_ids: 对象ID列表，用于确定颜色（根据对象ID循环使用颜色列表）
+            bboxes: 与obj_ids对应的边界框坐标 [x, y, w, h]
         """
-        # 创建空白掩码图像
-        mask_img = np.zeros((self.height, self.width, 3), dtype=np.uint8)
-        # 设置掩码颜色（根据对象ID循环使用颜色列表）
-        mask_img[mask] = COLOR[obj_id % len(COLOR)]
-        # 将掩码叠加到原始帧上，透明度为0.6
-        frame[:] = cv2.addWeighted(frame, 1, mask_img, 0.6, 0)
-        # 绘制边界框
-        x, y, w, h = bbox
-        cv2.rectangle(frame, (x, y), (x + w, y + h), COLOR[obj_id % len(COLOR)], 2)
-        # 添加对象标签
-        cv2.putText(frame, f"obj_{obj_id}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, COLOR[obj_id % len(COLOR)], 2)
+        self.renderer.render(frame, labels, obj_ids, bboxes, dst=frame)
 
     def run(self):
         """
@@ -259,7 +245,9 @@ class Lang2SegTrack:
         # 使用PyTorch的推理模式和半精度加速
         with torch.inference_mode(), torch.autocast("cuda", dtype=torch.float16):
             # 初始化SAM2状态
-            state = predictor.init_state_from_numpy_frames([color_image], offload_video_to_cpu=True)
+            state = predictor.init_state_from_numpy_frames(
+                [color_image], offload_video_to_cpu=True, live_buffer_size=LIVE_BUFFER_SIZE
+            )
             # 主循环
             while True:
                 if not self.paused:
@@ -0,0 +1,43 @@
+"""测试公共配置: 将仓库根目录和SAM2包目录加入模块搜索路径"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "models", "sam2")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def tiny_predictor():
+    """随机初始化的小尺寸SAMURAI视频预测器(CPU)，只用于比较不同代码路径的结果是否一致"""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("hydra")
+    from sam2.build_sam import build_sam2_video_predictor
+
+    torch.manual_seed(0)
+    return build_sam2_video_predictor(
+        "configs/samurai/sam2.1_hiera_t.yaml",
+        None,
+        device="cpu",
+        hydra_overrides_extra=[
+            "++model.image_size=128",
+            "++model.num_maskmem=3",
+            "++model.max_obj_ptrs_in_encoder=4",
+        ],
+    )
+
+
+@pytest.fixture(scope="session")
+def moving_box_video():
+    """30帧的RGB序列，一个矩形逐帧向右下移动；返回帧列表和第0帧矩形的框(x1, y1, x2, y2)"""
+    frames = []
+    for i in range(30):
+        frame = np.zeros((96, 128, 3), np.uint8)
+        frame[20 + i // 2 : 50 + i // 2, 30 + i : 70 + i] = 200
+        frames.append(frame)
+    return frames, np.array([30, 20, 70, 50], np.float32)
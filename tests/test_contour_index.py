@@ -0,0 +1,67 @@
+"""轮廓空间索引的测试: 与逐点暴力计算的精确距离比较"""
+
+import numpy as np
+import pytest
+
+from micro_tracker.utils.contour_index import FrameContourIndex
+from micro_tracker.utils.mask_measurement import measure_frame_objects
+from micro_tracker.utils.trajectory_table import TrajectoryTableBuilder
+
+
+def _random_table(seed, num_frames=3, num_objects=6, shape=(120, 160)):
+    """每帧随机放置若干可能相互接触或重叠的矩形和圆形对象"""
+    rng = np.random.default_rng(seed)
+    builder = TrajectoryTableBuilder(1.0)
+    yy, xx = np.mgrid[:shape[0], :shape[1]]
+    for frame in range(num_frames):
+        mask = np.zeros(shape, dtype=np.uint8)
+        for obj_id in range(1, num_objects + 1):
+            cy, cx = rng.integers(10, shape[0] - 10), rng.integers(10, shape[1] - 10)
+            r = rng.integers(3, 12)
+            if obj_id % 2:
+                mask[(yy - cy) ** 2 + (xx - cx) ** 2 <= r ** 2] = obj_id
+            else:
+                mask[cy - r:cy + r, cx - r // 2:cx + r // 2 + 1] = obj_id
+        builder.append_frame(measure_frame_objects(mask, frame, 1.0, 1.0))
+    return builder.build()
+
+
+def _brute_force(table, row, max_distance):
+    """逐点计算第row行对象与同帧其他对象的轮廓间最短距离"""
+    frame = table['frame'][row]
+    points = table.contour(row).reshape(-1, 2).astype(np.float64)
+    best_id, best_distance = None, float('inf')
+    for other in np.flatnonzero(table['frame'] == frame):
+        other_id = int(table['obj_id'][other])
+        if other_id == table['obj_id'][row]:
+            continue
+        other_points = table.contour(other).reshape(-1, 2).astype(np.float64)
+        distance = float(np.sqrt(((points[:, None] - other_points[None]) ** 2).sum(-1)).min())
+        if distance <= max_distance and (distance < best_distance or
+                                         (distance == best_distance and other_id < best_id)):
+            best_id, best_distance = other_id, distance
+    return best_id, best_distance
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("max_distance", [0.0, 5.0, 20.0, 600.0])
+def test_matches_brute_force(seed, max_distance):
+    table = _random_table(seed)
+    index = FrameContourIndex(table)
+    for row in range(len(table)):
+        obj_id, distance = index.nearest_other(row, max_distance)
+        expected_id, expected_distance = _brute_force(table, row, max_distance)
+        assert obj_id == expected_id
+        assert distance == pytest.approx(expected_distance)
+
+
+def test_radius_is_inclusive():
+    """距离恰好等于搜索半径的对象也应被找到"""
+    mask = np.zeros((40, 60), dtype=np.uint8)
+    mask[10:20, 10:20] = 1
+    mask[10:20, 25:35] = 2  # 轮廓间距离为 25 - 19 = 6
+    builder = TrajectoryTableBuilder(1.0)
+    builder.append_frame(measure_frame_objects(mask, 0, 1.0, 1.0))
+    index = FrameContourIndex(builder.build())
+    assert index.nearest_other(0, 6.0) == (2, 6.0)
+    assert index.nearest_other(0, 5.9) == (None, float('inf'))
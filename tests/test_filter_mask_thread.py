@@ -0,0 +1,70 @@
+"""筛选线程读取掩膜的测试: 保存的标签流或掩膜栈比掩膜图片旧时以掩膜图片为准"""
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PyQt5.QtCore")
+
+from micro_tracker.threads.filter_mask_thread import FilterMaskThread  # noqa: E402
+from utils.mask_stack import MaskStackWriter, mask_stack_path  # noqa: E402
+
+NUM_FRAMES = 5
+
+
+def _write_pngs(mask_dir, masks):
+    for frame_idx, mask in enumerate(masks):
+        cv2.imwrite(os.path.join(mask_dir, f"frame_{frame_idx:04}.png"), mask)
+
+
+def _object1_masks():
+    masks = np.zeros((NUM_FRAMES, 32, 40), dtype=np.uint8)
+    masks[:, 4:12, 4:12] = 1
+    return masks
+
+
+def _analyze(mask_dir):
+    thread = FilterMaskThread(str(mask_dir), fps=1.0, um_per_pixel=1.0)
+    masks_data, object_ids, _ = thread._analyze_masks(None, 1)
+    return masks_data, object_ids
+
+
+def _add_object2(mask_dir, masks, frame_idx=3):
+    """在其他软件中修正一帧掩膜: 添加对象2，修改时间晚于已保存的文件"""
+    masks[frame_idx, 20:28, 20:28] = 2
+    path = os.path.join(mask_dir, f"frame_{frame_idx:04}.png")
+    cv2.imwrite(path, masks[frame_idx])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_label_stream_rebuilt_after_png_edit(tmp_path):
+    masks = _object1_masks()
+    _write_pngs(tmp_path, masks)
+    _, object_ids = _analyze(tmp_path)
+    assert object_ids == {1}
+    assert os.path.exists(tmp_path / "labels.mtl")
+
+    _add_object2(tmp_path, masks)
+    masks_data, object_ids = _analyze(tmp_path)
+    assert object_ids == {1, 2}
+    np.testing.assert_array_equal(masks_data[3], masks[3])
+
+
+def test_mask_stack_ignored_after_png_edit(tmp_path):
+    masks = _object1_masks()
+    _write_pngs(tmp_path, masks)
+    with MaskStackWriter(mask_stack_path(tmp_path)) as writer:
+        for mask in masks:
+            writer.append(mask)
+    masks_data, object_ids = _analyze(tmp_path)
+    assert object_ids == {1}
+    assert isinstance(masks_data, np.ndarray)  # 直接使用处理阶段写入的掩膜栈
+
+    _add_object2(tmp_path, masks)
+    masks_data, object_ids = _analyze(tmp_path)
+    assert object_ids == {1, 2}
+    np.testing.assert_array_equal(masks_data[3], masks[3])
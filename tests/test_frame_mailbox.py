@@ -0,0 +1,66 @@
+"""帧邮箱的测试: 界面线程只收到最新的一帧，被覆盖的帧计为丢弃"""
+
+import os
+import threading
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtCore = pytest.importorskip("PyQt5.QtCore")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+from micro_tracker.utils.frame_mailbox import FrameMailbox  # noqa: E402
+
+
+class _Receiver(QtCore.QObject):
+    frame_ready = QtCore.pyqtSignal(object, int)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def receiver(app):
+    receiver = _Receiver()
+    receiver.received = []
+    receiver.frame_ready.connect(lambda frame, index: receiver.received.append((frame, index)))
+    return receiver
+
+
+def test_latest_frame_wins(app, receiver):
+    mailbox = FrameMailbox(receiver.frame_ready)
+    for index in range(5):
+        mailbox.post(f"frame{index}", index)
+    app.processEvents()
+
+    assert receiver.received == [("frame4", 4)]
+    assert mailbox.posted_frames == 5
+    assert mailbox.dropped_frames == 4
+
+
+def test_each_frame_delivered_when_gui_keeps_up(app, receiver):
+    mailbox = FrameMailbox(receiver.frame_ready)
+    for index in range(3):
+        mailbox.post(f"frame{index}", index)
+        app.processEvents()
+
+    assert [index for _, index in receiver.received] == [0, 1, 2]
+    assert mailbox.dropped_frames == 0
+
+
+def test_post_from_worker_thread(app, receiver):
+    """工作线程投递的帧在界面线程中发出"""
+    mailbox = FrameMailbox(receiver.frame_ready)
+    threads = []
+    receiver.frame_ready.connect(lambda *_: threads.append(threading.current_thread()))
+
+    worker = threading.Thread(target=lambda: [mailbox.post(f"frame{i}", i) for i in range(100)])
+    worker.start()
+    worker.join()
+    app.processEvents()
+
+    assert receiver.received[-1] == ("frame99", 99)
+    assert len(receiver.received) + mailbox.dropped_frames == 100
+    assert threads and all(thread is threading.main_thread() for thread in threads)
@@ -0,0 +1,103 @@
+"""图像特征LRU缓存的测试"""
+
+import pytest
+import torch
+
+from sam2.utils.misc import ImageFeatureCache
+
+
+def _features(frame_idx, device="cpu", size=4):
+    """一帧的 (image, backbone_out)，image 为 size*size 个float32"""
+    image = torch.full((1, 1, size, size), float(frame_idx), device=device)
+    backbone_out = {
+        "backbone_fpn": [torch.full((1, 2, size, size), float(frame_idx), device=device)],
+        "vision_pos_enc": [torch.zeros((1, 2, size, size), device=device)],
+    }
+    return image, backbone_out
+
+
+FRAME_BYTES = (16 + 32) * 4  # image 和 backbone_fpn 的字节数
+
+
+def test_hit_returns_cached_features():
+    cache = ImageFeatureCache(max_frames=2, compute_device=torch.device("cpu"))
+    cache.put(3, *_features(3))
+    image, backbone_out = cache.get(3)
+    assert torch.equal(image, _features(3)[0])
+    assert torch.equal(backbone_out["backbone_fpn"][0], _features(3)[1]["backbone_fpn"][0])
+    assert len(backbone_out["vision_pos_enc"]) == 1
+    assert cache.get(4) == (None, None)
+
+
+def test_lru_eviction_by_frames():
+    cache = ImageFeatureCache(max_frames=2, compute_device=torch.device("cpu"))
+    cache.put(0, *_features(0))
+    cache.put(1, *_features(1))
+    cache.get(0)  # 帧0变为最近使用
+    cache.put(2, *_features(2))
+    assert 0 in cache and 2 in cache and 1 not in cache
+    assert len(cache) == 2
+    assert cache.total_bytes == 2 * FRAME_BYTES
+
+
+def test_lru_eviction_by_bytes():
+    cache = ImageFeatureCache(max_frames=10, max_bytes=2 * FRAME_BYTES + 1, compute_device=torch.device("cpu"))
+    for frame_idx in range(4):
+        cache.put(frame_idx, *_features(frame_idx))
+    assert list(cache.entries) == [2, 3]
+    assert cache.total_bytes == 2 * FRAME_BYTES
+
+    # 超过字节上限时仍保留最近的一帧
+    cache.max_bytes = 1
+    cache.put(5, *_features(5))
+    assert list(cache.entries) == [5]
+
+
+def test_put_existing_frame_replaces_entry():
+    cache = ImageFeatureCache(max_frames=2, compute_device=torch.device("cpu"))
+    cache.put(0, *_features(0))
+    cache.put(0, *_features(7))
+    assert len(cache) == 1
+    assert cache.total_bytes == FRAME_BYTES
+    assert cache.get(0)[0].flatten()[0].item() == 7
+
+
+def test_disabled_cache():
+    cache = ImageFeatureCache(max_frames=0, compute_device=torch.device("cpu"))
+    cache.put(0, *_features(0))
+    assert len(cache) == 0
+
+
+@pytest.mark.parametrize("device", ["meta"] + (["cuda"] if torch.cuda.is_available() else []))
+def test_offload_to_cpu_and_promote(device):
+    """条目保存在CPU内存中，命中时移回计算设备("meta" 设备用于在没有GPU时模拟)"""
+    compute_device = torch.device(device)
+    cache = ImageFeatureCache(max_frames=2, offload_to_cpu=True, compute_device=compute_device)
+    image, backbone_out = _features(1)
+    cache.put(1, image, backbone_out)
+    stored_image, stored_fpn, _ = cache.entries[1]
+    assert stored_image.device.type == "cpu"
+    assert all(x.device.type == "cpu" for x in stored_fpn)
+
+    image, backbone_out = cache.get(1)
+    assert image.device.type == compute_device.type
+    assert all(x.device.type == compute_device.type for x in backbone_out["backbone_fpn"])
+
+
+def test_hit_rate_counter():
+    cache = ImageFeatureCache(max_frames=2, compute_device=torch.device("cpu"))
+    assert cache.stats()["feature_cache_hit_rate"] == 0.0
+    cache.put(0, *_features(0))
+    cache.get(0)
+    cache.get(0)
+    cache.get(1)
+    cache.get(0)
+    stats = cache.stats()
+    assert stats["feature_cache_hits"] == 3
+    assert stats["feature_cache_misses"] == 1
+    assert stats["feature_cache_hit_rate"] == pytest.approx(0.75)
+    assert stats["feature_cache_frames"] == 1
+    assert stats["feature_cache_bytes"] == FRAME_BYTES
+
+    cache.clear()
+    assert len(cache) == 0 and cache.total_bytes == 0
@@ -0,0 +1,149 @@
+"""后台图片与视频写入的测试: 写入错误会被重新抛出，放弃写入时不等待排队的数据"""
+
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils.image_writer import BackgroundVideoWriter, ImageWriterPool
+
+
+class _VideoWriter:
+    def __init__(self, delay=0.0, fail_at=None):
+        self.delay = delay
+        self.fail_at = fail_at
+        self.frames = []
+        self.closed = threading.Event()
+
+    def append_data(self, frame):
+        time.sleep(self.delay)
+        if self.fail_at is not None and len(self.frames) == self.fail_at:
+            raise RuntimeError("编码失败")
+        self.frames.append(frame)
+
+    def close(self):
+        self.closed.set()
+
+
+def test_image_pool_writes_all(tmp_path):
+    written = {}
+    pool = ImageWriterPool(num_threads=2, max_pending=2, write_func=lambda path, image: written.update({path: image}))
+    for index in range(10):
+        pool.submit(str(tmp_path / f"{index}.png"), index)
+    pool.close()
+    assert sorted(written.values()) == list(range(10))
+
+
+def test_image_pool_failure_raised_on_submit_or_close():
+    pool = ImageWriterPool(num_threads=1, max_pending=1, write_func=lambda path, image: False)
+    with pytest.raises(IOError):
+        # 达到上限时submit等待最早的写入，写入失败在此时或close时抛出
+        try:
+            for index in range(3):
+                pool.submit(f"{index}.png", None)
+            pool.close()
+        finally:
+            pool.discard()
+
+
+def test_image_pool_discard_does_not_wait():
+    started = threading.Event()
+
+    def slow_write(path, image):
+        started.set()
+        time.sleep(0.5)
+
+    pool = ImageWriterPool(num_threads=1, max_pending=8, write_func=slow_write)
+    for index in range(8):
+        pool.submit(f"{index}.png", None)
+    started.wait(1)
+    start = time.perf_counter()
+    pool.discard()
+    assert time.perf_counter() - start < 0.3
+
+
+def test_video_writer_writes_in_order():
+    writer = _VideoWriter()
+    with BackgroundVideoWriter(writer, max_pending=2, render_func=lambda index: index * 2) as video:
+        for index in range(20):
+            video.submit(index)
+    assert writer.frames == [index * 2 for index in range(20)]
+    assert writer.closed.is_set()
+
+
+def test_video_writer_render_failure_raised_on_close():
+    def render(index):
+        if index == 1:
+            raise ValueError("渲染失败")
+        return index
+
+    video = BackgroundVideoWriter(_VideoWriter(), render_func=render)
+    video.submit(0)
+    video.submit(1)
+    with pytest.raises(IOError):
+        video.close()
+
+
+def test_video_writer_failure_raised_on_submit():
+    video = BackgroundVideoWriter(_VideoWriter(fail_at=0), max_pending=1)
+    with pytest.raises(IOError):
+        for index in range(50):
+            video.submit(index)
+            time.sleep(0.01)
+    video.discard()
+
+
+def test_video_writer_discard_does_not_wait():
+    writer = _VideoWriter(delay=0.2)
+    video = BackgroundVideoWriter(writer, max_pending=8)
+    for index in range(8):
+        video.submit(index)
+    start = time.perf_counter()
+    video.discard()
+    assert time.perf_counter() - start < 0.1
+    # 后台线程写完正在编码的一帧后关闭写入器，排队的帧被丢弃
+    assert writer.closed.wait(1)
+    assert len(writer.frames) <= 1
+
+
+@pytest.mark.parametrize("mask_format", ["png", "stream"])
+def test_close_outputs_discards_partial_results(tmp_path, mask_format):
+    pv = pytest.importorskip("scripts.process_video")
+    args = SimpleNamespace(video_path="", mask_format=mask_format, export_png=True)
+    _, mask_stack, png_writer = pv.open_mask_outputs(args, tmp_path, fps=10.0)
+    video = BackgroundVideoWriter(_VideoWriter(delay=0.05))
+    for index in range(3):
+        mask = np.full((4, 4), index, dtype=np.uint8)
+        mask_stack.append(mask)
+        png_writer.submit(str(tmp_path / f"frame_{index:04}.png"), mask)
+        video.submit(mask)
+
+    pv.close_outputs(video, png_writer, mask_stack, completed=False)
+    remaining = set(os.listdir(tmp_path))
+    assert not remaining & {"masks.npy", "labels.mtl", "masks.npy.tmp", "labels.mtl.tmp"}
+
+
+def test_close_outputs_closes_all_and_reraises():
+    class _Output:
+        def __init__(self, error=None):
+            self.error = error
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+            if self.error:
+                raise self.error
+
+    pv = pytest.importorskip("scripts.process_video")
+    outputs = [_Output(IOError("第一个")), _Output(), _Output(IOError("第二个"))]
+    with pytest.raises(IOError, match="第一个"):
+        pv.close_outputs(*outputs)
+    assert all(output.closed for output in outputs)
+
+    # 取消或出错时不抛出关闭时的错误，以免掩盖原来的异常
+    outputs = [_Output(IOError("关闭失败")), _Output()]
+    pv.close_outputs(*outputs, completed=False)
+    assert all(output.closed for output in outputs)
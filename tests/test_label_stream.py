@@ -0,0 +1,104 @@
+"""单文件标签流的读写测试"""
+
+import os
+
+import numpy as np
+import pytest
+
+from utils.label_stream import LabelStreamReader, LabelStreamWriter, label_stream_path
+from utils.mask_stack import open_mask_stack
+
+
+def _random_labels(num_frames, shape=(20, 28), seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 4, size=(num_frames, *shape)).astype(np.uint16)
+    labels[labels == 3] = 300  # 超过8位的对象ID
+    return labels
+
+
+def test_round_trip(tmp_path):
+    labels = _random_labels(6)
+    path = label_stream_path(tmp_path)
+    with LabelStreamWriter(path, metadata={"fps": 25.0, "um_per_pixel": 0.5}) as writer:
+        for frame in labels:
+            writer.append(frame)
+
+    reader = LabelStreamReader(path)
+    try:
+        assert len(reader) == 6
+        assert reader.shape == labels.shape
+        assert reader.dtype == np.uint16
+        assert reader.metadata["fps"] == 25.0
+        assert reader.metadata["um_per_pixel"] == 0.5
+        np.testing.assert_array_equal(reader.object_ids, [1, 2, 300])
+        # 随机访问、负索引和迭代
+        np.testing.assert_array_equal(reader[3], labels[3])
+        np.testing.assert_array_equal(reader[-1], labels[-1])
+        np.testing.assert_array_equal(np.stack(list(reader)), labels)
+        with pytest.raises(IndexError):
+            reader[6]
+    finally:
+        reader.close()
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_open_mask_stack_returns_reader(tmp_path):
+    labels = _random_labels(2)
+    path = label_stream_path(tmp_path)
+    with LabelStreamWriter(path) as writer:
+        for frame in labels:
+            writer.append(frame)
+
+    stack = open_mask_stack(path)
+    assert isinstance(stack, LabelStreamReader)
+    np.testing.assert_array_equal(stack[1], labels[1])
+    stack.close()
+
+
+def test_discard_leaves_no_file(tmp_path):
+    path = label_stream_path(tmp_path)
+    writer = LabelStreamWriter(path)
+    writer.append(_random_labels(1)[0])
+    writer.discard()
+    assert os.listdir(tmp_path) == []
+
+
+def test_incomplete_file_rejected(tmp_path):
+    path = label_stream_path(tmp_path)
+    writer = LabelStreamWriter(path)
+    writer.append(_random_labels(1)[0])
+    # 模拟中断: 只有临时文件中的帧数据，没有索引和尾部
+    writer._file.flush()
+    os.replace(path + ".tmp", path)
+    with pytest.raises(ValueError):
+        LabelStreamReader(path)
+    writer._file.close()
+
+
+def test_zstd_compression(tmp_path):
+    pytest.importorskip("zstandard")
+    labels = _random_labels(3)
+    path = label_stream_path(tmp_path)
+    with LabelStreamWriter(path, compression="zstd") as writer:
+        for frame in labels:
+            writer.append(frame)
+    reader = LabelStreamReader(path)
+    np.testing.assert_array_equal(np.stack(list(reader)), labels)
+    reader.close()
+
+
+def test_processing_removes_stale_label_stream(tmp_path):
+    """开始处理时删除旧的标签流和掩膜栈，放弃时不留下结果文件"""
+    pv = pytest.importorskip("scripts.process_video")
+    from types import SimpleNamespace
+
+    for name in ("labels.mtl", "masks.npy"):
+        (tmp_path / name).write_bytes(b"stale")
+    args = SimpleNamespace(video_path="", mask_format="png")
+    _, mask_stack, png_writer = pv.open_mask_outputs(args, tmp_path)
+    assert not (tmp_path / "labels.mtl").exists()
+    assert not (tmp_path / "masks.npy").exists()
+
+    mask_stack.append(np.zeros((4, 4), dtype=np.uint8))
+    pv.close_outputs(png_writer, mask_stack, completed=False)
+    assert os.listdir(tmp_path) == []
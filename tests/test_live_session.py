@@ -0,0 +1,91 @@
+"""实时会话的环形帧缓冲区与逐帧追加的测试"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from sam2.utils.misc import VideoFrameRingBuffer
+
+
+def _frame(value):
+    return torch.full((3, 2, 2), value, dtype=torch.uint8)
+
+
+def test_ring_buffer_overwrites_oldest_frame():
+    buffer = VideoFrameRingBuffer(3, 2, device=torch.device("cpu"))
+    assert [buffer.append(_frame(i)) for i in range(5)] == [0, 1, 2, 3, 4]
+    assert len(buffer) == 5
+    assert buffer.first_frame_idx == 2
+    for frame_idx in (2, 3, 4):
+        assert (buffer[frame_idx] == frame_idx).all()
+    assert (buffer[-1] == 4).all()
+    assert (buffer[-3] == 2).all()
+
+
+def test_ring_buffer_index_errors():
+    buffer = VideoFrameRingBuffer(3, 2, device=torch.device("cpu"))
+    with pytest.raises(IndexError):
+        buffer[0]
+    for i in range(5):
+        buffer.append(_frame(i))
+    # 越界
+    with pytest.raises(IndexError):
+        buffer[5]
+    with pytest.raises(IndexError):
+        buffer[-6]
+    # 已被覆盖
+    with pytest.raises(IndexError):
+        buffer[1]
+    with pytest.raises(IndexError):
+        buffer[-4]
+    with pytest.raises(ValueError):
+        VideoFrameRingBuffer(0, 2, device=torch.device("cpu"))
+
+
+def test_live_buffer_size_must_cover_memory_window(tiny_predictor, moving_box_video):
+    frames, _ = moving_box_video
+    min_buffer_size = tiny_predictor._memory_retention_window() + 1
+    with pytest.raises(ValueError):
+        tiny_predictor.init_state_from_numpy_frames(frames[:1], live_buffer_size=min_buffer_size - 1)
+    state = tiny_predictor.init_state_from_numpy_frames(frames[:1], live_buffer_size=min_buffer_size)
+    assert state["images"].capacity == min_buffer_size
+
+
+def _track_live(predictor, frames, box, live_buffer_size, check_state=None):
+    """逐帧追加和跟踪(与 segtrack_realtime 相同的调用方式)，返回每帧的二值掩码"""
+    masks_per_frame = {}
+    with torch.inference_mode():
+        state = predictor.init_state_from_numpy_frames(frames[:1], live_buffer_size=live_buffer_size)
+        predictor.add_new_points_or_box(state, frame_idx=0, obj_id=1, box=box)
+        for frame in frames[1:]:
+            predictor.append_frame_to_inference_state(state, frame)
+            for frame_idx, _, masks in predictor.propagate_in_video(state, state["num_frames"] - 1, 1):
+                masks_per_frame[frame_idx] = (masks > 0).cpu().numpy()
+            if check_state is not None:
+                check_state(state)
+    assert state["num_frames"] == len(frames)
+    return masks_per_frame, state
+
+
+def test_append_keeps_live_session_bounded(tiny_predictor, moving_box_video):
+    frames, box = moving_box_video
+    predictor = tiny_predictor
+    window = predictor._memory_retention_window()
+
+    def check_state(state):
+        output_dict = state["output_dict"]
+        assert len(output_dict["non_cond_frame_outputs"]) <= window + predictor.max_obj_ptrs_in_encoder - 1
+        assert len(state["frames_already_tracked"]) <= window + 1
+        assert set(output_dict["memory_bank_frames"]) <= set(output_dict["non_cond_frame_outputs"])
+        for obj_output_dict in state["output_dict_per_obj"].values():
+            assert set(obj_output_dict["non_cond_frame_outputs"]) <= set(output_dict["non_cond_frame_outputs"])
+
+    live_masks, state = _track_live(predictor, frames, box, window + 1, check_state)
+    assert state["images"].first_frame_idx == len(frames) - (window + 1)
+    assert sorted(live_masks) == list(range(1, len(frames)))
+
+    # 释放旧帧输出不影响跟踪结果: 与不使用环形缓冲区(保留全部帧和输出)时的结果相同
+    full_masks, state = _track_live(predictor, frames, box, None)
+    assert len(state["output_dict"]["non_cond_frame_outputs"]) == len(frames) - 1
+    for frame_idx, mask in full_masks.items():
+        assert (live_masks[frame_idx] == mask).all(), frame_idx
@@ -0,0 +1,119 @@
+"""逐帧对象测量的测试: 与在整帧二值掩膜上逐对象计算的结果完全一致"""
+
+import cv2
+import numpy as np
+import pytest
+
+from micro_tracker.utils.mask_measurement import boundary_label_ids, label_ids, measure_frame_objects
+
+FPS = 25.0
+UM_PER_PIXEL = 0.65
+
+
+def _reference_measure(mask, frame_idx, fps, um_per_pixel):
+    """逐对象在整帧二值掩膜上提取轮廓和属性"""
+    results = []
+    object_ids = np.unique(mask)
+    for obj_id in object_ids[object_ids > 0]:
+        obj_mask = (mask == obj_id).astype(np.uint8) * 255
+        contours, _ = cv2.findContours(obj_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            continue
+        largest_contour = max(contours, key=cv2.contourArea)
+        M = cv2.moments(largest_contour)
+        if M["m00"] == 0:
+            continue
+        cx = int(M["m10"] / M["m00"])
+        cy = int(M["m01"] / M["m00"])
+        major_axis = minor_axis = angle = 0
+        if len(largest_contour) >= 5:
+            try:
+                _, axes, angle = cv2.fitEllipse(largest_contour)
+                major_axis = max(axes) * um_per_pixel / 2
+                minor_axis = min(axes) * um_per_pixel / 2
+                angle = angle % 180
+            except cv2.error:
+                pass
+        h, w = obj_mask.shape
+        touches_boundary = bool(np.any(obj_mask[0, :]) or np.any(obj_mask[h - 1, :]) or
+                                np.any(obj_mask[:, 0]) or np.any(obj_mask[:, w - 1]))
+        results.append((int(obj_id), {
+            'frame': frame_idx,
+            'time': frame_idx / fps,
+            'area': cv2.contourArea(largest_contour) * (um_per_pixel ** 2),
+            'center_x': cx * um_per_pixel,
+            'center_y': cy * um_per_pixel,
+            'center_x_px': cx,
+            'center_y_px': cy,
+            'major_axis': major_axis,
+            'minor_axis': minor_axis,
+            'angle': angle,
+            'touches_boundary': touches_boundary,
+            'contour': largest_contour,
+        }))
+    return results
+
+
+def _random_mask(seed, shape=(96, 128), num_objects=12, dtype=np.uint8):
+    """随机生成的标签掩膜，对象可能重叠、接触边界、被分割成多块或只有一个像素"""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros(shape, dtype=dtype)
+    yy, xx = np.mgrid[:shape[0], :shape[1]]
+    for obj_id in rng.choice(np.arange(1, 300 if dtype == np.uint16 else 255), num_objects, replace=False):
+        cy, cx = rng.integers(0, shape[0]), rng.integers(0, shape[1])
+        ry, rx = rng.integers(1, 15, size=2)
+        mask[((yy - cy) / ry) ** 2 + ((xx - cx) / rx) ** 2 <= 1] = obj_id
+    mask[rng.integers(0, shape[0]), rng.integers(0, shape[1])] = 7
+    return mask
+
+
+def _measure_both(mask, frame_idx):
+    """
+    分别用两种方法测量同一帧
+
+    cv2.fitEllipse 对共线等退化轮廓会加入随机扰动，两次测量前重置OpenCV的随机数种子，
+    使退化轮廓的椭圆参数也可以逐位比较
+    """
+    cv2.setRNGSeed(0)
+    results = measure_frame_objects(mask, frame_idx, FPS, UM_PER_PIXEL)
+    cv2.setRNGSeed(0)
+    expected = _reference_measure(mask, frame_idx, FPS, UM_PER_PIXEL)
+    return results, expected
+
+
+def _assert_same(results, expected):
+    assert [obj_id for obj_id, _ in results] == [obj_id for obj_id, _ in expected]
+    for (_, data), (_, expected_data) in zip(results, expected):
+        assert data.keys() == expected_data.keys()
+        for name, value in expected_data.items():
+            if name == 'contour':
+                np.testing.assert_array_equal(data[name], value)
+            else:
+                assert data[name] == value, name
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_matches_per_object_reference(seed):
+    mask = _random_mask(seed)
+    _assert_same(*_measure_both(mask, seed))
+
+
+def test_uint16_labels():
+    mask = _random_mask(3, dtype=np.uint16)
+    assert mask.max() > 255
+    _assert_same(*_measure_both(mask, 0))
+
+
+def test_empty_mask():
+    mask = np.zeros((10, 10), dtype=np.uint8)
+    assert measure_frame_objects(mask, 0, FPS, UM_PER_PIXEL) == []
+    assert label_ids(mask).size == 0
+
+
+def test_label_and_boundary_ids():
+    mask = np.zeros((10, 12), dtype=np.uint8)
+    mask[0, 3] = 4
+    mask[4:6, 4:6] = 2
+    mask[5, 11] = 9
+    np.testing.assert_array_equal(label_ids(mask), [2, 4, 9])
+    assert boundary_label_ids(mask) == {4, 9}
@@ -0,0 +1,58 @@
+"""磁盘标签掩膜栈的读写测试"""
+
+import os
+
+import numpy as np
+import pytest
+
+from utils.mask_stack import MaskStackWriter, mask_stack_path, open_mask_stack
+
+
+def _random_masks(num_frames, shape=(24, 32), seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 6, size=(num_frames, *shape), dtype=np.uint8)
+
+
+def test_round_trip(tmp_path):
+    masks = _random_masks(5)
+    path = mask_stack_path(tmp_path)
+    with MaskStackWriter(path) as writer:
+        for mask in masks:
+            writer.append(mask)
+
+    stack = open_mask_stack(path)
+    assert stack.shape == masks.shape
+    assert stack.dtype == np.uint8
+    np.testing.assert_array_equal(stack, masks)
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_empty_stack(tmp_path):
+    path = mask_stack_path(tmp_path)
+    MaskStackWriter(path).close()
+    assert len(open_mask_stack(path)) == 0
+
+
+def test_discard_leaves_no_file(tmp_path):
+    path = mask_stack_path(tmp_path)
+    writer = MaskStackWriter(path)
+    writer.append(_random_masks(1)[0])
+    writer.discard()
+    assert os.listdir(tmp_path) == []
+
+
+def test_exception_in_context_discards(tmp_path):
+    path = mask_stack_path(tmp_path)
+    with pytest.raises(RuntimeError):
+        with MaskStackWriter(path) as writer:
+            writer.append(_random_masks(1)[0])
+            raise RuntimeError("中断")
+    assert os.listdir(tmp_path) == []
+
+
+def test_frame_shape_mismatch(tmp_path):
+    writer = MaskStackWriter(mask_stack_path(tmp_path))
+    writer.append(np.zeros((4, 4), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        writer.append(np.zeros((4, 5), dtype=np.uint8))
+    writer.discard()
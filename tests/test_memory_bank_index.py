@@ -0,0 +1,127 @@
+"""SAMURAI记忆库增量索引的测试: 选出的帧与逐帧向前扫描全部输出的结果相同"""
+
+import math
+import random
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+
+def _passes_thresholds(model, out):
+    """逐帧扫描时的阈值判断(直接由输出中的张量计算)"""
+    iou_score = out["best_iou_score"]
+    obj_score = out["object_score_logits"]
+    kf_score = out["kf_score"] if "kf_score" in out else None
+    if kf_score is not None:
+        kf_score = kf_score[~torch.isnan(kf_score)]
+    return (
+        iou_score.mean().item() > model.memory_bank_iou_threshold
+        and obj_score.mean().item() > model.memory_bank_obj_score_threshold
+        and (kf_score is None or kf_score.numel() == 0 or kf_score.mean().item() > model.memory_bank_kf_score_threshold)
+    )
+
+
+def _rescan(model, frame_idx, output_dict, max_num_frames):
+    """不使用索引，从 frame_idx - 1 向前扫描到第2帧选出记忆库帧"""
+    valid_indices = []
+    for i in range(frame_idx - 1, 1, -1):
+        out = output_dict["non_cond_frame_outputs"].get(i)
+        if out is None:
+            continue
+        if "best_iou_score" in out and _passes_thresholds(model, out):
+            valid_indices.insert(0, i)
+        if len(valid_indices) >= max_num_frames:
+            break
+    return valid_indices
+
+
+def _assert_same_selection(model, output_dict, max_num_frames=3):
+    num_frames = max(output_dict["non_cond_frame_outputs"], default=0) + 3
+    for frame_idx in range(num_frames):
+        expected = _rescan(model, frame_idx, output_dict, max_num_frames)
+        assert model._latest_memory_bank_frames(frame_idx, output_dict, max_num_frames) == expected, frame_idx
+        no_index = {"non_cond_frame_outputs": output_dict["non_cond_frame_outputs"]}
+        assert model._latest_memory_bank_frames(frame_idx, no_index, max_num_frames) == expected, frame_idx
+
+
+def _random_output(model, rng, num_objs=2):
+    """阈值附近随机取值的多目标输出，部分帧没有运动分数或只有部分目标有运动分数"""
+    def around(threshold):
+        return [threshold + rng.uniform(-0.3, 0.3) for _ in range(num_objs)]
+
+    out = {
+        "best_iou_score": torch.tensor(around(model.memory_bank_iou_threshold)),
+        "object_score_logits": torch.tensor(around(model.memory_bank_obj_score_threshold)).unsqueeze(1),
+    }
+    kind = rng.randrange(3)
+    if kind == 1:
+        out["kf_score"] = torch.tensor(around(model.memory_bank_kf_score_threshold))
+    elif kind == 2:
+        out["kf_score"] = torch.tensor([math.nan] * num_objs)
+    return out
+
+
+def _new_output_dict(model, rng, num_frames):
+    """逐帧存储输出并记录到索引(与正向跟踪相同)，部分帧没有输出"""
+    output_dict = {"cond_frame_outputs": {}, "non_cond_frame_outputs": {}, "memory_bank_frames": []}
+    for t in range(1, num_frames):
+        if rng.random() < 0.1:
+            continue
+        output_dict["non_cond_frame_outputs"][t] = _random_output(model, rng)
+        model._record_memory_bank_frame(output_dict, t)
+    return output_dict
+
+
+def test_index_matches_rescan_with_mixed_scores(tiny_predictor):
+    rng = random.Random(0)
+    output_dict = _new_output_dict(tiny_predictor, rng, 200)
+    recorded = output_dict["memory_bank_frames"]
+    assert recorded == sorted(recorded)
+    assert 0 < len(recorded) < len(output_dict["non_cond_frame_outputs"])
+    for max_num_frames in (1, 3, 500):
+        _assert_same_selection(tiny_predictor, output_dict, max_num_frames)
+
+
+def test_index_matches_rescan_after_outputs_cleared_or_replaced(tiny_predictor):
+    rng = random.Random(1)
+    output_dict = _new_output_dict(tiny_predictor, rng, 80)
+    inference_state = {"output_dict": output_dict, "output_dict_per_obj": {}}
+    # 用户在第40帧修正后清除其周围的非条件帧输出
+    tiny_predictor._clear_non_cond_mem_around_input(inference_state, 40)
+    # 带用户输入的帧的输出被合并结果替换(没有SAMURAI分数)
+    for t in (10, 11, 60):
+        output_dict["non_cond_frame_outputs"][t] = {"object_score_logits": torch.ones(2, 1)}
+    # 重新跟踪的帧的输出被替换为新的分数
+    for t in (20, 21, 70):
+        output_dict["non_cond_frame_outputs"][t] = _random_output(tiny_predictor, rng)
+        tiny_predictor._record_memory_bank_frame(output_dict, t)
+    _assert_same_selection(tiny_predictor, output_dict)
+
+
+def test_index_matches_rescan_after_remove_object(tiny_predictor, moving_box_video):
+    predictor = tiny_predictor
+    frames, box = moving_box_video
+    with torch.inference_mode():
+        state = predictor.init_state_from_numpy_frames(frames[:12])
+        predictor.add_new_points_or_box(state, frame_idx=0, obj_id=1, box=box)
+        predictor.add_new_points_or_box(state, frame_idx=0, obj_id=2, box=box + 10)
+        for _ in predictor.propagate_in_video(state):
+            pass
+
+        # 目标1只在奇数帧满足阈值，目标2在所有帧都不满足，两个目标的平均分数都不满足阈值
+        output_dict = state["output_dict"]
+        passing = predictor.memory_bank_iou_threshold + 0.4
+        for t, out in output_dict["non_cond_frame_outputs"].items():
+            out["best_iou_score"] = torch.tensor([passing if t % 2 else 0.0, 0.0])
+            out["object_score_logits"] = torch.ones(2, 1)
+            out.pop("kf_score", None)
+            out.pop("memory_bank_scores", None)
+        predictor._reindex_memory_bank_frames(state)
+        assert output_dict["memory_bank_frames"] == []
+        _assert_same_selection(predictor, output_dict)
+
+        # 删除目标2后由目标1的分数决定记忆库帧
+        predictor.remove_object(state, 2, need_output=False)
+        assert output_dict["memory_bank_frames"] == [t for t in range(1, 12) if t % 2]
+        _assert_same_selection(predictor, output_dict)
@@ -0,0 +1,137 @@
+"""常驻模型管理器的测试，通过 build_func 注入模型构建函数，不加载真实模型"""
+
+import threading
+import time
+
+import pytest
+
+from micro_tracker.utils import model_manager as model_manager_module
+from micro_tracker.utils.model_manager import ModelManager
+
+CFG = "configs/test.yaml"
+
+
+class _Builder:
+    """记录构建次数的模型构建函数"""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, model_cfg, model_path, device):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls.append((model_cfg, model_path, device))
+        if self.error is not None:
+            raise self.error
+        return object()
+
+
+@pytest.fixture(autouse=True)
+def no_memory_pressure(monkeypatch):
+    monkeypatch.setattr(model_manager_module, "_available_memory", lambda device: None)
+
+
+def test_get_reuses_resident_model(tmp_path):
+    builder = _Builder()
+    manager = ModelManager(build_func=builder)
+    path = str(tmp_path / "model.pt")
+
+    predictor = manager.get(path, "cpu", CFG)
+    assert manager.get(path, "cpu", CFG) is predictor
+    assert manager.is_loaded(path, "cpu", CFG)
+    assert len(builder.calls) == 1
+
+
+def test_cuda_falls_back_to_cpu_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_manager_module.torch.cuda, "is_available", lambda: False)
+    builder = _Builder()
+    manager = ModelManager(build_func=builder)
+    path = str(tmp_path / "model.pt")
+    assert manager.get(path, "cuda:0", CFG) is manager.get(path, "cpu", CFG)
+    assert builder.calls[0][2] == "cpu"
+
+
+def test_lru_eviction(tmp_path):
+    manager = ModelManager(max_models=2, build_func=_Builder())
+    paths = [str(tmp_path / f"model{i}.pt") for i in range(3)]
+    manager.get(paths[0], "cpu", CFG)
+    manager.get(paths[1], "cpu", CFG)
+    manager.get(paths[0], "cpu", CFG)  # model0 变为最近使用
+    manager.get(paths[2], "cpu", CFG)
+
+    assert manager.is_loaded(paths[0], "cpu", CFG)
+    assert not manager.is_loaded(paths[1], "cpu", CFG)
+    assert manager.is_loaded(paths[2], "cpu", CFG)
+
+    manager.clear()
+    assert not any(manager.is_loaded(path, "cpu", CFG) for path in paths)
+
+
+def test_trim_releases_under_memory_pressure(tmp_path, monkeypatch):
+    manager = ModelManager(max_models=2, build_func=_Builder())
+    paths = [str(tmp_path / f"model{i}.pt") for i in range(2)]
+    for path in paths:
+        manager.get(path, "cpu", CFG)
+
+    # 每释放一个模型可用内存增加，释放一个后不再紧张
+    freed = []
+    monkeypatch.setattr(manager, "_under_memory_pressure", lambda device: not freed)
+    monkeypatch.setattr(manager, "_release", lambda predictors: freed.extend(predictors))
+    manager.trim()
+
+    assert len(freed) == 1
+    assert not manager.is_loaded(paths[0], "cpu", CFG)
+    assert manager.is_loaded(paths[1], "cpu", CFG)
+
+
+def test_concurrent_get_builds_once(tmp_path):
+    builder = _Builder(delay=0.1)
+    manager = ModelManager(build_func=builder)
+    path = str(tmp_path / "model.pt")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get(path, "cpu", CFG)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builder.calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_warm_up_then_get(tmp_path, monkeypatch):
+    monkeypatch.setattr(ModelManager, "_key", lambda self, path, device, cfg=None:
+                        (path, device, cfg or CFG))
+    builder = _Builder(delay=0.05)
+    manager = ModelManager(build_func=builder)
+    path = str(tmp_path / "model.pt")
+
+    future = manager.warm_up(path, "cpu")
+    predictor = manager.get(path, "cpu")
+    assert future.result(timeout=5) is predictor
+    assert len(builder.calls) == 1
+
+
+def test_warm_up_failure_is_reported_through_future(tmp_path, monkeypatch):
+    monkeypatch.setattr(ModelManager, "_key", lambda self, path, device, cfg=None:
+                        (path, device, cfg or CFG))
+    manager = ModelManager(build_func=_Builder(error=RuntimeError("检查点损坏")))
+    future = manager.warm_up(str(tmp_path / "model.pt"), "cpu")
+    assert isinstance(future.exception(timeout=5), RuntimeError)
+    assert not manager.is_loaded(str(tmp_path / "model.pt"), "cpu")
+
+
+def test_trim_waits_for_build_in_progress(tmp_path):
+    builder = _Builder(delay=0.3)
+    manager = ModelManager(build_func=builder)
+    thread = threading.Thread(target=manager.get, args=(str(tmp_path / "model.pt"), "cpu", CFG))
+    thread.start()
+    time.sleep(0.05)
+    manager.trim()
+    # trim 与构建互斥，返回时构建已经完成
+    assert builder.calls
+    thread.join()
@@ -0,0 +1,69 @@
+"""标签图像合成的测试: 与逐对象的numpy实现结果一致"""
+
+import numpy as np
+import pytest
+import torch
+
+from utils.overlay import masks_to_labels
+
+
+def _reference(masks, object_ids, dtype):
+    """逐对象二值化、计算边界框，并按顺序写入标签图像(靠后的对象覆盖靠前的对象)"""
+    labels = np.zeros(masks.shape[2:], dtype=dtype)
+    bboxes = []
+    for obj_id, mask in zip(object_ids, masks):
+        binary_mask = mask[0].numpy() > 0.0
+        non_zero_indices = np.argwhere(binary_mask)
+        if len(non_zero_indices) == 0:
+            bboxes.append([0, 0, 0, 0])
+        else:
+            y_min, x_min = non_zero_indices.min(axis=0).tolist()
+            y_max, x_max = non_zero_indices.max(axis=0).tolist()
+            bboxes.append([x_min, y_min, x_max - x_min, y_max - y_min])
+        labels[binary_mask] = obj_id + 1
+    return labels, bboxes
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("dtype, np_dtype, max_id", [
+    (torch.uint8, np.uint8, 254),
+    (torch.int16, np.int16, 1000),
+])
+def test_matches_per_object_loop(seed, dtype, np_dtype, max_id):
+    rng = np.random.default_rng(seed)
+    num_objects = int(rng.integers(1, 8))
+    height, width = int(rng.integers(1, 40)), int(rng.integers(1, 40))
+    # 稀疏的随机前景，对象之间互相重叠，部分对象为空
+    scores = rng.normal(size=(num_objects, 1, height, width)) - rng.uniform(0.5, 3, size=(num_objects, 1, 1, 1))
+    scores[rng.random(num_objects) < 0.2] = -1.0
+    masks = torch.from_numpy(scores.astype(np.float32))
+    object_ids = rng.choice(max_id + 1, num_objects, replace=False).tolist()
+
+    labels, bboxes = masks_to_labels(masks, object_ids, dtype=dtype)
+    expected_labels, expected_bboxes = _reference(masks, object_ids, np_dtype)
+    assert labels.dtype == dtype
+    np.testing.assert_array_equal(labels.numpy(), expected_labels)
+    assert bboxes.tolist() == expected_bboxes
+
+
+def test_empty_mask_bbox():
+    masks = torch.full((2, 1, 6, 8), -1.0)
+    masks[1, 0, 2:4, 3:7] = 1.0
+    labels, bboxes = masks_to_labels(masks, [0, 5])
+    assert bboxes.tolist() == [[0, 0, 0, 0], [3, 2, 3, 1]]
+    assert labels.unique().tolist() == [0, 6]
+
+
+def test_last_object_wins():
+    masks = torch.ones((3, 1, 2, 2))
+    masks[2, 0, 0, 0] = -1.0
+    labels, _ = masks_to_labels(masks, [0, 1, 2])
+    assert labels.tolist() == [[2, 3], [3, 3]]
+
+
+def test_object_id_overflow():
+    masks = torch.ones((1, 1, 2, 2))
+    with pytest.raises(ValueError):
+        masks_to_labels(masks, [255], dtype=torch.uint8)
+    labels, _ = masks_to_labels(masks, [255], dtype=torch.int16)
+    assert labels.max().item() == 256
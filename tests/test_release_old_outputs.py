@@ -0,0 +1,46 @@
+"""正向跟踪时释放旧帧输出(release_old_outputs)的测试"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+
+def _track(predictor, frames, box, release_old_outputs):
+    """跟踪整段视频，返回每帧的二值掩码和跟踪过程中存储的非条件帧输出数的最大值"""
+    masks = {}
+    max_stored = 0
+    with torch.inference_mode():
+        state = predictor.init_state_from_numpy_frames(frames)
+        predictor.add_new_points_or_box(state, frame_idx=0, obj_id=1, box=box)
+        for frame_idx, _, video_res_masks in predictor.propagate_in_video(
+            state, release_old_outputs=release_old_outputs, disable_display=True
+        ):
+            masks[frame_idx] = (video_res_masks > 0).cpu().numpy()
+            max_stored = max(max_stored, len(state["output_dict"]["non_cond_frame_outputs"]))
+    return masks, max_stored
+
+
+def test_release_keeps_masks_identical_and_outputs_bounded(tiny_predictor, moving_box_video):
+    frames, box = moving_box_video
+    kept_masks, kept_max = _track(tiny_predictor, frames, box, release_old_outputs=False)
+    released_masks, released_max = _track(tiny_predictor, frames, box, release_old_outputs=True)
+
+    assert sorted(released_masks) == list(range(len(frames)))
+    for frame_idx, mask in kept_masks.items():
+        assert (released_masks[frame_idx] == mask).all(), frame_idx
+
+    max_stored_outputs = (
+        2 * tiny_predictor._memory_retention_window() + tiny_predictor.max_obj_ptrs_in_encoder
+    )
+    assert max_stored_outputs < len(frames) - 1
+    assert kept_max == len(frames) - 1
+    assert released_max <= max_stored_outputs
+
+
+def test_release_rejects_reverse_tracking(tiny_predictor, moving_box_video):
+    frames, box = moving_box_video
+    with torch.inference_mode():
+        state = tiny_predictor.init_state_from_numpy_frames(frames[:4])
+        tiny_predictor.add_new_points_or_box(state, frame_idx=3, obj_id=1, box=box)
+        with pytest.raises(ValueError):
+            next(tiny_predictor.propagate_in_video(state, reverse=True, release_old_outputs=True))
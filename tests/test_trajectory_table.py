@@ -0,0 +1,76 @@
+"""列式轨迹表的测试"""
+
+import numpy as np
+
+from micro_tracker.utils.mask_measurement import measure_frame_objects
+from micro_tracker.utils.trajectory_table import TrajectoryTable, TrajectoryTableBuilder
+
+FPS = 10.0
+UM_PER_PIXEL = 0.5
+
+
+def _frame_masks():
+    """三帧掩膜: 对象1在每帧出现并向右移动，对象2只出现在第0和第2帧"""
+    masks = np.zeros((3, 40, 50), dtype=np.uint8)
+    for frame in range(3):
+        masks[frame, 5:15, 5 + 4 * frame:17 + 4 * frame] = 1
+    masks[0, 25:35, 30:38] = 2
+    masks[2, 24:36, 31:40] = 2
+    return masks
+
+
+def _build_table(masks):
+    builder = TrajectoryTableBuilder(FPS)
+    measurements = [measure_frame_objects(mask, i, FPS, UM_PER_PIXEL) for i, mask in enumerate(masks)]
+    for frame_measurements in measurements:
+        builder.append_frame(frame_measurements)
+    return builder.build(), measurements
+
+
+def test_rows_sorted_by_object_and_frame():
+    table, _ = _build_table(_frame_masks())
+    assert len(table) == 5
+    np.testing.assert_array_equal(table['obj_id'], [1, 1, 1, 2, 2])
+    np.testing.assert_array_equal(table['frame'], [0, 1, 2, 0, 2])
+    np.testing.assert_array_equal(table.object_ids, [1, 2])
+    assert table.num_objects == 2
+    assert table.object_slice(1) == slice(0, 3)
+    assert table.object_slice(2) == slice(3, 5)
+    assert table.object_slice(7) == slice(0, 0)
+    np.testing.assert_allclose(table.time, table['frame'] / FPS)
+
+
+def test_columns_match_measurements():
+    table, measurements = _build_table(_frame_masks())
+    rows = {(int(table['obj_id'][r]), int(table['frame'][r])): r for r in range(len(table))}
+    for frame_measurements in measurements:
+        for obj_id, frame_data in frame_measurements:
+            row = rows[(obj_id, frame_data['frame'])]
+            for name in ('area', 'center_x', 'center_y', 'center_x_px', 'center_y_px',
+                         'major_axis', 'minor_axis', 'angle', 'touches_boundary'):
+                assert table[name][row] == frame_data[name], name
+            np.testing.assert_array_equal(table.contour(row), frame_data['contour'])
+
+
+def test_frame_object_ids():
+    table, _ = _build_table(_frame_masks())
+    per_frame = table.frame_object_ids(4)
+    assert [ids.tolist() for ids in per_frame] == [[1, 2], [1], [1, 2], []]
+
+
+def test_take_keeps_contours():
+    table, _ = _build_table(_frame_masks())
+    sub = table.take([1, 4])
+    np.testing.assert_array_equal(sub['obj_id'], [1, 2])
+    np.testing.assert_array_equal(sub['frame'], [1, 2])
+    np.testing.assert_array_equal(sub.contour(0), table.contour(1))
+    np.testing.assert_array_equal(sub.contour(1), table.contour(4))
+    assert len(table.take([])) == 0
+
+
+def test_empty_table():
+    table = TrajectoryTableBuilder(FPS).build()
+    assert len(table) == 0
+    assert table.num_objects == 0
+    assert isinstance(table, TrajectoryTable)
+    assert [ids.tolist() for ids in table.frame_object_ids(2)] == [[], []]
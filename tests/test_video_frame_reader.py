@@ -0,0 +1,104 @@
+"""视频帧随机访问的测试: 任意访问顺序下读到的帧都与顺序解码的结果一致"""
+
+import cv2
+import numpy as np
+import pytest
+
+from micro_tracker.utils import video_frame_reader
+from micro_tracker.utils.video_frame_reader import VideoFrameReader, fit_frame_to_display
+
+NUM_FRAMES = 40
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    """生成每帧内容不同的测试视频，返回 (路径, 顺序解码得到的所有帧)"""
+    path = str(tmp_path_factory.mktemp("video") / "test.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("OpenCV 无法写入测试视频")
+    for index in range(NUM_FRAMES):
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        cv2.putText(frame, str(index), (4, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        frame[:, :, 1] = index * 6
+        writer.write(frame)
+    writer.release()
+
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    assert len(frames) == NUM_FRAMES
+    return path, frames
+
+
+@pytest.fixture(params=["keyframes", "no_keyframes"])
+def reader(request, video, monkeypatch):
+    """分别测试有关键帧索引(每帧均为关键帧)和没有关键帧索引的情况"""
+    keyframes = np.arange(NUM_FRAMES) if request.param == "keyframes" else None
+    monkeypatch.setattr(video_frame_reader, "load_keyframe_index", lambda path: keyframes)
+    reader = VideoFrameReader(video[0])
+    yield reader
+    reader.release()
+
+
+def test_metadata(reader):
+    assert reader.isOpened()
+    assert reader.total_frames == NUM_FRAMES
+    assert reader.fps == pytest.approx(10)
+
+
+@pytest.mark.parametrize("order", [
+    list(range(NUM_FRAMES)),                       # 顺序播放
+    list(range(NUM_FRAMES - 1, -1, -1)),           # 倒序
+    [0, 35, 3, 20, 21, 22, 5, 39, 38, 10, 31, 0],  # 跳转
+])
+def test_reads_match_sequential_decode(reader, video, order):
+    frames = video[1]
+    for index in order:
+        np.testing.assert_array_equal(reader.read(index), frames[index])
+
+
+def test_random_access(reader, video):
+    frames = video[1]
+    rng = np.random.default_rng(0)
+    for index in rng.integers(0, NUM_FRAMES, size=60):
+        np.testing.assert_array_equal(reader.read(int(index)), frames[index])
+
+
+def test_read_past_end(reader):
+    assert reader.read(NUM_FRAMES + 5) is None
+    assert reader.read(0) is not None
+
+
+def test_cache_limit(video):
+    frame_bytes = video[1][0].nbytes
+    reader = VideoFrameReader(video[0], cache_bytes=3 * frame_bytes)
+    for index in range(10):
+        reader.read(index)
+    assert len(reader._cache) == 3
+    assert reader._cache_nbytes <= 3 * frame_bytes
+    # 缓存命中不需要解码
+    assert reader.read(9) is reader.read(9)
+    reader.release()
+
+
+def test_read_ahead_decodes_next_frame(reader, video):
+    reader.read(5)
+    assert reader.read_ahead(5, 3)
+    np.testing.assert_array_equal(reader._cache[6], video[1][6])
+    assert reader.read_ahead(5, 3)
+    assert reader.read_ahead(5, 3)
+    # 预读范围内的帧都已缓存
+    assert not reader.read_ahead(5, 3)
+
+
+def test_fit_frame_to_display():
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    assert fit_frame_to_display(frame, None) is frame
+    assert fit_frame_to_display(frame, (400, 300)) is frame
+    assert fit_frame_to_display(frame, (100, 100)).shape == (50, 100, 3)
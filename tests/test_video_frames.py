@@ -0,0 +1,55 @@
+"""按帧流式读取视频的测试"""
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from sam2.utils.misc import StreamingVideoFrameLoader
+from utils.utils import read_video_frames
+
+
+def _write_jpg_frames(folder, num_frames):
+    frames = []
+    for index in range(num_frames):
+        frame = np.full((24, 32, 3), index * 20, dtype=np.uint8)
+        cv2.imwrite(str(folder / f"{index}.jpg"), frame)
+        frames.append(cv2.imread(str(folder / f"{index}.jpg")))
+    return frames
+
+
+def test_jpg_frames_sorted_numerically(tmp_path):
+    frames = _write_jpg_frames(tmp_path, 12)
+    total_frames, frame_iter = read_video_frames(str(tmp_path))
+    assert total_frames == 12
+    for frame, expected in zip(frame_iter, frames):
+        np.testing.assert_array_equal(frame, expected)
+
+
+def test_corrupt_jpg_frame_raises(tmp_path):
+    _write_jpg_frames(tmp_path, 4)
+    (tmp_path / "2.jpg").write_bytes(b"not a jpeg")
+    _, frame_iter = read_video_frames(str(tmp_path))
+    with pytest.raises(ValueError, match="2.jpg"):
+        list(frame_iter)
+
+
+def _loader(frames, num_frames):
+    return StreamingVideoFrameLoader(frames, num_frames, image_size=16, offload_video_to_cpu=True,
+                                     img_mean=None, img_std=None, compute_device=torch.device("cpu"))
+
+
+@pytest.mark.parametrize("estimated", [3, 5, 8])
+def test_streaming_loader_finds_real_end(estimated):
+    frames = [np.full((8, 8, 3), i, dtype=np.uint8) for i in range(5)]
+    loader = _loader(iter(frames), estimated)
+    assert all(loader.has_frame(i) for i in range(5))
+    assert not loader.has_frame(5)
+    assert loader.exhausted and loader.num_frames == 5
+
+
+def test_streaming_loader_rejects_missing_frame():
+    frames = [np.zeros((8, 8, 3), dtype=np.uint8), None, np.zeros((8, 8, 3), dtype=np.uint8)]
+    loader = _loader(iter(frames), 3)
+    with pytest.raises(ValueError):
+        loader.has_frame(1)
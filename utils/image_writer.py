@@ -0,0 +1,160 @@
+"""
+多线程图片与视频写入
+-----------------
+PNG等格式的编码和写盘以及视频帧的编码在后台线程中执行(cv2/imageio编码期间会释放GIL)，
+调用方只负责生成图像；待写入的图像数量有上限，内存占用不会随帧数增长。
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+class ImageWriterPool:
+    """有界的后台图片写入线程池"""
+
+    def __init__(self, num_threads=None, max_pending=None, write_func=cv2.imwrite):
+        """
+        初始化写入线程池
+
+        Args:
+            num_threads: 写入线程数，默认为 min(4, CPU核数)
+            max_pending: 最多同时等待写入的图像数，达到上限时submit阻塞，默认为线程数的2倍
+            write_func: 写入函数，签名为 write_func(路径, 图像)，返回False表示写入失败
+        """
+        self.num_threads = num_threads or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.num_threads * 2
+        self.write_func = write_func
+        self._executor = ThreadPoolExecutor(max_workers=self.num_threads)
+        self._pending = deque()
+
+    def _write(self, path, image):
+        if self.write_func(path, image) is False:
+            raise IOError(f"无法写入图片: {path}")
+
+    def _wait_oldest(self):
+        # result()会重新抛出写入线程中的异常
+        self._pending.popleft().result()
+
+    def submit(self, path, image):
+        """提交一张图像，调用方在提交后不应再修改该图像"""
+        while len(self._pending) >= self.max_pending:
+            self._wait_oldest()
+        self._pending.append(self._executor.submit(self._write, path, image))
+
+    def close(self):
+        """等待所有图像写入完成并关闭线程池"""
+        try:
+            while self._pending:
+                self._wait_oldest()
+        finally:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._executor.shutdown(wait=True)
+
+    def discard(self):
+        """放弃尚未开始的写入并关闭线程池，不等待排队的图像，也不抛出写入错误"""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class BackgroundVideoWriter:
+    """
+    在单个后台线程中按提交顺序编码视频帧的有界写入器
+
+    队列满时submit阻塞(背压)；后台线程中的异常会在之后的submit或close中重新抛出，
+    出错后剩余的帧被丢弃。
+    """
+
+    def __init__(self, writer, max_pending=8, render_func=None):
+        """
+        初始化视频写入器
+
+        Args:
+            writer: 具有 append_data(帧) 和 close() 的视频写入器，如imageio的FFMPEG写入器
+            max_pending: 最多同时等待编码的帧数
+            render_func: 可选，在后台线程中由submit的参数生成视频帧的函数，
+                默认直接写入submit的第一个参数
+        """
+        self.writer = writer
+        self.render_func = render_func
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._discarded = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None or self._discarded:
+                continue
+            try:
+                frame = self.render_func(*item) if self.render_func else item[0]
+                self.writer.append_data(frame)
+            except Exception as e:
+                self._error = e
+        if self._discarded:
+            # 放弃写入时由后台线程关闭写入器，调用方无需等待
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise IOError("视频帧写入失败") from self._error
+
+    def submit(self, *args):
+        """提交一帧(或render_func的参数)，调用方在提交后不应再修改这些数据"""
+        self._raise_error()
+        self._queue.put(args)
+
+    def close(self):
+        """等待所有帧编码完成并关闭视频写入器"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self.writer.close()
+        self._raise_error()
+
+    def discard(self):
+        """
+        放弃排队的帧并关闭写入器，不等待后台线程，也不抛出编码错误
+
+        后台线程写完正在编码的一帧后结束，并在结束时关闭视频写入器
+        """
+        if self._thread is None:
+            return
+        self._discarded = True
+        # 清空队列后放入结束标记不会阻塞(调用方是唯一的生产者)
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._queue.put(None)
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,200 @@
+"""
+单文件标签流
+-----------
+将逐帧的16位标签掩膜(像素值为对象ID，背景为0)逐帧压缩后顺序写入单个文件，
+文件末尾附带帧偏移索引和元数据(帧率、像素比例、对象ID等)。
+
+文件布局:
+    magic | 帧0压缩数据 | 帧1压缩数据 | ... | 元数据JSON | 帧偏移索引 | 尾部
+
+帧偏移索引为 (帧数+1) 个 uint64，第i帧的数据位于 [offsets[i], offsets[i+1])；
+尾部记录元数据和索引的起始位置，读取时通过内存映射按索引解压任意一帧，
+随机访问的开销与帧号和视频长度无关。
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+LABEL_STREAM_FILENAME = "labels.mtl"
+
+_MAGIC = b"MTLABEL1"
+# 尾部: 元数据起始位置、索引起始位置、magic
+_TRAILER = struct.Struct("<QQ8s")
+_ZLIB_LEVEL = 1
+_ZSTD_LEVEL = 3
+
+
+def label_stream_path(mask_dir):
+    """返回掩膜目录中标签流文件的路径"""
+    return os.path.join(mask_dir, LABEL_STREAM_FILENAME)
+
+
+def _zstd():
+    # zstd为可选依赖，仅在使用时导入
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("使用zstd压缩标签流需要安装 zstandard: pip install zstandard") from None
+    return zstandard
+
+
+def _compressor(compression):
+    if compression == "zlib":
+        return lambda data: zlib.compress(data, _ZLIB_LEVEL)
+    if compression == "zstd":
+        return _zstd().ZstdCompressor(level=_ZSTD_LEVEL).compress
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+def _decompressor(compression):
+    if compression == "zlib":
+        return zlib.decompress
+    if compression == "zstd":
+        return _zstd().ZstdDecompressor().decompress
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+class LabelStreamWriter:
+    """顺序写入标签流，每次只在内存中保留当前帧的压缩数据"""
+
+    def __init__(self, path, metadata=None, compression="zlib", dtype=np.uint16):
+        """
+        Args:
+            path: 标签流文件路径
+            metadata: 额外写入的元数据字典(如 fps、um_per_pixel)，需可JSON序列化
+            compression: 逐帧压缩方式，"zlib" 或 "zstd"(需要 zstandard)
+            dtype: 标签数据类型
+        """
+        self.path = str(path)
+        self.metadata = dict(metadata or {})
+        self.compression = compression
+        self.dtype = np.dtype(dtype)
+        self.frame_shape = None
+        self.num_frames = 0
+        self._compress = _compressor(compression)
+        self._offsets = [len(_MAGIC)]
+        self._label_counts = np.zeros(1, dtype=np.int64)
+        # 先写入临时文件，关闭时再替换为正式文件，避免中断后留下不完整的标签流
+        self._tmp_path = self.path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(_MAGIC)
+
+    def append(self, labels):
+        """追加一帧标签掩膜，所有帧的尺寸必须一致"""
+        if self.frame_shape is None:
+            self.frame_shape = labels.shape[:2]
+        elif labels.shape[:2] != self.frame_shape:
+            raise ValueError(f"掩膜尺寸 {labels.shape[:2]} 与已写入的尺寸 {self.frame_shape} 不一致")
+
+        labels = np.ascontiguousarray(labels, dtype=self.dtype)
+        self._file.write(self._compress(labels.tobytes()))
+        self._offsets.append(self._file.tell())
+        self.num_frames += 1
+
+        # 记录出现过的对象ID，读取时无需扫描所有帧
+        counts = np.bincount(labels.ravel())
+        if len(counts) > len(self._label_counts):
+            counts[:len(self._label_counts)] += self._label_counts
+            self._label_counts = counts
+        else:
+            self._label_counts[:len(counts)] += counts
+
+    def close(self):
+        """写入元数据和帧偏移索引并关闭文件"""
+        if self._file is None:
+            return
+        height, width = self.frame_shape if self.frame_shape is not None else (0, 0)
+        object_ids = np.flatnonzero(self._label_counts[1:]) + 1
+        metadata = dict(self.metadata,
+                        num_frames=self.num_frames,
+                        height=int(height),
+                        width=int(width),
+                        dtype=self.dtype.str,
+                        compression=self.compression,
+                        object_ids=object_ids.tolist())
+
+        metadata_offset = self._file.tell()
+        self._file.write(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+        index_offset = self._file.tell()
+        self._file.write(np.asarray(self._offsets, dtype="<u8").tobytes())
+        self._file.write(_TRAILER.pack(metadata_offset, index_offset, _MAGIC))
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        """放弃写入并删除临时文件"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class LabelStreamReader:
+    """
+    以只读内存映射方式打开标签流
+
+    支持 len()、按帧索引访问和迭代，返回 (高, 宽) 的标签数组，可直接替代
+    形状为 (帧数, 高, 宽) 的掩膜栈。读取不修改共享状态，可在多个线程中并发访问。
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        size = len(self._mmap)
+        if size < len(_MAGIC) + _TRAILER.size or self._mmap[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"不是有效的标签流文件: {self.path}")
+        metadata_offset, index_offset, magic = _TRAILER.unpack_from(self._mmap, size - _TRAILER.size)
+        if magic != _MAGIC:
+            raise ValueError(f"标签流文件不完整: {self.path}")
+
+        self.metadata = json.loads(self._mmap[metadata_offset:index_offset].decode("utf-8"))
+        self.num_frames = int(self.metadata["num_frames"])
+        self.offsets = np.frombuffer(self._mmap, dtype="<u8", count=self.num_frames + 1, offset=index_offset).copy()
+        self.dtype = np.dtype(self.metadata["dtype"])
+        self.shape = (self.num_frames, int(self.metadata["height"]), int(self.metadata["width"]))
+        self._decompress = _decompressor(self.metadata["compression"])
+
+    @property
+    def object_ids(self):
+        """标签流中出现过的所有对象ID(像素值，不含背景0)，按升序排列"""
+        return np.asarray(self.metadata["object_ids"], dtype=np.int64)
+
+    def __len__(self):
+        return self.num_frames
+
+    def __getitem__(self, frame_idx):
+        """解压并返回第frame_idx帧的标签数组"""
+        frame_idx = int(frame_idx)
+        if frame_idx < 0:
+            frame_idx += self.num_frames
+        if not 0 <= frame_idx < self.num_frames:
+            raise IndexError(frame_idx)
+
+        start, stop = int(self.offsets[frame_idx]), int(self.offsets[frame_idx + 1])
+        data = self._decompress(self._mmap[start:stop])
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.shape[1:])
+
+    def __iter__(self):
+        for frame_idx in range(self.num_frames):
+            yield self[frame_idx]
+
+    def close(self):
+        self._mmap.close()
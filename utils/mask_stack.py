@@ -0,0 +1,95 @@
+"""
+磁盘标签掩膜栈
+-------------
+将逐帧的标签掩膜(像素值为对象ID，背景为0)顺序追加写入单个 .npy 文件，
+读取时通过内存映射按需访问任意帧，内存占用与视频长度无关。
+"""
+
+import os
+import struct
+
+import numpy as np
+
+from utils.label_stream import LabelStreamReader
+
+MASK_STACK_FILENAME = "masks.npy"
+
+# .npy 头部固定长度，预留足够空间以便写入完成后原地改写帧数
+_HEADER_SIZE = 128
+_NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def mask_stack_path(mask_dir):
+    """返回掩膜目录中标签栈文件的路径"""
+    return os.path.join(mask_dir, MASK_STACK_FILENAME)
+
+
+def _npy_header(dtype, shape):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.dtype(dtype).str, tuple(shape))
+    header = header.ljust(_HEADER_SIZE - len(_NPY_MAGIC) - 2 - 1) + "\n"
+    return _NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+class MaskStackWriter:
+    """顺序写入标签掩膜栈，每次只在内存中保留当前帧"""
+
+    def __init__(self, path, dtype=np.uint8):
+        self.path = str(path)
+        self.dtype = np.dtype(dtype)
+        self.frame_shape = None
+        self.num_frames = 0
+        # 先写入临时文件，关闭时再替换为正式文件，避免中断后留下不完整的掩膜栈
+        self._tmp_path = self.path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+
+    def append(self, mask):
+        """追加一帧掩膜，所有帧的尺寸必须一致"""
+        if self.frame_shape is None:
+            self.frame_shape = mask.shape[:2]
+            self._file.write(_npy_header(self.dtype, (0, *self.frame_shape)))
+        elif mask.shape[:2] != self.frame_shape:
+            raise ValueError(f"掩膜尺寸 {mask.shape[:2]} 与已写入的尺寸 {self.frame_shape} 不一致")
+
+        self._file.write(np.ascontiguousarray(mask, dtype=self.dtype).tobytes())
+        self.num_frames += 1
+
+    def close(self):
+        """写入最终帧数并关闭文件"""
+        if self._file is None:
+            return
+        if self.frame_shape is None:
+            self._file.write(_npy_header(self.dtype, (0, 0, 0)))
+        else:
+            self._file.seek(0)
+            self._file.write(_npy_header(self.dtype, (self.num_frames, *self.frame_shape)))
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def discard(self):
+        """放弃写入并删除临时文件"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def open_mask_stack(path):
+    """
+    以只读内存映射方式打开标签栈，返回形状为 (帧数, 高, 宽) 的数组
+
+    .mtl 标签流返回 LabelStreamReader，同样支持 len()、shape、dtype 和按帧索引访问
+    """
+    if str(path).endswith(".mtl"):
+        return LabelStreamReader(path)
+    return np.load(path, mmap_mode="r")
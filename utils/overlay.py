@@ -0,0 +1,109 @@
+"""
+标签图像合成与叠加渲染
+-------------------
+在设备上将一帧中所有对象的掩膜批量合成为标签图像，并通过调色板查找表一次性为标签
+图像着色、与原始帧混合，渲染开销与对象数量无关(边界框和对象标签除外)。
+"""
+
+import cv2
+import numpy as np
+import torch
+
+from utils.color import COLOR
+
+
+def masks_to_labels(masks, object_ids, dtype=torch.uint8):
+    """
+    在设备上批量后处理一帧中所有对象的掩膜: 二值化、计算边界框并合成标签图像
+
+    参数:
+        masks: (N, 1, H, W) 掩膜分数
+        object_ids: N 个对象ID
+        dtype: 标签图像的数据类型，对象较多时使用 torch.int16 等更宽的类型
+    返回:
+        labels: (H, W) 标签图像，像素值为对象ID+1，背景为0，重叠处以靠后的对象为准
+        bboxes: (N, 4) 边界框 [x, y, w, h]，空掩膜为 [0, 0, 0, 0]
+    """
+    max_label = max(object_ids, default=-1) + 1
+    if max_label > torch.iinfo(dtype).max:
+        raise ValueError(f"对象ID {max_label - 1} 超出标签图像数据类型 {dtype} 的取值范围，请使用更宽的数据类型")
+
+    binary = masks[:, 0] > 0.0
+    num_objects, height, width = binary.shape
+
+    # 每个对象有前景的行和列，第一个和最后一个即为边界框
+    rows = binary.any(dim=2).to(torch.uint8)
+    cols = binary.any(dim=1).to(torch.uint8)
+    y_min = rows.argmax(dim=1)
+    y_max = height - 1 - rows.flip(1).argmax(dim=1)
+    x_min = cols.argmax(dim=1)
+    x_max = width - 1 - cols.flip(1).argmax(dim=1)
+    bboxes = torch.stack([x_min, y_min, x_max - x_min, y_max - y_min], dim=1)
+    bboxes[rows.amax(dim=1) == 0] = 0
+
+    # 每个像素取最后一个覆盖它的对象
+    last_obj = num_objects - 1 - binary.flip(0).to(torch.uint8).argmax(dim=0)
+    label_values = torch.tensor([obj_id + 1 for obj_id in object_ids], dtype=dtype, device=masks.device)
+    labels = torch.where(binary.any(dim=0), label_values[last_obj], 0).to(dtype)
+    return labels, bboxes
+
+
+class LabelOverlayRenderer:
+    """
+    标签图像叠加渲染器
+
+    标签值为对象ID+1(背景为0)，颜色为 palette[obj_id % len(palette)]。查找表按标签
+    数据类型的取值范围一次性构建，之后每帧只需一次查表和一次混合。
+    """
+
+    def __init__(self, alpha=0.5, palette=COLOR, font_scale=0.6, thickness=2):
+        """
+        Args:
+            alpha: 掩膜颜色的混合权重
+            palette: (B, G, R) 颜色列表
+            font_scale: 对象标签的字体大小
+            thickness: 边界框和对象标签的线宽
+        """
+        self.alpha = alpha
+        self.palette = np.asarray(palette, dtype=np.uint8)
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self._lut = np.zeros((1, 3), dtype=np.uint8)
+
+    def _get_lut(self, labels):
+        if np.issubdtype(labels.dtype, np.integer) and labels.dtype.itemsize <= 2:
+            num_labels = np.iinfo(labels.dtype).max + 1
+        else:
+            num_labels = int(labels.max()) + 1
+        if len(self._lut) < num_labels:
+            obj_ids = np.arange(num_labels - 1)
+            self._lut = np.zeros((num_labels, 3), dtype=np.uint8)
+            self._lut[1:] = self.palette[obj_ids % len(self.palette)]
+        return self._lut
+
+    def color(self, obj_id):
+        """对象的 (B, G, R) 颜色"""
+        return tuple(int(c) for c in self.palette[obj_id % len(self.palette)])
+
+    def render(self, frame, labels, object_ids, bboxes, dst=None):
+        """
+        渲染一帧: 按标签图像叠加掩膜颜色，再绘制边界框和对象标签
+
+        Args:
+            frame: (H, W, 3) BGR原始帧
+            labels: (H, W) 标签图像
+            object_ids: 对象ID列表
+            bboxes: 与object_ids对应的边界框 [x, y, w, h]
+            dst: 输出图像，可以是frame本身(原地渲染)，默认为新图像
+        Returns:
+            渲染后的BGR图像
+        """
+        colored = np.take(self._get_lut(labels), labels, axis=0)
+        img = cv2.addWeighted(frame, 1, colored, self.alpha, 0, dst=dst)
+
+        for obj_id, (x, y, w, h) in zip(object_ids, bboxes):
+            color = self.color(obj_id)
+            cv2.rectangle(img, (x, y), (x + w, y + h), color, self.thickness)
+            cv2.putText(img, f"obj_{obj_id}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                        self.font_scale, color, self.thickness)
+        return img
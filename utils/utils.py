@@ -1,9 +1,6 @@
 import os
-import tempfile
 
 import cv2
-import numpy as np
-from PIL import Image
 
 
 def bbox_process(bbox_list, labels=None):
@@ -50,13 +47,48 @@ def prepare_frames_or_path(video_path):
         raise ValueError("Invalid video_path format. Should be a video file (.mp4, .avi, .mov, .mkv) or a directory of jpg frames.")
 
 
-def save_frames_to_temp_dir(frames: list[np.ndarray]) -> str:
-    tmp_dir = tempfile.mkdtemp(prefix="chunk_frames_")
-    for i, frame in enumerate(frames):
-        path = os.path.join(tmp_dir, f"{i:04d}.jpg")
-        # OpenCV uses BGR, PIL expects RGB
-        Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).save(path)
-    return tmp_dir
+def read_video_frames(video_path):
+    """
+    打开视频文件或JPEG帧目录，按顺序逐帧解码
+
+    Args:
+        video_path: 视频文件路径或JPEG帧目录
+
+    Returns:
+        tuple: (预计总帧数, BGR帧生成器)，帧在迭代时才被解码。视频文件的帧数取自容器信息，
+        对可变帧率或封装有误的文件并不准确，实际帧数以生成器结束为准
+    """
+    if os.path.isdir(video_path):
+        # 与SAM2读取JPEG帧目录的规则一致: 按文件名中的帧号排序，支持 .jpg/.jpeg 扩展名
+        from models.sam2.sam2.utils.misc import list_jpg_frame_paths
+        frame_paths = list_jpg_frame_paths(video_path)
+        return len(frame_paths), _iter_jpg_frames(frame_paths)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频文件: {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return total_frames, _iter_capture_frames(cap)
+
+
+def _iter_jpg_frames(frame_paths):
+    for frame_path in frame_paths:
+        frame = cv2.imread(frame_path)
+        if frame is None:
+            # 损坏的帧不能当作视频结束，否则跟踪会提前停止并把不完整的结果当作完整结果保存
+            raise ValueError(f"无法读取图像帧: {frame_path}")
+        yield frame
+
+
+def _iter_capture_frames(cap):
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
 
 
 def extract_frames(